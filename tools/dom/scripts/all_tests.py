@@ -19,6 +19,12 @@ if __name__ == '__main__':
       'database_test',
       'databasebuilder_test',
       'emitter_test',
+      'generator_test',
       'dartgenerator_test',
-      'multiemitter_test'])
+      'dartmetadata_test',
+      'dartdomgenerator_test',
+      'htmlrenamer_test',
+      'multiemitter_test',
+      'monitored_test',
+      'profiler_test'])
   unittest.TextTestRunner().run(suite)
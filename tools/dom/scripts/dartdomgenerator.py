@@ -35,21 +35,26 @@ sys.path.insert(1, os.path.join(dart_dir, 'tools/dom/scripts'))
 
 import dartgenerator
 import database
+import emitter
 import fremontcutbuilder
+import generationcache
 import logging
 import monitored
 import multiemitter
+import multiprocessing
 import optparse
+import profiler
 import shutil
 import subprocess
 import time
+import traceback
 from dartmetadata import DartMetadata
 from generator import TypeRegistry
 from htmleventgenerator import HtmlEventGenerator
 from htmlrenamer import HtmlRenamer
 from systemhtml import DartLibraryEmitter, Dart2JSBackend,\
                        HtmlDartInterfaceGenerator, DartLibrary, DartLibraries,\
-                       HTML_LIBRARY_NAMES
+                       HTML_LIBRARY_NAMES, RenameInterfaceOverloads
 from systemnative import CPPLibraryEmitter, DartiumBackend
 from templateloader import TemplateLoader
 
@@ -70,17 +75,98 @@ class GeneratorOptions(object):
     self.metadata = metadata;
     self.dart_js_interop = dart_js_interop
 
-def LoadDatabase(database_dir, use_database_cache):
+class GeneratedOutput(object):
+  """The output DartGenerator.Generate() collects from its worker processes.
+
+  Besides the emitted files, it carries the DOM metadata added for the
+  interfaces, the keys of the monitored collections they used and the trace
+  events recorded while generating them.
+  """
+  def __init__(self, dart_library_emitter, metadata, cpp_library_emitter=None):
+    self._dart_library_emitter = dart_library_emitter
+    self._metadata = metadata
+    self._cpp_library_emitter = cpp_library_emitter
+
+  def Take(self):
+    # Each worker process has its own template cache.
+    profiler.CacheCounters('Template cache', emitter.TemplateCacheStats())
+    return self._TakeEmitted() + (monitored.TakeUsedKeys(),
+                                  profiler.TakeEvents())
+
+  def Merge(self, output):
+    (dart_output, cpp_output, support_info, used_keys, events) = output
+    self._dart_library_emitter.MergeOutput(dart_output)
+    if cpp_output:
+      self._cpp_library_emitter.MergeOutput(cpp_output)
+    self._metadata.MergeSupportInfo(support_info)
+    monitored.MergeUsedKeys(used_keys)
+    profiler.MergeEvents(events)
+
+  def Record(self, generate):
+    """Calls generate() and returns what it emitted, like Take(), but keeps
+    it in this process.  The keys of the monitored collections it used are
+    left out, since the GenerationCache records them as dependencies, and so
+    are the trace events, which stay in this process."""
+    self._TakeEmitted()
+    generate()
+    return self._TakeEmitted() + ([], [])
+
+  def _TakeEmitted(self):
+    cpp_output = None
+    if self._cpp_library_emitter:
+      cpp_output = self._cpp_library_emitter.TakeOutput()
+    return (self._dart_library_emitter.TakeOutput(), cpp_output,
+            self._metadata.TakeNewSupportInfo())
+
+class _ChildProcess(object):
+  """Calls a function in a forked process.  The function's result must be
+  picklable."""
+  def __init__(self, function):
+    (self._receiver, sender) = multiprocessing.Pipe(False)
+    def run():
+      try:
+        sender.send((True, function()))
+      except:
+        sender.send((False, traceback.format_exc()))
+    self._process = multiprocessing.Process(target=run)
+    self._process.start()
+
+  def Join(self):
+    """Waits for the function to return and returns its result."""
+    (succeeded, result) = self._receiver.recv()
+    self._process.join()
+    if not succeeded:
+      raise RuntimeError('Child process failed:\n%s' % result)
+    return result
+
+def LoadDatabase(database_dir, use_database_cache, parallel=False):
   common_database = database.Database(database_dir)
   if use_database_cache:
-    common_database.LoadFromCache()
+    common_database.LoadFromCache(parallel=parallel)
   else:
-    common_database.Load()
+    common_database.Load(parallel=parallel)
   return common_database
 
+def FilterDatabase(generator, common_database):
+  """Filters common_database in place, and returns the filtered clone of it
+  the WebKit DOM is generated from."""
+  generator.FilterMembersWithUnidentifiedTypes(common_database)
+  webkit_database = common_database.Clone()
+
+  # Generate Dart interfaces for the WebKit DOM.
+  generator.FilterInterfaces(database = webkit_database,
+                             or_annotations = ['WebKit', 'Dart'],
+                             exclude_displaced = ['WebKit'],
+                             exclude_suppressed = ['WebKit', 'Dart'])
+  generator.FixEventTargets(webkit_database)
+  generator.AddMissingArguments(webkit_database)
+  return webkit_database
+
 def GenerateFromDatabase(common_database, dart2js_output_dir,
                          dartium_output_dir, update_dom_metadata=False,
-                         logging_level=logging.WARNING, dart_js_interop=False):
+                         logging_level=logging.WARNING, dart_js_interop=False,
+                         num_workers=1, parallel_backends=False,
+                         incremental_generate=False, api_status_path=None):
   print '\n ----- Accessing DOM using %s -----\n' % ('dart:js' if dart_js_interop else 'C++')
 
   start_time = time.time()
@@ -92,31 +178,40 @@ def GenerateFromDatabase(common_database, dart2js_output_dir,
   _logger.setLevel(logging_level)
 
   generator = dartgenerator.DartGenerator(logging_level)
-  generator.LoadAuxiliary(auxiliary_dir)
-
-  generator.FilterMembersWithUnidentifiedTypes(common_database)
-  webkit_database = common_database.Clone()
-
-  # Generate Dart interfaces for the WebKit DOM.
-  generator.FilterInterfaces(database = webkit_database,
-                             or_annotations = ['WebKit', 'Dart'],
-                             exclude_displaced = ['WebKit'],
-                             exclude_suppressed = ['WebKit', 'Dart'])
-  generator.FixEventTargets(webkit_database)
-  generator.AddMissingArguments(webkit_database)
-
-  emitters = multiemitter.MultiEmitter(logging_level)
+  with profiler.Phase('Load auxiliary files'):
+    generator.LoadAuxiliary(auxiliary_dir)
+
+  with profiler.Phase('Filter database'):
+    webkit_database = FilterDatabase(generator, common_database)
+
+  manifest_path = None
+  output_dir = dart2js_output_dir or dartium_output_dir
+  if output_dir:
+    # Shared by all the systems generated under the same output directory.
+    manifest_path = os.path.join(os.path.dirname(os.path.normpath(output_dir)),
+                                 'emitted_files.manifest')
+  emitters = multiemitter.MultiEmitter(logging_level, manifest_path)
+  if api_status_path is None:
+    api_status_path = os.path.join(current_dir, '..', 'dom.json')
   metadata = DartMetadata(
-      os.path.join(current_dir, '..', 'dom.json'),
+      api_status_path,
       os.path.join(current_dir, '..', 'docs', 'docs.json'),
       logging_level)
-  renamer = HtmlRenamer(webkit_database, metadata)
-  type_registry = TypeRegistry(webkit_database, renamer)
+  with profiler.Phase('Set up renamer and type registry'):
+    renamer = HtmlRenamer(webkit_database, metadata)
+    type_registry = TypeRegistry(webkit_database, renamer)
+
+  # The backends render the interfaces without modifying the database, so
+  # they all start from the same one, even when generated concurrently.
+  with profiler.Phase('Rename overloads'):
+    RenameInterfaceOverloads(webkit_database, type_registry,
+                             generator.InterfacesToGenerate(webkit_database))
 
   print 'GenerateFromDatabase %s seconds' % round((time.time() - start_time), 2)
 
-  def RunGenerator(dart_libraries, dart_output_dir,
-                   template_loader, backend_factory, dart_js_interop):
+  def RunGenerator(system, dart_libraries, dart_output_dir,
+                   template_loader, backend_factory, dart_js_interop,
+                   cpp_library_emitter=None):
     options = GeneratorOptions(
         template_loader, webkit_database, type_registry, renamer,
         metadata, dart_js_interop)
@@ -126,16 +221,37 @@ def GenerateFromDatabase(common_database, dart2js_output_dir,
         template_loader)
 
     def generate_interface(interface):
-      backend = backend_factory(interface)
-      interface_generator = HtmlDartInterfaceGenerator(
-          options, dart_library_emitter, event_generator, interface, backend)
-      interface_generator.Generate()
-
-    generator.Generate(webkit_database, common_database, generate_interface)
-
-    dart_library_emitter.EmitLibraries(auxiliary_dir, dart_js_interop)
-
-  if dart2js_output_dir:
+      with profiler.Phase(interface.id, category='interface',
+                          measure_rss=False, system=system):
+        backend = backend_factory(interface)
+        HtmlDartInterfaceGenerator(
+            options, dart_library_emitter, event_generator, interface,
+            backend).Generate()
+
+    output = GeneratedOutput(dart_library_emitter, metadata,
+                             cpp_library_emitter)
+    cache = None
+    if incremental_generate:
+      # Next to the output directory of the backend, like the manifest.
+      cache_path = '%s.generation_cache' % os.path.dirname(
+          os.path.normpath(dart_output_dir))
+      cache = generationcache.GenerationCache(
+          cache_path, dart_js_interop, webkit_database, template_loader,
+          metadata)
+    with profiler.Phase('Generate %s interfaces' % system):
+      generator.Generate(webkit_database, common_database,
+                         generate_interface, output, num_workers, cache)
+    if cache:
+      cache.Save()
+      print 'Reused %s interfaces and generated %s' % (cache.reused,
+                                                       cache.generated)
+      profiler.Counters('%s generation cache' % system, reused=cache.reused,
+                        generated=cache.generated)
+
+    with profiler.Phase('Emit %s libraries' % system):
+      dart_library_emitter.EmitLibraries(auxiliary_dir, dart_js_interop)
+
+  def GenerateDart2JS():
     template_paths = ['html/dart2js', 'html/impl', 'html/interface', '']
     template_loader = TemplateLoader(template_dir,
                                      template_paths,
@@ -152,15 +268,10 @@ def GenerateFromDatabase(common_database, dart2js_output_dir,
     dart_libraries = DartLibraries(
         HTML_LIBRARY_NAMES, template_loader, 'dart2js', dart2js_output_dir, dart_js_interop)
 
-    print '\nGenerating dart2js:\n'
-    start_time = time.time()
-
-    RunGenerator(dart_libraries, dart_output_dir, template_loader,
+    RunGenerator('dart2js', dart_libraries, dart_output_dir, template_loader,
                  backend_factory, dart_js_interop)
 
-    print 'Generated dart2js in %s seconds' % round(time.time() - start_time, 2)
-
-  if dartium_output_dir:
+  def GenerateDartium():
     template_paths = ['html/dartium', 'html/impl', 'html/interface', '']
     template_loader = TemplateLoader(template_dir,
                                      template_paths,
@@ -178,12 +289,8 @@ def GenerateFromDatabase(common_database, dart2js_output_dir,
     dart_libraries = DartLibraries(
         HTML_LIBRARY_NAMES, template_loader, 'dartium', dartium_output_dir, dart_js_interop)
 
-    print '\nGenerating dartium:\n'
-    start_time = time.time()
-
-    RunGenerator(dart_libraries, dart_output_dir, template_loader,
-                 backend_factory, dart_js_interop)
-    print 'Generated dartium in %s seconds' % round(time.time() - start_time, 2)
+    RunGenerator('dartium', dart_libraries, dart_output_dir, template_loader,
+                 backend_factory, dart_js_interop, cpp_library_emitter)
 
     cpp_library_emitter.EmitDerivedSources(
         template_loader.Load('cpp_derived_sources.template'),
@@ -192,10 +299,86 @@ def GenerateFromDatabase(common_database, dart2js_output_dir,
         template_loader.Load('cpp_resolver.template'), dartium_output_dir)
     cpp_library_emitter.EmitClassIdTable(
         webkit_database, dartium_output_dir, type_registry, renamer)
-    emitters.Flush()
+
+  def TimeBackend(system, generate_backend):
+    start_time = time.time()
+    with profiler.Phase('Generate %s' % system):
+      generate_backend()
+    return time.time() - start_time
+
+  def GenerateDart2JSInChild():
+    # Only what the child generates is sent back to the parent.
+    metadata.TakeNewSupportInfo()
+    monitored.TakeUsedKeys()
+    profiler.TakeEvents()
+    seconds = TimeBackend('dart2js', GenerateDart2JS)
+    profiler.CacheCounters('Template cache', emitter.TemplateCacheStats())
+    return (seconds, emitters.TakeFiles(), metadata.TakeNewSupportInfo(),
+            monitored.TakeUsedKeys(), profiler.TakeEvents())
+
+  if dart2js_output_dir and dartium_output_dir and parallel_backends:
+    print '\nGenerating dart2js and dartium concurrently:\n'
+    start_time = time.time()
+
+    # Rendering doesn't modify the database, so dartium starts from the same
+    # one as after a serial dart2js run.  The support info dart2js adds to
+    # the metadata is merged below; dartium adds the same for the members
+    # it looks up.
+    dart2js_process = _ChildProcess(GenerateDart2JSInChild)
+    dartium_seconds = TimeBackend('dartium', GenerateDartium)
+    (dart2js_seconds, files, support_info, used_keys,
+     events) = dart2js_process.Join()
+    emitters.MergeFiles(files)
+    metadata.MergeSupportInfo(support_info)
+    monitored.MergeUsedKeys(used_keys)
+    profiler.MergeEvents(events)
+
+    print 'Generated dart2js in %s seconds' % round(dart2js_seconds, 2)
+    print 'Generated dartium in %s seconds' % round(dartium_seconds, 2)
+    print 'Generated both in %s seconds' % round(time.time() - start_time, 2)
+  else:
+    if dart2js_output_dir:
+      print '\nGenerating dart2js:\n'
+      print 'Generated dart2js in %s seconds' % round(
+          TimeBackend('dart2js', GenerateDart2JS), 2)
+
+    if dartium_output_dir:
+      print '\nGenerating dartium:\n'
+      print 'Generated dartium in %s seconds' % round(
+          TimeBackend('dartium', GenerateDartium), 2)
+
+  if dartium_output_dir:
+    start_time = time.time()
+    with profiler.Phase('Flush files'):
+      stats = emitters.Flush()
+    print ('Flushed %s files (%s bytes) and skipped %s unchanged files '
+           '(%s bytes) in %s seconds' % (
+               stats.written, stats.written_bytes, stats.unchanged,
+               stats.unchanged_bytes, round(time.time() - start_time, 2)))
+
+  profiler.CacheCounters('Template cache', emitter.TemplateCacheStats())
+  profiler.CacheCounters('Type registry', type_registry.CacheStats())
+  profiler.CacheCounters('Hierarchy cache',
+                         webkit_database.HierarchyCacheStats())
+  (hits, misses, size) = emitter.TemplateCacheStats()
+  _logger.info('Template cache: %s hits, %s misses (%s%% hit rate), %s '
+               'templates' % (hits, misses,
+                              round(100.0 * hits / max(hits + misses, 1), 1),
+                              size))
+  (hits, misses, size) = type_registry.CacheStats()
+  _logger.info('Type registry: %s hits, %s misses (%s%% hit rate), %s '
+               'types' % (hits, misses,
+                          round(100.0 * hits / max(hits + misses, 1), 1),
+                          size))
+  (hits, misses, size) = webkit_database.HierarchyCacheStats()
+  _logger.info('Hierarchy cache: %s hits, %s misses (%s%% hit rate), %s '
+               'interfaces' % (hits, misses,
+                               round(100.0 * hits / max(hits + misses, 1), 1),
+                               size))
 
   if update_dom_metadata:
-    metadata.Flush()
+    with profiler.Phase('Flush DOM metadata'):
+      metadata.Flush()
 
   monitored.FinishMonitoring(dart2js_output_dir, _logger)
 
@@ -228,6 +411,10 @@ def main():
                     action='store', type='string',
                     default=None,
                     help='Directory to put the generated files')
+  parser.add_option('--incremental', dest='incremental',
+                    action='store_true', default=False,
+                    help='''Only rebuild the database interfaces whose IDL
+                    files changed since the previous incremental run''')
   parser.add_option('--use-database-cache', dest='use_database_cache',
                     action='store_true',
                     default=False,
@@ -249,6 +436,26 @@ def main():
   parser.add_option('--gen-interop', dest='dart_js_interop',
                     action='store_true', default=False,
                     help='Use Javascript objects (dart:js) accessing the DOM in _blink')
+  parser.add_option('--generate-workers', dest='generate_workers', type='int',
+                    action='store', default=1,
+                    help='Number of processes generating the interfaces')
+  parser.add_option('--parallel-backends', dest='parallel_backends',
+                    action='store_true', default=False,
+                    help='Generate dart2js and dartium concurrently')
+  parser.add_option('--incremental-generate', dest='incremental_generate',
+                    action='store_true', default=False,
+                    help='''Only generate again the interfaces whose inputs
+                    changed since the previous run with this option''')
+  parser.add_option('--profile', dest='profile',
+                    action='store', type='string', default=None,
+                    help='''Write the time and peak RSS of each phase, the
+                    time of each interface and the cache statistics to this
+                    file, in the Chrome trace format''')
+  parser.add_option('--bitmap-monitoring', dest='bitmap_monitoring',
+                    action='store_true', default=False,
+                    help='''Keep track of the used keys of the monitored
+                    tables in bytearrays, which the worker processes send
+                    back faster''')
 
   (options, args) = parser.parse_args()
 
@@ -271,34 +478,46 @@ def main():
   logging_level = options.logging_level \
     if options.logging == logging.NOTSET else options.logging
 
+  if options.profile:
+    profiler.Start()
+  if options.bitmap_monitoring:
+    monitored.UseBitmapTracking()
+
   start_time = time.time()
 
-  UpdateCssProperties()
+  with profiler.Phase('Update CSS properties'):
+    UpdateCssProperties()
 
   # Parse the IDL and create the database.
-  database = fremontcutbuilder.main(options.parallel, logging_level=logging_level, examine_idls=options.examine_idls)
+  with profiler.Phase('Build database'):
+    database = fremontcutbuilder.main(options.parallel,
+        logging_level=logging_level, examine_idls=options.examine_idls,
+        incremental=options.incremental)
 
-  GenerateFromDatabase(database, dart2js_output_dir, dartium_output_dir,
-      options.update_dom_metadata, logging_level, options.dart_js_interop)
+  with profiler.Phase('Generate from database'):
+    GenerateFromDatabase(database, dart2js_output_dir, dartium_output_dir,
+        options.update_dom_metadata, logging_level, options.dart_js_interop,
+        options.generate_workers, options.parallel_backends,
+        options.incremental_generate)
 
   file_generation_start_time = time.time()
+  with profiler.Phase('Generate single files'):
+    if 'htmldart2js' in systems:
+      _logger.info('Generating dart2js single files.')
 
-  if 'htmldart2js' in systems:
-    _logger.info('Generating dart2js single files.')
-
-    for library_name in HTML_LIBRARY_NAMES:
-      GenerateSingleFile(
-          os.path.join(dart2js_output_dir, '%s_dart2js.dart' % library_name),
-          os.path.join('..', '..', '..', 'sdk', 'lib', library_name, 'dart2js'))
+      for library_name in HTML_LIBRARY_NAMES:
+        GenerateSingleFile(
+            os.path.join(dart2js_output_dir, '%s_dart2js.dart' % library_name),
+            os.path.join('..', '..', '..', 'sdk', 'lib', library_name, 'dart2js'))
 
-  if 'htmldartium' in systems:
-    _logger.info('Generating dartium single files.')
-    file_generation_start_time = time.time()
+    if 'htmldartium' in systems:
+      _logger.info('Generating dartium single files.')
+      file_generation_start_time = time.time()
 
-    for library_name in HTML_LIBRARY_NAMES:
-      GenerateSingleFile(
-          os.path.join(dartium_output_dir, '%s_dartium.dart' % library_name),
-          os.path.join('..', '..', '..', 'sdk', 'lib', library_name, 'dartium'))
+      for library_name in HTML_LIBRARY_NAMES:
+        GenerateSingleFile(
+            os.path.join(dartium_output_dir, '%s_dartium.dart' % library_name),
+            os.path.join('..', '..', '..', 'sdk', 'lib', library_name, 'dartium'))
 
   print '\nGenerating single file %s seconds' % round(time.time() - file_generation_start_time, 2)
 
@@ -306,5 +525,9 @@ def main():
 
   print '\nDone (dartdomgenerator) %s seconds' % round(end_time - start_time, 2)
 
+  if options.profile:
+    profiler.Save(options.profile)
+    print 'Wrote the profile to %s' % options.profile
+
 if __name__ == '__main__':
   sys.exit(main())
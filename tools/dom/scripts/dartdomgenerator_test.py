@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for dartdomgenerator module."""
+
+import logging
+import logging.config
+import os
+import shutil
+import tempfile
+import unittest
+import dartdomgenerator
+import dartgenerator
+import database
+import generationcache
+import htmlrenamer
+import idlnode
+import templateloader
+
+
+def _Operation(name, arguments):
+  return ('Operation', [('Annotation', [('Id', 'WebKit')]),
+                        ('ReturnType', ('VoidType', None)),
+                        ('Id', name)] +
+          [('Argument', [('Type', ('ScopedName', type)), ('Id', id)])
+           for (type, id) in arguments])
+
+def _Attribute(type, name):
+  return ('Attribute', [('Annotation', [('Id', 'WebKit')]),
+                        ('Type', ('ScopedName', type)), ('Id', name)])
+
+def _Interface(name, members, parent=None):
+  ast = [('Id', name), ('Annotation', [('Id', 'WebKit')])]
+  if parent:
+    ast.append(('ParentInterface', [('InterfaceType', ('ScopedName', parent))]))
+  return idlnode.IDLInterface(ast + members)
+
+
+class _RecordingCache(generationcache.GenerationCache):
+  """Records the interfaces generated instead of reused from the cache."""
+  generated_ids = []
+
+  def Generate(self, interface, generate_interface, output):
+    generated = self.generated
+    super(_RecordingCache, self).Generate(interface, generate_interface,
+                                          output)
+    if self.generated > generated:
+      self.generated_ids.append(interface.id)
+
+
+class _OverlayTemplateLoader(templateloader.TemplateLoader):
+  """Loads the templates of overlay_dir in place of the default ones."""
+  overlay_dir = None
+
+  def _FindTemplateFile(self, name):
+    if self.overlay_dir:
+      template_file = os.path.join(self.overlay_dir, name)
+      if os.path.exists(template_file):
+        return template_file
+    return super(_OverlayTemplateLoader, self)._FindTemplateFile(name)
+
+
+class DartDomGeneratorTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self._working_dir = tempfile.mkdtemp()
+    self._cache_class = generationcache.GenerationCache
+    self._loader_class = dartdomgenerator.TemplateLoader
+    generationcache.GenerationCache = _RecordingCache
+    dartdomgenerator.TemplateLoader = _OverlayTemplateLoader
+    _OverlayTemplateLoader.overlay_dir = None
+
+  def tearDown(self):
+    generationcache.GenerationCache = self._cache_class
+    dartdomgenerator.TemplateLoader = self._loader_class
+    shutil.rmtree(self._working_dir)
+
+  def _Database(self):
+    db = database.Database(os.path.join(self._working_dir, 'database'))
+    db.AddInterface(_Interface('EventTarget', [
+        _Operation('dispatchEvent', [('DOMString', 'type')])]))
+    db.AddInterface(_Interface('MessagePort', [
+        _Operation('close', []),
+        _Operation('postMessage', [('DOMString', 'message')])],
+        'EventTarget'))
+    # BarProp.collapsed is not in dom.json, so its support info is added.
+    db.AddInterface(_Interface('BarProp', [
+        _Attribute('boolean', 'visible'),
+        _Attribute('boolean', 'collapsed')]))
+    # Renamed to addFile() and addData(), and kept as add().
+    db.AddInterface(_Interface('DataTransferItemList', [
+        _Attribute('long', 'length'),
+        _Operation('add', [('File', 'file')]),
+        _Operation('add', [('DOMString', 'data'), ('DOMString', 'type')])]))
+    db.AddInterface(_Interface('File', [_Attribute('DOMString', 'name')]))
+    return db
+
+  def _Generate(self, common_database, name, **options):
+    """Generates both systems from the database, updating a copy of
+    dom.json, and returns the content of the generated files and of the
+    updated dom.json by path.
+
+    Generating again under the same name overwrites the files, starting from
+    a new copy of dom.json, and reuses the generation cache of the previous
+    incremental runs.
+    """
+    output_dir = os.path.join(self._working_dir, name)
+    api_status_path = os.path.join(output_dir, 'dom.json')
+    if not os.path.exists(output_dir):
+      os.makedirs(output_dir)
+    shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'dom.json'),
+                api_status_path)
+    dartdomgenerator.GenerateFromDatabase(
+        common_database, os.path.join(output_dir, 'dart2js'),
+        os.path.join(output_dir, 'dartium'), update_dom_metadata=True,
+        logging_level=logging.ERROR, api_status_path=api_status_path,
+        **options)
+
+    files = {}
+    for (dir, _, file_names) in os.walk(output_dir):
+      for file_name in file_names:
+        if (file_name == 'emitted_files.manifest' or
+            file_name.endswith('.generation_cache')):
+          continue
+        path = os.path.join(dir, file_name)
+        with open(path) as f:
+          files[os.path.relpath(path, output_dir)] = f.read()
+    return files
+
+  def testGenerateKeepsInterfacesShared(self):
+    common_database = self._Database()
+    self._Generate(common_database, 'output')
+
+    # Only the interfaces the generator modified were copied from it.
+    shared = [interface.id for interface in common_database.GetInterfaces()
+              if common_database._IsShared(interface)]
+    self.assertEquals(shared, ['BarProp', 'File'])
+    add_operations = common_database.GetInterface(
+        'DataTransferItemList').operations
+    self.assertEquals([operation.ext_attrs.get('DartName')
+                       for operation in add_operations], [None, None])
+
+  def testWorkersMatchSerial(self):
+    serial_files = self._Generate(self._Database(), 'serial')
+    self.assertTrue('dart2js/dart/html/DataTransferItemList.dart' in
+                    serial_files)
+    self.assertTrue('"collapsed"' in serial_files['dom.json'])
+    self.assertEquals(self._Generate(self._Database(), 'workers',
+                                     num_workers=3),
+                      serial_files)
+
+  def testParallelBackendsMatchSerial(self):
+    serial_files = self._Generate(self._Database(), 'serial')
+    self.assertTrue('dartium/cpp/DartDataTransferItemList.cpp' in
+                    serial_files)
+    self.assertEquals(self._Generate(self._Database(), 'parallel',
+                                     parallel_backends=True),
+                      serial_files)
+
+  def _GenerateIncrementally(self, common_database, name, **options):
+    """Returns the files of an incremental run and the interfaces it
+    generated, dart2js ones first."""
+    _RecordingCache.generated_ids = []
+    files = self._Generate(common_database, name, incremental_generate=True,
+                           **options)
+    return (files, _RecordingCache.generated_ids)
+
+  def testIncrementalParallelBackendsKeepSupportInfo(self):
+    serial_files = self._Generate(self._Database(), 'serial')
+    self._GenerateIncrementally(self._Database(), 'incremental')
+    # The reused dart2js output of BarProp still adds BarProp.collapsed to
+    # dom.json, which dartium doesn't add again.
+    (files, generated_ids) = self._GenerateIncrementally(
+        self._Database(), 'incremental', parallel_backends=True)
+    self.assertEquals(generated_ids, [])
+    self.assertEquals(files, serial_files)
+
+  def testIncrementalRerunReusesAllInterfaces(self):
+    serial_files = self._Generate(self._Database(), 'serial')
+    (files, generated_ids) = self._GenerateIncrementally(
+        self._Database(), 'incremental')
+    self.assertEquals(files, serial_files)
+    self.assertEquals(sorted(set(generated_ids)),
+                      ['BarProp', 'DataTransferItemList', 'EventTarget',
+                       'File', 'MessagePort'])
+    (files, generated_ids) = self._GenerateIncrementally(
+        self._Database(), 'incremental')
+    self.assertEquals(generated_ids, [])
+    self.assertEquals(files, serial_files)
+
+  def testIncrementalWithWorkersAndParallelBackends(self):
+    serial_files = self._Generate(self._Database(), 'serial')
+    for options in [{'num_workers': 3}, {'parallel_backends': True},
+                    {'num_workers': 3, 'parallel_backends': True}]:
+      name = 'incremental_%s' % '_'.join(sorted(options))
+      for _ in range(2):
+        (files, _) = self._GenerateIncrementally(self._Database(), name,
+                                                 **options)
+        self.assertEquals(files, serial_files)
+
+  def _CheckIncrementalEdit(self, edited_database, edit=None):
+    """Checks that after edit(), an incremental run regenerates the same
+    files as a fresh serial run, and returns the interfaces it generated."""
+    self._GenerateIncrementally(self._Database(), 'incremental')
+    if edit:
+      edit()
+    serial_files = self._Generate(edited_database(), 'serial')
+    (files, generated_ids) = self._GenerateIncrementally(edited_database(),
+                                                         'incremental')
+    self.assertEquals(files, serial_files)
+    return generated_ids
+
+  def testIncrementalInterfaceEdit(self):
+    def edited_database():
+      db = self._Database()
+      db.DeleteInterface('File')
+      db.AddInterface(_Interface('File', [_Attribute('DOMString', 'name'),
+                                          _Attribute('long', 'size')]))
+      return db
+    self.assertEquals(self._CheckIncrementalEdit(edited_database),
+                      ['DataTransferItemList', 'File'] * 2)
+
+  def testIncrementalTemplateEdit(self):
+    overlay_dir = os.path.join(self._working_dir, 'templates')
+    def edit():
+      # The templates are cached by path, so the edited one is a new file.
+      os.makedirs(overlay_dir)
+      shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'templates',
+                               'html', 'impl', 'impl_DataTransferItemList.darttemplate'),
+                  overlay_dir)
+      with open(os.path.join(overlay_dir, 'impl_DataTransferItemList.darttemplate'),
+                'a') as template_file:
+        template_file.write('// Edited.\n')
+      _OverlayTemplateLoader.overlay_dir = overlay_dir
+    self.assertEquals(self._CheckIncrementalEdit(self._Database, edit),
+                      ['DataTransferItemList'] * 2)
+
+  def testIncrementalMonitoredTableEdit(self):
+    def edit():
+      htmlrenamer.renamed_html_members['BarProp.visible'] = 'isVisible'
+    try:
+      self.assertEquals(self._CheckIncrementalEdit(self._Database, edit),
+                        ['BarProp'] * 2)
+    finally:
+      htmlrenamer.renamed_html_members._map.pop('BarProp.visible', None)
+
+  def testRenderingCantUpdateTheDatabase(self):
+    db = self._Database()
+    def generate_interface(interface):
+      db.GetInterfaceForUpdate(interface.id)
+    self.assertRaises(RuntimeError, dartgenerator.DartGenerator().Generate,
+                      db, None, generate_interface)
+    # The database is writable again.
+    db.GetInterfaceForUpdate('BarProp')
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
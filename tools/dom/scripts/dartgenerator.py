@@ -8,6 +8,7 @@
 import emitter
 import idlnode
 import logging
+import multiprocessing
 import os
 import re
 import shutil
@@ -15,6 +16,32 @@ from generator import *
 
 _logger = logging.getLogger('dartgenerator')
 
+# Number of chunks per worker process of a parallel DartGenerator.Generate().
+# Smaller chunks balance the load better, but each one is merged separately.
+_CHUNKS_PER_WORKER = 4
+
+# (interfaces, generate_interface, output) of the worker processes of a
+# parallel DartGenerator.Generate().  Pools are forked after the parent has
+# prepared the interfaces, so the workers share its read-only database.
+_worker_generation = None
+
+def _InitGenerateWorker(generation):
+  global _worker_generation
+  _worker_generation = generation
+  # Only what the worker emits is merged, not what the parent had emitted.
+  (_, _, output) = generation
+  output.Take()
+
+def _GenerateWorker(chunk):
+  """Generates the interfaces of a (start, end) chunk and returns what they
+  emitted."""
+  (interfaces, generate_interface, output) = _worker_generation
+  (start, end) = chunk
+  for interface in interfaces[start:end]:
+    _logger.info('Generating %s' % interface.id)
+    generate_interface(interface)
+  return output.Take()
+
 def MergeNodes(node, other):
   node.operations.extend(other.operations)
   for attribute in other.attributes:
@@ -22,6 +49,7 @@ def MergeNodes(node, other):
       node.attributes.append(attribute)
 
   node.constants.extend(other.constants)
+  node.invalidate_index()
 
 class DartGenerator(object):
   """Utilities to generate Dart APIs and corresponding JavaScript."""
@@ -72,34 +100,66 @@ class DartGenerator(object):
         self._auxiliary_files[name] = os.path.join(dirname, name)
     os.path.walk(auxiliary_dir, Visitor, None)
 
+  def _FilterMembers(self, database, interface, predicate):
+    """Removes the constants, attributes, operations and parents of an
+    interface that don't satisfy predicate.
+
+    The interface is only copied out of a shared (cloned) database when a
+    member is actually removed.
+    """
+    kept = {}
+    changed = False
+    for field in ('constants', 'attributes', 'operations', 'parents'):
+      nodes = getattr(interface, field)
+      kept[field] = [i for i, node in enumerate(nodes) if predicate(node)]
+      changed = changed or len(kept[field]) != len(nodes)
+    if not changed:
+      return
+    interface = database.GetInterfaceForUpdate(interface.id)
+    for field, indices in kept.items():
+      nodes = getattr(interface, field)
+      setattr(interface, field, [nodes[i] for i in indices])
+    interface.invalidate_index()
+
+  def _IdentifiedTypesFilter(self, database):
+    """Returns a function telling whether all the types of a member of an
+    interface are known, that warns about the other members.
+
+    _IsCompoundType() is memoized by type name, so the interfaces,
+    dictionaries and enums of the database must not change while the
+    function is in use.
+    """
+    compound_types = {}
+    def IsIdentified(interface, idl_node):
+      node_name = idl_node.id if idl_node.id else 'parent'
+      for idl_type in idl_node.iter_all(idlnode.IDLType):
+        type_name = idl_type.id
+        if type_name is not None:
+          if type_name not in compound_types:
+            compound_types[type_name] = self._IsCompoundType(database,
+                                                             type_name)
+          if compound_types[type_name]:
+            continue
+        # Ignore constructor warnings.
+        if not (interface.id in ['Window', 'WorkerContext',
+            'WorkerGlobalScope'] and
+            type_name.endswith('Constructor')):
+          _logger.warn('removing %s in %s which has unidentified type %s' %
+                     (node_name, interface.id, type_name))
+        return False
+      return True
+    return IsIdentified
+
   def FilterMembersWithUnidentifiedTypes(self, database):
     """Removes unidentified types.
 
     Removes constants, attributes, operations and parents with unidentified
     types.
     """
-
+    is_identified = self._IdentifiedTypesFilter(database)
     for interface in database.GetInterfaces():
-      def IsIdentified(idl_node):
-        node_name = idl_node.id if idl_node.id else 'parent'
-        for idl_type in idl_node.all(idlnode.IDLType):
-          type_name = idl_type.id
-          if (type_name is not None and
-              self._IsCompoundType(database, type_name)):
-            continue
-          # Ignore constructor warnings.
-          if not (interface.id in ['Window', 'WorkerContext',
-              'WorkerGlobalScope'] and
-              type_name.endswith('Constructor')):
-            _logger.warn('removing %s in %s which has unidentified type %s' %
-                       (node_name, interface.id, type_name))
-          return False
-        return True
-
-      interface.constants = filter(IsIdentified, interface.constants)
-      interface.attributes = filter(IsIdentified, interface.attributes)
-      interface.operations = filter(IsIdentified, interface.operations)
-      interface.parents = filter(IsIdentified, interface.parents)
+      self._FilterMembers(database, interface,
+                          lambda node: is_identified(interface, node))
 
   def FilterInterfaces(self, database,
                        and_annotations=[],
@@ -124,45 +184,50 @@ class DartGenerator(object):
         is marked as displaced it will always be filtered.
       exclude_suppressed -- if a member has this annotation and it
         is marked as suppressed it will always be filtered.
+
+    Members with unidentified types are removed too, as by
+    FilterMembersWithUnidentifiedTypes(), in the same pass.
     """
 
-    # Filter interfaces and members whose annotations don't match.
-    for interface in database.GetInterfaces():
-      def HasAnnotations(idl_node):
-        """Utility for determining if an IDLNode has all
-        the required annotations"""
-        for a in exclude_displaced:
-          if (a in idl_node.annotations
-              and 'via' in idl_node.annotations[a]):
-            return False
-        for a in exclude_suppressed:
-          if (a in idl_node.annotations
-              and 'suppressed' in idl_node.annotations[a]):
-            return False
-        for a in or_annotations:
-          if a in idl_node.annotations:
-            return True
-        if and_annotations == []:
+    def HasAnnotations(idl_node):
+      """Utility for determining if an IDLNode has all
+      the required annotations"""
+      for a in exclude_displaced:
+        if (a in idl_node.annotations
+            and 'via' in idl_node.annotations[a]):
+          return False
+      for a in exclude_suppressed:
+        if (a in idl_node.annotations
+            and 'suppressed' in idl_node.annotations[a]):
+          return False
+      for a in or_annotations:
+        if a in idl_node.annotations:
+          return True
+      if and_annotations == []:
+        return False
+      for a in and_annotations:
+        if a not in idl_node.annotations:
           return False
-        for a in and_annotations:
-          if a not in idl_node.annotations:
-            return False
-        return True
-
-      if HasAnnotations(interface):
-        interface.constants = filter(HasAnnotations, interface.constants)
-        interface.attributes = filter(HasAnnotations, interface.attributes)
-        interface.operations = filter(HasAnnotations, interface.operations)
-        interface.parents = filter(HasAnnotations, interface.parents)
-      else:
+      return True
+
+    # Filter the interfaces whose annotations don't match first: the types
+    # of the members are identified against the remaining ones.
+    for interface in database.GetInterfaces():
+      if not HasAnnotations(interface):
         database.DeleteInterface(interface.id)
 
-    self.FilterMembersWithUnidentifiedTypes(database)
+    is_identified = self._IdentifiedTypesFilter(database)
+    for interface in database.GetInterfaces():
+      self._FilterMembers(
+          database, interface,
+          lambda node: HasAnnotations(node) and is_identified(interface, node))
 
-  def Generate(self, database, super_database, generate_interface):
+  def InterfacesToGenerate(self, database):
+    """Returns the interfaces of the database Generate() renders, parents
+    first."""
     self._database = database
 
-    # Collect interfaces
+    # Collect interfaces.
     interfaces = []
     for interface in database.GetInterfaces():
       if not MatchSourceFilter(interface):
@@ -171,7 +236,7 @@ class DartGenerator(object):
         continue
       interfaces.append(interface)
 
-    # Render all interfaces into Dart and save them in files.
+    ordered_interfaces = []
     for interface in self._PreOrderInterfaces(interfaces):
       interface_name = interface.id
       auxiliary_file = self._auxiliary_files.get(interface_name)
@@ -179,9 +244,65 @@ class DartGenerator(object):
         _logger.info('Skipping %s because %s exists' % (
             interface_name, auxiliary_file))
         continue
+      ordered_interfaces.append(interface)
+    return ordered_interfaces
 
-      _logger.info('Generating %s' % interface.id)
-      generate_interface(interface)
+  def Generate(self, database, super_database, generate_interface,
+               output=None, num_workers=1, cache=None):
+    """Renders the interfaces of the database, parents first.
+
+    Rendering must not modify the database, which is read-only until
+    Generate() returns.  So the interfaces stay shared with the other
+    databases, rendering them in any process or reusing their cached output
+    gives the same result, and the next backend sees the same database.
+
+    Args:
+      generate_interface -- called with each interface to render.
+      output -- required with more than one worker or a cache.
+        Take() returns what was emitted since its last call, in a worker, and
+        Merge() adds it to the emitters of the parent.
+      num_workers -- number of processes rendering the interfaces.  Each
+        renders contiguous chunks of them and the chunks are merged in order,
+        so the output is the same as with a single process.
+      cache -- a GenerationCache to reuse the output of the interfaces whose
+        inputs didn't change.  The others are rendered in this process.
+    """
+    ordered_interfaces = self.InterfacesToGenerate(database)
+    database.SetReadOnly(True)
+    try:
+      self._GenerateInterfaces(ordered_interfaces, generate_interface, output,
+                               num_workers, cache)
+    finally:
+      database.SetReadOnly(False)
+
+  def _GenerateInterfaces(self, ordered_interfaces, generate_interface,
+                          output, num_workers, cache):
+    # Render all interfaces into Dart and save them in files.
+    if cache is not None:
+      for interface in ordered_interfaces:
+        cache.Generate(interface, generate_interface, output)
+      return
+
+    if num_workers <= 1 or len(ordered_interfaces) <= 1:
+      for interface in ordered_interfaces:
+        _logger.info('Generating %s' % interface.id)
+        generate_interface(interface)
+      return
+
+    chunk_size = -(-len(ordered_interfaces) //
+                   (num_workers * _CHUNKS_PER_WORKER))
+    chunks = [(start, start + chunk_size)
+              for start in range(0, len(ordered_interfaces), chunk_size)]
+    pool = multiprocessing.Pool(
+        num_workers, _InitGenerateWorker,
+        ((ordered_interfaces, generate_interface, output),))
+    try:
+      # Chunks come back in order, so the merge is deterministic.
+      for chunk_output in pool.imap(_GenerateWorker, chunks):
+        output.Merge(chunk_output)
+    finally:
+      pool.close()
+      pool.join()
 
   def _PreOrderInterfaces(self, interfaces):
     """Returns the interfaces in pre-order, i.e. parents first."""
@@ -204,32 +325,31 @@ class DartGenerator(object):
     return ordered
 
   def IsEventTarget(self, database, interface):
-    if interface.id == 'EventTarget':
-      return True
-    for parent in interface.parents:
-      parent_name = parent.type.id
-      if database.HasInterface(parent_name):
-        parent_interface = database.GetInterface(parent.type.id)
-        if self.IsEventTarget(database, parent_interface):
-          return True
-    return False
+    return database.InheritsFrom(interface, 'EventTarget')
 
   def FixEventTargets(self, database):
     for interface in database.GetInterfaces():
       if self.IsEventTarget(database, interface):
+        if ('EventTarget' in interface.ext_attrs and
+            interface.ext_attrs['EventTarget'] is None):
+          continue
         # Add as an attribute for easy querying in generation code.
+        interface = database.GetInterfaceForUpdate(interface.id)
         interface.ext_attrs['EventTarget'] = None
       elif 'EventTarget' in interface.ext_attrs:
         # Create fake EventTarget parent interface for interfaces that have
         # 'EventTarget' extended attribute.
         ast = [('Annotation', [('Id', 'WebKit')]),
                ('InterfaceType', ('ScopedName', 'EventTarget'))]
+        interface = database.GetInterfaceForUpdate(interface.id)
         interface.parents.append(idlnode.IDLParentInterface(ast))
+        interface.invalidate_index()
 
   def AddMissingArguments(self, database):
     ARG = idlnode.IDLArgument([('Type', ('ScopedName', 'object')), ('Id', 'arg')])
     for interface in database.GetInterfaces():
-      for operation in interface.operations:
+      updated_interface = None
+      for index, operation in enumerate(interface.operations):
         call_with = operation.ext_attrs.get('CallWith', [])
         if not(isinstance(call_with, list)):
           call_with = [call_with]
@@ -239,4 +359,7 @@ class DartGenerator(object):
         call_with = call_with + constructor_with
 
         if 'ScriptArguments' in call_with:
-          operation.arguments.append(ARG)
+          if updated_interface is None:
+            updated_interface = database.GetInterfaceForUpdate(interface.id)
+          updated_interface.operations[index].arguments.append(ARG)
+          updated_interface.invalidate_index()
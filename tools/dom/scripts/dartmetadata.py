@@ -8,6 +8,8 @@ DOM APIs.
 """
 
 import copy
+import dependencies
+import hashlib
 import json
 import logging
 import monitored
@@ -612,13 +614,39 @@ class DartMetadata(object):
                logging_level=logging.WARNING):
     _logger.setLevel(logging_level)
     self._api_status_path = api_status_path
-    status_file = open(self._api_status_path, 'r+')
-    self._types = json.load(status_file)
-    status_file.close()
+    self._doc_comments_path = doc_comments_path
+    # The content of dom.json and docs.json, loaded on first use by
+    # _LoadTypes() and _LoadDocComments().
+    self._types = None
+    self._monitored_types = None
+    self._doc_comments = None
+
+    # Hashes of the status and docs of each interface, see Fingerprint().
+    self._fingerprints = None
+
+    # (interface id, member id or None, support info) added to the types
+    # since the last TakeNewSupportInfo().
+    self._new_support_info = []
+    # Ids of the interfaces whose types changed since they were loaded.
+    self._dirty_types = set()
+
+    # _GetSupportLevelAnnotations() by (interface id, member id), and
+    # FormatMetadata() by (metadata, indentation).
+    self._support_level_annotations = {}
+    self._formatted_metadata = {}
 
-    comments_file = open(doc_comments_path, 'r+')
-    self._doc_comments = json.load(comments_file)
-    comments_file.close()
+    if _monitor_type_metadata:
+      # The monitored collections must be created in the same order in all
+      # the processes of the generation.
+      self._LoadTypes()
+
+  def _LoadTypes(self):
+    """Returns the types of dom.json, loading them first if needed."""
+    if self._types is not None:
+      return self._types
+
+    with open(self._api_status_path) as status_file:
+      self._types = json.load(status_file)
 
     if _monitor_type_metadata:
       monitored_interfaces = {}
@@ -633,6 +661,14 @@ class DartMetadata(object):
           monitored_interfaces)
     else:
       self._monitored_types = self._types
+    return self._types
+
+  def _LoadDocComments(self):
+    """Returns the comments of docs.json, loading them first if needed."""
+    if self._doc_comments is None:
+      with open(self._doc_comments_path) as comments_file:
+        self._doc_comments = json.load(comments_file)
+    return self._doc_comments
 
   def GetFormattedMetadata(self, library_name, interface, member_id=None,
       indentation=''):
@@ -722,9 +758,11 @@ class DartMetadata(object):
 
     # Add documentation from JSON.
     comments = []
+    dependencies.Record(('metadata', interface.id))
+    doc_comments = self._LoadDocComments()
     library_name = 'dart.dom.%s' % library_name
-    if library_name in self._doc_comments:
-      library_info = self._doc_comments[library_name]
+    if library_name in doc_comments:
+      library_info = doc_comments[library_name]
       if interface.id in library_info:
         interface_info = library_info[interface.id]
         if member_name:
@@ -748,9 +786,11 @@ class DartMetadata(object):
 
   def FormatMetadata(self, metadata, indentation):
     if metadata:
-      newline = '\n%s' % indentation
-      result = newline.join(metadata) + newline
-      return result
+      key = (tuple(metadata), indentation)
+      if key not in self._formatted_metadata:
+        newline = '\n%s' % indentation
+        self._formatted_metadata[key] = newline.join(metadata) + newline
+      return self._formatted_metadata[key]
     return ''
 
   def _GetDart2JSSpecificAnnotations(self, idl_type, interface_name, member_name):
@@ -777,6 +817,8 @@ class DartMetadata(object):
     """ Looks up the interface or member in the DOM status list and returns the
     support level for it.
     """
+    dependencies.Record(('metadata', interface_id))
+    types = self._LoadTypes()
     if interface_id in self._monitored_types:
       type_info = self._monitored_types[interface_id]
     else:
@@ -784,7 +826,9 @@ class DartMetadata(object):
         'members': {},
         'support_level': 'untriaged',
       }
-      self._types[interface_id] = type_info
+      types[interface_id] = type_info
+      self._new_support_info.append((interface_id, None, type_info))
+      self._dirty_types.add(interface_id)
 
     if not member_id:
       return type_info
@@ -799,12 +843,25 @@ class DartMetadata(object):
       else:
         member_info = {'support_level': 'untriaged'}
       members[member_id] = member_info
+      self._new_support_info.append((interface_id, member_id, member_info))
+      self._dirty_types.add(interface_id)
 
     return member_info
 
   def _GetSupportLevelAnnotations(self, interface_id, member_id=None):
     """ Gets annotations for API support status.
     """
+    key = (interface_id, member_id)
+    if key in self._support_level_annotations:
+      dependencies.Record(('metadata', interface_id))
+      return self._support_level_annotations[key]
+    annotations = self._ComputeSupportLevelAnnotations(interface_id,
+                                                       member_id)
+    # The support info of a member doesn't change once it is added.
+    self._support_level_annotations[key] = annotations
+    return annotations
+
+  def _ComputeSupportLevelAnnotations(self, interface_id, member_id):
     support_info = self._GetSupportInfo(interface_id, member_id)
 
     dart_action = support_info.get('dart_action')
@@ -856,9 +913,71 @@ class DartMetadata(object):
     else:
       _logger.warn('Unknown support_level - %s:%s' % (interface_id, member_id))
 
-    return annotations
+    return tuple(annotations)
+
+  def TakeNewSupportInfo(self):
+    """Returns the support info added since the last call, for
+    MergeSupportInfo() in another process."""
+    new_support_info = self._new_support_info
+    self._new_support_info = []
+    return new_support_info
+
+  def MergeSupportInfo(self, new_support_info):
+    """Adds the support info returned by TakeNewSupportInfo(), keeping the
+    existing entries.
+
+    The entries added are new again for the next TakeNewSupportInfo(), e.g.
+    those of the cached output of a backend generated in a child process.
+    """
+    types = self._LoadTypes()
+    for (interface_id, member_id, support_info) in new_support_info:
+      if member_id is None:
+        entries = types
+        key = interface_id
+      else:
+        entries = types[interface_id]['members']
+        key = member_id
+      if key not in entries:
+        entries[key] = support_info
+        self._new_support_info.append(
+            (interface_id, member_id, support_info))
+        self._dirty_types.add(interface_id)
+
+  def Fingerprint(self, interface_id):
+    """Returns a hash of what dom.json and docs.json say about the interface,
+    for the ('metadata', interface_id) dependencies recorded by the lookups.
+
+    The files are read again: the entries added since they were loaded are
+    derived from the other inputs.
+    """
+    if self._fingerprints is None:
+      with open(self._api_status_path) as status_file:
+        types = json.load(status_file)
+      with open(self._doc_comments_path) as comments_file:
+        doc_comments = json.load(comments_file)
+      entries = {}
+      for (type_id, type_info) in types.iteritems():
+        entries[type_id] = [type_info]
+      for (library_name, library_info) in sorted(doc_comments.iteritems()):
+        for (type_id, type_comments) in library_info.iteritems():
+          entries.setdefault(type_id, [None]).append(
+              (library_name, type_comments))
+      self._fingerprints = dict(
+          (type_id,
+           hashlib.sha1(json.dumps(entry, sort_keys=True)).hexdigest())
+          for (type_id, entry) in entries.iteritems())
+    return self._fingerprints.get(interface_id)
 
   def Flush(self):
-    json_file = open(self._api_status_path, 'w+')
+    """Writes the types back to dom.json if any were added, replacing the
+    file atomically."""
+    if not self._dirty_types:
+      return
+    _logger.info('Updating the support info of %s interfaces in %s' % (
+        len(self._dirty_types), self._api_status_path))
+    temp_path = '%s.tmp' % self._api_status_path
+    json_file = open(temp_path, 'w')
     json.dump(self._types, json_file, indent=2, separators=(',', ': '), sort_keys=True)
     json_file.close()
+    os.rename(temp_path, self._api_status_path)
+    self._dirty_types = set()
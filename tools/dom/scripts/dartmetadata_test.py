@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for dartmetadata module."""
+
+import json
+import logging.config
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+from dartmetadata import DartMetadata
+
+
+class DartMetadataTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self._working_dir = tempfile.mkdtemp()
+    self._api_status_path = os.path.join(self._working_dir, 'dom.json')
+    self._types = {
+        'Window': {'members': {'open': {}, 'close': {}},
+                   'support_level': 'stable'},
+        'BarProp': {'members': {'visible': {}}},
+    }
+    with open(self._api_status_path, 'w') as status_file:
+      json.dump(self._types, status_file)
+    # An old mtime, so that rewriting the file changes it.
+    os.utime(self._api_status_path, (1000000000, 1000000000))
+    self._metadata = DartMetadata(
+        self._api_status_path, os.path.join(self._working_dir, 'docs.json'))
+
+  def tearDown(self):
+    shutil.rmtree(self._working_dir)
+
+  def testCleanFlushKeepsFile(self):
+    self._metadata.MergeSupportInfo([('Window', 'open', {})])
+    self._metadata.Flush()
+    self.assertEquals(os.stat(self._api_status_path).st_mtime, 1000000000)
+
+  def testDirtyFlushWritesSortedJson(self):
+    support_info = {'support_level': 'untriaged'}
+    self._metadata.MergeSupportInfo([('BarProp', 'collapsed', support_info)])
+    inode = os.stat(self._api_status_path).st_ino
+    self._metadata.Flush()
+
+    self._types['BarProp']['members']['collapsed'] = support_info
+    expected = StringIO.StringIO()
+    json.dump(self._types, expected, indent=2, separators=(',', ': '),
+              sort_keys=True)
+    with open(self._api_status_path) as status_file:
+      self.assertEquals(status_file.read(), expected.getvalue())
+    # Written to a temporary file, then renamed.
+    self.assertNotEquals(os.stat(self._api_status_path).st_ino, inode)
+    self.assertEquals(os.listdir(self._working_dir), ['dom.json'])
+
+    # Flushed once.
+    os.utime(self._api_status_path, (1000000000, 1000000000))
+    self._metadata.Flush()
+    self.assertEquals(os.stat(self._api_status_path).st_mtime, 1000000000)
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
@@ -6,17 +6,70 @@
 """Module to manage IDL files."""
 
 import copy
+import dependencies
+import hashlib
 import pickle
 import logging
+import multiprocessing
 import os
 import os.path
 import shutil
+import time
 import idlnode
 import idlrenderer
 from generator import IsDartCollectionType, IsPureInterface
 
 _logger = logging.getLogger('database')
 
+# Version of the per-interface cache entries.  Bump it whenever the parser or
+# the pickled IDLNode representation changes; entries written by another
+# version are then never looked up again.
+_CACHE_VERSION = 2
+
+# IDL parser used by worker processes of a parallel Database.Load().
+_worker_idlparser = None
+
+
+def _ContentHash(content):
+  """Returns the cache key of an IDL file with the given content."""
+  return hashlib.sha1('%s\n%s' % (_CACHE_VERSION, content)).hexdigest()
+
+
+def _ReadFile(file_name):
+  f = open(file_name, 'r')
+  content = f.read()
+  f.close()
+  return content
+
+
+def _ParseInterfaceFile(idl_parser, file_name):
+  """Parses a database IDL file.
+
+  Returns:
+    A (content hash, IDLInterface) pair.
+  """
+  content = _ReadFile(file_name)
+
+  # Parse file:
+  idl_file = idlnode.IDLFile(idl_parser.parse(content), file_name)
+
+  if not idl_file.interfaces:
+    raise RuntimeError('No interface found in %s' % file_name)
+  elif len(idl_file.interfaces) > 1:
+    raise RuntimeError('Expected one interface in %s' % file_name)
+
+  return (_ContentHash(content), idl_file.interfaces[0])
+
+
+def _InitLoadWorker(idl_parser):
+  global _worker_idlparser
+  _worker_idlparser = idl_parser
+
+
+def _LoadWorker(file_name):
+  """Entry point of a Database.Load() worker process."""
+  return _ParseInterfaceFile(_worker_idlparser, file_name)
+
 
 class Database(object):
   """The Database class manages a collection of IDL files stored
@@ -44,23 +97,78 @@ class Database(object):
     self._interfaces_to_delete = []
     self._enums = {}
     self._all_dictionaries = {}
+    # Content hash of the IDL file each unmodified interface was loaded from.
+    self._content_hashes = {}
+    # (interface, number of databases referencing it) for each shared
+    # interface, by id().  Holding the interface keeps its id() from being
+    # reused while the entry exists.  The dict itself is shared by a database
+    # and its clones.
+    self._share_counts = {}
+    # (Hierarchy(), ids in it, dependencies of it) by interface name, and
+    # the names of the hierarchies that looked up each interface name.
+    self._hierarchies = {}
+    self._hierarchy_dependents = {}
+    self._hierarchy_hits = 0
+    self._hierarchy_misses = 0
+    self._read_only = False
 
   def Clone(self):
+    """Returns a copy-on-write copy of the database.
+
+    Both databases share their interfaces until one of them gets an interface
+    through GetInterfaceForUpdate(), which copies it first.  Enums and
+    dictionaries are shared as is; they are not modified once the database is
+    built.
+    """
     new_database = Database(self._root_dir)
-    new_database._all_interfaces = copy.deepcopy(self._all_interfaces)
-    new_database._interfaces_to_delete = copy.deepcopy(
-        self._interfaces_to_delete)
-    new_database._enums = copy.deepcopy(self._enums)
-    new_database._all_dictionaries = copy.deepcopy(self._all_dictionaries)
+    new_database._all_interfaces = dict(self._all_interfaces)
+    new_database._interfaces_to_delete = list(self._interfaces_to_delete)
+    new_database._enums = dict(self._enums)
+    new_database._all_dictionaries = dict(self._all_dictionaries)
+    new_database._content_hashes = dict(self._content_hashes)
+
+    new_database._share_counts = self._share_counts
+    for interface in self._all_interfaces.values():
+      (_, count) = self._share_counts.get(id(interface), (interface, 1))
+      self._share_counts[id(interface)] = (interface, count + 1)
 
     return new_database
 
+  def SetReadOnly(self, read_only):
+    """While the database is read-only, e.g. while its interfaces are
+    rendered, adding, deleting or updating an interface raises an error."""
+    self._read_only = read_only
+
+  def _CheckWritable(self):
+    if self._read_only:
+      raise RuntimeError('The database is read-only')
+
+  def _ReleaseInterface(self, interface):
+    """Drops this database's reference to a possibly shared interface."""
+    if not self._IsShared(interface):
+      return
+    key = id(interface)
+    (_, count) = self._share_counts[key]
+    if count > 2:
+      self._share_counts[key] = (interface, count - 1)
+    else:
+      del self._share_counts[key]
+
+  def _IsShared(self, interface):
+    entry = self._share_counts.get(id(interface))
+    return entry is not None and entry[0] is interface
+
   def Delete(self):
     """Deletes the database by deleting its directory"""
     if os.path.exists(self._root_dir):
       shutil.rmtree(self._root_dir)
     # reset in-memory constructs
+    for interface in self._all_interfaces.values():
+      self._ReleaseInterface(interface)
     self._all_interfaces = {}
+    self._content_hashes = {}
+    self._hierarchies = {}
+    self._hierarchy_dependents = {}
 
   def _ScanForInterfaces(self):
     """Iteratores over the database files and lists all interface names.
@@ -78,7 +186,7 @@ class Database(object):
             res.append(root)
 
     os.path.walk(self._root_dir, Visitor, None)
-    return res
+    return sorted(res)
 
   def _FilePath(self, interface_name):
     """Calculates the file path that a given interface should
@@ -102,67 +210,202 @@ class Database(object):
     if not os.path.exists(file_name):
       return None
 
-    f = open(file_name, 'r')
-    content = f.read()
-    f.close()
-
-    # Parse file:
-    idl_file = idlnode.IDLFile(self._idlparser.parse(content), file_name)
-
-    if not idl_file.interfaces:
-      raise RuntimeError('No interface found in %s' % file_name)
-    elif len(idl_file.interfaces) > 1:
-      raise RuntimeError('Expected one interface in %s' % file_name)
-
-    interface = idl_file.interfaces[0]
+    (content_hash, interface) = _ParseInterfaceFile(self._idlparser,
+                                                    file_name)
     self._all_interfaces[interface_name] = interface
+    self._content_hashes[interface_name] = content_hash
     return interface
 
-  def Load(self):
+  def _LoadInterfaceFiles(self, interface_names, parallel, num_workers):
+    """Parses the given interfaces' IDL files, optionally in a process pool.
+
+    Returns:
+      The number of worker processes used.
+    """
+    if not parallel or len(interface_names) <= 1:
+      for interface_name in interface_names:
+        self._LoadInterfaceFile(interface_name)
+      return 1
+
+    num_workers = num_workers or multiprocessing.cpu_count()
+    file_names = [self._FilePath(name) for name in interface_names]
+    pool = multiprocessing.Pool(num_workers, _InitLoadWorker,
+                                (self._idlparser,))
+    try:
+      results = pool.map(_LoadWorker, file_names)
+    finally:
+      pool.close()
+      pool.join()
+    # Results come back in file order, so the merge is deterministic.
+    for interface_name, (content_hash, interface) in zip(interface_names,
+                                                         results):
+      self._all_interfaces[interface_name] = interface
+      self._content_hashes[interface_name] = content_hash
+    return num_workers
+
+  def Load(self, parallel=False, num_workers=None):
     """Loads all interfaces into memory.
+
+    Args:
+      parallel -- if True, the IDL files are parsed by a pool of worker
+        processes.
+      num_workers -- size of the worker pool, defaults to the number of
+        CPUs.
     """
-    # FIXME: Speed this up by multi-threading.
-    for (interface_name) in self._ScanForInterfaces():
-      self._LoadInterfaceFile(interface_name)
+    start_time = time.time()
+
+    interface_names = self._ScanForInterfaces()
+    num_workers = self._LoadInterfaceFiles(interface_names, parallel,
+                                           num_workers)
+
+    print 'Loaded %s interfaces in %s seconds (%s workers)' % (
+        len(interface_names), round(time.time() - start_time, 2), num_workers)
     self.Cache()
 
+  def _CacheDir(self):
+    return os.path.join(self._root_dir, 'cache')
+
+  def _CacheEntryPath(self, content_hash):
+    return os.path.join(self._CacheDir(), '%s.pickle' % content_hash)
+
+  def _LoadCacheEntry(self, content_hash):
+    """Returns the cached IDLInterface for an IDL file content hash, or None
+    if there is no usable entry."""
+    entry_path = self._CacheEntryPath(content_hash)
+    if not os.path.isfile(entry_path):
+      return None
+    input_file = open(entry_path, 'rb')
+    try:
+      return pickle.load(input_file)
+    except Exception, e:
+      _logger.warn('ignoring unreadable cache entry %s: %s' % (entry_path, e))
+      return None
+    finally:
+      input_file.close()
+
   def Cache(self):
-    """Serialize the database using pickle for faster startup in the future
+    """Serializes the interfaces loaded from IDL files into per-interface
+    cache entries keyed by the content hash of their file.
+
+    Entries which no longer match any IDL file are removed.  Interfaces that
+    were added in memory and not saved yet have no content hash and are not
+    cached.  Call it on a freshly loaded or freshly saved database: an
+    interface modified in memory after loading would be cached under the hash
+    of its old file.
     """
-    output_file = open(os.path.join(self._root_dir, 'cache.pickle'), 'wb')
-    pickle.dump(self._all_interfaces, output_file)
-    pickle.dump(self._interfaces_to_delete, output_file)
+    cache_dir = self._CacheDir()
+    if not os.path.exists(cache_dir):
+      os.makedirs(cache_dir)
+
+    live_entries = set()
+    for interface_name, content_hash in self._content_hashes.items():
+      if interface_name not in self._all_interfaces:
+        continue
+      live_entries.add('%s.pickle' % content_hash)
+      entry_path = self._CacheEntryPath(content_hash)
+      if os.path.exists(entry_path):
+        continue
+      # Write to a temporary file first so an interrupted run never leaves a
+      # truncated entry behind.
+      temp_path = '%s.tmp' % entry_path
+      output_file = open(temp_path, 'wb')
+      pickle.dump(self._all_interfaces[interface_name], output_file,
+                  pickle.HIGHEST_PROTOCOL)
+      output_file.close()
+      os.rename(temp_path, entry_path)
+
+    for entry in os.listdir(cache_dir):
+      if entry not in live_entries:
+        _logger.debug('removing stale cache entry %s' % entry)
+        os.remove(os.path.join(cache_dir, entry))
+
+    # Remove the monolithic cache of older versions.
+    legacy_cache = os.path.join(self._root_dir, 'cache.pickle')
+    if os.path.exists(legacy_cache):
+      os.remove(legacy_cache)
+
+  def HasCompleteCache(self):
+    """Returns True if every IDL file of the database has a cache entry, so
+    LoadFromCache() does not need to parse anything."""
+    for interface_name in self._ScanForInterfaces():
+      content_hash = _ContentHash(_ReadFile(self._FilePath(interface_name)))
+      if not os.path.isfile(self._CacheEntryPath(content_hash)):
+        return False
+    return True
+
+  def LoadFromCache(self, parallel=False, num_workers=None):
+    """Loads all interfaces into memory, reusing the cache entries of IDL
+    files whose content did not change.  Only new or modified files are
+    parsed, and the cache is refreshed afterwards.
 
-  def LoadFromCache(self):
-    """Deserialize the database using pickle for fast startup
+    Args:
+      parallel -- if True, modified IDL files are parsed by a pool of worker
+        processes.
+      num_workers -- size of the worker pool, defaults to the number of
+        CPUs.
     """
-    input_file_name = os.path.join(self._root_dir, 'cache.pickle')
-    if not os.path.isfile(input_file_name):
-      self.Load()
-      return
-    input_file = open(input_file_name, 'rb')
-    self._all_interfaces = pickle.load(input_file)
-    self._interfaces_to_delete = pickle.load(input_file)
-    input_file.close()
+    start_time = time.time()
+
+    interface_names = self._ScanForInterfaces()
+    misses = []
+    for interface_name in interface_names:
+      content = _ReadFile(self._FilePath(interface_name))
+      content_hash = _ContentHash(content)
+      interface = self._LoadCacheEntry(content_hash)
+      if interface is None:
+        misses.append(interface_name)
+        continue
+      self._all_interfaces[interface_name] = interface
+      self._content_hashes[interface_name] = content_hash
+
+    self._LoadInterfaceFiles(misses, parallel, num_workers)
+
+    print 'Loaded %s interfaces (%s from cache, %s parsed) in %s seconds' % (
+        len(interface_names), len(interface_names) - len(misses), len(misses),
+        round(time.time() - start_time, 2))
+    self.Cache()
 
   def Save(self):
-    """Saves all in-memory interfaces into files."""
+    """Saves all in-memory interfaces into files.  Only files whose content
+    changes are rewritten.
+
+    Returns:
+      The number of files written.
+    """
+    written = 0
     for interface in self._all_interfaces.values():
-      self._SaveInterfaceFile(interface)
+      if self._SaveInterfaceFile(interface):
+        written += 1
     for interface_name in self._interfaces_to_delete:
-      self._DeleteInterfaceFile(interface_name)
+      # The interface may have been deleted and then added again.
+      if interface_name not in self._all_interfaces:
+        self._DeleteInterfaceFile(interface_name)
+    self._interfaces_to_delete = []
+    return written
 
   def _SaveInterfaceFile(self, interface):
     """Saves an interface into the database.
 
+    Returns:
+      True if the file was written, False if it was already up to date.
     Args:
       interface -- an IDLInterface instance.
     """
 
     interface_name = interface.id
 
-    # Actual saving
+    # Render the IDLInterface object into text.
+    text = idlrenderer.render(interface)
+    content_hash = _ContentHash(text)
+
     file_path = self._FilePath(interface_name)
+    if self._content_hashes.get(interface_name) == content_hash:
+      return False
+    if os.path.exists(file_path) and _ReadFile(file_path) == text:
+      self._content_hashes[interface_name] = content_hash
+      return False
+
+    # Actual saving
     _logger.debug('writing %s' % file_path)
 
     dir_name = os.path.dirname(file_path)
@@ -170,15 +413,17 @@ class Database(object):
       _logger.debug('creating directory %s' % dir_name)
       os.mkdir(dir_name)
 
-    # Render the IDLInterface object into text.
-    text = idlrenderer.render(interface)
-
     f = open(file_path, 'w')
     f.write(text)
     f.close()
+    # The in-memory interface is what the file now describes, so Cache() can
+    # store it under the new content hash.
+    self._content_hashes[interface_name] = content_hash
+    return True
 
   def HasInterface(self, interface_name):
     """Returns True if the interface is in memory"""
+    dependencies.Record(('interface', interface_name))
     return interface_name in self._all_interfaces
 
   def GetInterface(self, interface_name):
@@ -188,10 +433,30 @@ class Database(object):
     Args:
       interface_name -- the name of the interface.
     """
+    dependencies.Record(('interface', interface_name))
     if interface_name not in self._all_interfaces:
       raise RuntimeError('Interface %s is not loaded' % interface_name)
     return self._all_interfaces[interface_name]
 
+  def GetInterfaceForUpdate(self, interface_name):
+    """Returns the IDLInterface corresponding to the interface_name, copying
+    it first if it is shared with a clone of this database.  Use it instead
+    of GetInterface() before modifying an interface.
+
+    Args:
+      interface_name -- the name of the interface.
+    """
+    self._CheckWritable()
+    interface = self.GetInterface(interface_name)
+    self._ForgetHierarchies(interface_name)
+    if self._IsShared(interface):
+      self._ReleaseInterface(interface)
+      interface = copy.deepcopy(interface)
+      self._all_interfaces[interface_name] = interface
+    # The interface no longer matches its IDL file.
+    self._content_hashes.pop(interface_name, None)
+    return interface
+
   def AddInterface(self, interface):
     """Returns an IDLInterface corresponding to the interface_name
     from memory.
@@ -199,13 +464,16 @@ class Database(object):
     Args:
       interface -- the name of the interface.
     """
+    self._CheckWritable()
     interface_name = interface.id
     if interface_name in self._all_interfaces:
       raise RuntimeError('Interface %s already exists' % interface_name)
+    self._ForgetHierarchies(interface_name)
     self._all_interfaces[interface_name] = interface
 
   def GetInterfaces(self):
     """Returns a list of all loaded interfaces."""
+    dependencies.Record(('interfaces',))
     res = []
     for _, interface in sorted(self._all_interfaces.items()):
       res.append(interface)
@@ -218,10 +486,14 @@ class Database(object):
     Args:
       interface_name -- the name of the interface.
     """
+    self._CheckWritable()
     if interface_name not in self._all_interfaces:
       raise RuntimeError('Interface %s not found' % interface_name)
     self._interfaces_to_delete.append(interface_name)
+    self._ReleaseInterface(self._all_interfaces[interface_name])
     del self._all_interfaces[interface_name]
+    self._content_hashes.pop(interface_name, None)
+    self._ForgetHierarchies(interface_name)
 
   def _DeleteInterfaceFile(self, interface_name):
     """Actual file deletion"""
@@ -231,25 +503,80 @@ class Database(object):
       os.remove(file_path)
 
   def Hierarchy(self, interface):
-    yield interface
-    for parent in interface.parents:
-      parent_name = parent.type.id
-      if not self.HasInterface(parent.type.id):
-        continue
-      for parent_interface in self.Hierarchy(self.GetInterface(parent.type.id)):
-        yield parent_interface
+    """Returns a tuple of the interface and its ancestors in the database,
+    depth first.
+
+    The hierarchy of each interface is computed once, until one of the
+    interfaces in it goes through GetInterfaceForUpdate(), which must be used
+    to change the parents of an interface.
+    """
+    return self._HierarchyEntry(interface)[0]
+
+  def InheritsFrom(self, interface, ancestor_name):
+    """Returns True if the interface is, or inherits from, the interface
+    named ancestor_name, e.g. 'Node' or 'EventTarget'."""
+    return ancestor_name in self._HierarchyEntry(interface)[1]
+
+  def HierarchyCacheStats(self):
+    """Returns (hits, misses, size) of the Hierarchy() cache."""
+    return (self._hierarchy_hits, self._hierarchy_misses,
+            len(self._hierarchies))
+
+  def _HierarchyEntry(self, interface):
+    entry = self._hierarchies.get(interface.id)
+    # Interfaces that are not, or no longer, in the database aren't cached.
+    if entry is not None and entry[0][0] is interface:
+      self._hierarchy_hits += 1
+    else:
+      self._hierarchy_misses += 1
+      hierarchy = []
+      looked_up = set()
+      def walk(interface):
+        hierarchy.append(interface)
+        for parent in interface.parents:
+          parent_name = parent.type.id
+          looked_up.add(parent_name)
+          if parent_name in self._all_interfaces:
+            walk(self._all_interfaces[parent_name])
+      walk(interface)
+      entry = (tuple(hierarchy),
+               frozenset(ancestor.id for ancestor in hierarchy),
+               frozenset(('interface', name) for name in looked_up))
+      if self._all_interfaces.get(interface.id) is interface:
+        self._hierarchies[interface.id] = entry
+        for name in looked_up | set([interface.id]):
+          self._hierarchy_dependents.setdefault(name, set()).add(interface.id)
+    # The same dependencies as looking up the ancestors one by one.
+    dependencies.Replay(entry[2])
+    return entry
+
+  def _ForgetHierarchies(self, interface_name):
+    """Drops the cached hierarchies that looked up interface_name."""
+    for name in self._hierarchy_dependents.pop(interface_name, ()):
+      self._hierarchies.pop(name, None)
 
   def HasEnum(self, enum_name):
+    dependencies.Record(('enum', enum_name))
     return enum_name in self._enums
 
   def GetEnum(self, enum_name):
+    dependencies.Record(('enum', enum_name))
     return self._enums[enum_name]
 
   def AddEnum(self, enum):
     self._enums[enum.id] = enum
 
+  def DeleteEnum(self, enum_name):
+    del self._enums[enum_name]
+
+  def GetEnums(self):
+    """Returns a list of all loaded enums."""
+    dependencies.Record(('enums',))
+    return [enum for _, enum in sorted(self._enums.items())]
+
   def HasDictionary(self, dictionary_name):
     """Returns True if the dictionary is in memory"""
+    dependencies.Record(('dictionary', dictionary_name))
     return dictionary_name in self._all_dictionaries
 
   def GetDictionary(self, dictionary_name):
@@ -259,6 +586,7 @@ class Database(object):
     Args:
       dictionary_name -- the name of the dictionary.
     """
+    dependencies.Record(('dictionary', dictionary_name))
     if dictionary_name not in self._all_dictionaries:
       raise RuntimeError('Dictionary %s is not loaded' % dictionary_name)
     return self._all_dictionaries[dictionary_name]
@@ -275,8 +603,19 @@ class Database(object):
       raise RuntimeError('Dictionary %s already exists' % dictionary_name)
     self._all_dictionaries[dictionary_name] = dictionary
 
+  def DeleteDictionary(self, dictionary_name):
+    """Deletes a dictionary from memory.
+
+    Args:
+      dictionary_name -- the name of the dictionary.
+    """
+    if dictionary_name not in self._all_dictionaries:
+      raise RuntimeError('Dictionary %s not found' % dictionary_name)
+    del self._all_dictionaries[dictionary_name]
+
   def GetDictionaries(self):
     """Returns a list of all loaded dictionaries."""
+    dependencies.Record(('dictionaries',))
     res = []
     for _, dictionary in sorted(self._all_dictionaries.items()):
       res.append(dictionary)
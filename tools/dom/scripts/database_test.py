@@ -80,12 +80,77 @@ class DatabaseTestCase(unittest.TestCase):
         os.path.exists(os.path.join(self._database_dir, 'I1.idl')))
     self.assertEquals(self._ListInterfaces(db), [])
 
+  def testParallelLoad(self):
+    db = database.Database(self._database_dir)
+    db.Load()
+    db.AddInterface(self._ParseInterface('interface I3 {};'))
+    db.AddInterface(self._ParseInterface('interface I2 {};'))
+    db.Save()
+
+    parallel_db = database.Database(self._database_dir)
+    parallel_db.Load(parallel=True, num_workers=2)
+    self.assertEquals(self._ListInterfaces(parallel_db), ['I1', 'I2', 'I3'])
+
+  def testLoadFromCache(self):
+    db = database.Database(self._database_dir)
+    db.Load()
+    cache_dir = os.path.join(self._database_dir, 'cache')
+    self.assertEquals(len(os.listdir(cache_dir)), 1)
+
+    cached_db = database.Database(self._database_dir)
+    cached_db.LoadFromCache()
+    self.assertEquals(self._ListInterfaces(cached_db), ['I1'])
+
+    # Editing the IDL file invalidates its cache entry.
+    cached_db.DeleteInterface('I1')
+    cached_db.AddInterface(
+        self._ParseInterface('interface I1 { attribute long a; };'))
+    cached_db.Save()
+
+    db = database.Database(self._database_dir)
+    db.LoadFromCache()
+    self.assertEquals(len(db.GetInterface('I1').attributes), 1)
+    self.assertEquals(len(os.listdir(cache_dir)), 1)
+
   def testGetInterface(self):
     db = database.Database(self._database_dir)
     db.Load()
     interface = db.GetInterface('I1')
     self.assertEquals(interface.id, 'I1')
 
+  def testCloneCopyOnWrite(self):
+    db = database.Database(self._database_dir)
+    db.Load()
+    clone = db.Clone()
+    self.assertTrue(clone.GetInterface('I1') is db.GetInterface('I1'))
+
+    interface = clone.GetInterfaceForUpdate('I1')
+    self.assertFalse(interface is db.GetInterface('I1'))
+    self.assertTrue(clone.GetInterface('I1') is interface)
+    # The copy is no longer shared.
+    self.assertTrue(clone.GetInterfaceForUpdate('I1') is interface)
+    self.assertTrue(db.GetInterfaceForUpdate('I1') is db.GetInterface('I1'))
+
+  def testHierarchy(self):
+    db = database.Database(self._database_dir)
+    db.Load()
+    db.AddInterface(self._ParseInterface('interface I2 : I1 {};'))
+    db.AddInterface(self._ParseInterface('interface I3 : I2, Missing {};'))
+    i3 = db.GetInterface('I3')
+    self.assertEquals([interface.id for interface in db.Hierarchy(i3)],
+                      ['I3', 'I2', 'I1'])
+    self.assertTrue(db.InheritsFrom(i3, 'I1'))
+    self.assertFalse(db.InheritsFrom(i3, 'Missing'))
+    self.assertEquals(db.HierarchyCacheStats(), (1, 1, 1))
+
+    # Adding a missing parent or updating an ancestor drops the cached
+    # hierarchy.
+    db.AddInterface(self._ParseInterface('interface Missing {};'))
+    self.assertTrue(db.InheritsFrom(i3, 'Missing'))
+    db.GetInterfaceForUpdate('I2').parents = []
+    self.assertFalse(db.InheritsFrom(i3, 'I1'))
+    self.assertEquals(db.HierarchyCacheStats(), (1, 3, 1))
+
 
 if __name__ == '__main__':
   logging.config.fileConfig('logging.conf')
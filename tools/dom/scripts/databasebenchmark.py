@@ -0,0 +1,242 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Measures the memory and time it takes to load and query the IDL database.
+
+Build the database first (fremontcutbuilder.py or dartdomgenerator.py), then:
+
+  ./databasebenchmark.py [--database-dir=../database] [--passes=10]
+
+With --ast-cache-dir, also measures the conversion of the Blink ASTs cached
+by the last build into IDLFile nodes.  With --filter, also measures the
+filtering of the database before generation.  With --rename, also measures
+renaming all the members in the database.  With --merge, also measures
+merging the members of the database one by one into a new database, with and
+without the signature index of the DatabaseBuilder.  With --generate, also
+measures a full dart2js and dartium generation run into a temporary
+directory.
+"""
+
+import copy
+import cPickle
+import database
+import databasebuilder
+import logging
+import optparse
+import os
+import pickle
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+# Sets up the paths to the Blink IDL compiler.
+import dartdomgenerator
+import dartgenerator
+import idlnode
+from dartmetadata import DartMetadata
+from htmlrenamer import HtmlRenamer
+
+def _peak_rss_kb():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _time_passes(passes, function):
+  """Returns the average number of seconds of one call to function."""
+  start_time = time.time()
+  for _ in range(passes):
+    function()
+  return (time.time() - start_time) / passes
+
+def _benchmark_ast_conversion(ast_cache_dir, passes):
+  """Times building IDLFile nodes from the Blink ASTs in the AST cache."""
+  asts = {}
+  for entry in os.listdir(ast_cache_dir):
+    if not entry.endswith('.pickle'):
+      continue
+    with open(os.path.join(ast_cache_dir, entry), 'rb') as f:
+      (_, ast) = pickle.load(f)
+    if ast != 1:
+      asts[os.path.splitext(entry)[0]] = ast
+  idlnode.new_asts.update(asts)
+  # dart.idl needs the implements computed by the builder.
+  asts.pop('dart', None)
+
+  def convert():
+    for name, ast in asts.items():
+      idlnode.IDLFile(ast, '%s.idl' % name)
+  print 'IDLFile from %s Blink ASTs: %s ms' % (
+      len(asts), round(_time_passes(passes, convert) * 1000, 2))
+
+def _benchmark_filtering(database, passes):
+  """Times the filtering of a clone of the database before generation."""
+  # The filters warn about each member they remove.
+  generator = dartgenerator.DartGenerator(logging.ERROR)
+  seconds = 0
+  for _ in range(passes):
+    common_database = database.Clone()
+    start_time = time.time()
+    dartdomgenerator.FilterDatabase(generator, common_database)
+    seconds += time.time() - start_time
+  print 'FilterDatabase(): %s ms' % round(seconds / passes * 1000, 2)
+
+def _benchmark_renamer(database, passes):
+  """Times HtmlRenamer.RenameMember() over all the members in the database.
+  The first pass also builds the lookup tables of the renamer."""
+  dom_dir = os.path.join(os.path.dirname(__file__), '..')
+  metadata = DartMetadata(os.path.join(dom_dir, 'dom.json'),
+                          os.path.join(dom_dir, 'docs', 'docs.json'))
+  renamer = HtmlRenamer(database, metadata)
+  members = []
+  for interface in database.GetInterfaces():
+    for member in interface.constants + interface.attributes + \
+        interface.operations:
+      if member.id:
+        members.append((interface.id, member))
+
+  def rename():
+    for interface_id, member in members:
+      renamer.RenameMember(interface_id, member, member.id)
+  first_pass = _time_passes(1, rename)
+  print 'RenameMember() of %s members: %s ms, then %s ms per pass' % (
+      len(members), round(first_pass * 1000, 2),
+      round(_time_passes(passes, rename) * 1000, 2))
+
+def _split_interfaces(interfaces):
+  """Returns the interfaces without their members, followed by one
+  supplemental interface per member, as partial interfaces are imported."""
+  split_interfaces = []
+  supplementals = []
+  for interface in interfaces:
+    for what in ['constants', 'attributes', 'operations']:
+      for member in getattr(interface, what):
+        supplemental = copy.copy(interface)
+        supplemental.ext_attrs = {'DartSupplemental': None}
+        supplemental.annotations = {}
+        supplemental.is_supplemental = True
+        supplemental.parents = []
+        supplemental.constants = []
+        supplemental.attributes = []
+        supplemental.operations = []
+        setattr(supplemental, what, [member])
+        supplemental.invalidate_index()
+        supplementals.append(supplemental)
+      setattr(interface, what, [])
+    interface.invalidate_index()
+    split_interfaces.append(interface)
+  return split_interfaces + supplementals
+
+def _benchmark_merge(interfaces, passes):
+  """Times DatabaseBuilder.merge_imported_interfaces() merging the members
+  of the interfaces one by one, with and without the signature index."""
+  pickled_interfaces = cPickle.dumps(interfaces, 2)
+  import_options = databasebuilder.DatabaseBuilderOptions(source='WebKit')
+  for use_signature_index in [True, False]:
+    seconds = 0
+    for _ in range(passes):
+      database_dir = tempfile.mkdtemp()
+      try:
+        builder = databasebuilder.DatabaseBuilder(
+            database.Database(database_dir))
+        builder.use_signature_index = use_signature_index
+        # As import_idl_files() queues them.
+        builder._imported_interfaces = [
+            (interface, import_options) for interface in
+            _split_interfaces(cPickle.loads(pickled_interfaces))]
+        start_time = time.time()
+        builder.merge_imported_interfaces()
+        seconds += time.time() - start_time
+      finally:
+        shutil.rmtree(database_dir)
+    print 'merge_imported_interfaces() %s the signature index: %s ms' % (
+        'with' if use_signature_index else 'without',
+        round(seconds / passes * 1000, 2))
+
+def _benchmark_generation(database):
+  """Times a dart2js and dartium generation run and reports how much it
+  grows the peak RSS."""
+  output_dir = tempfile.mkdtemp()
+  try:
+    rss_before = _peak_rss_kb()
+    start_time = time.time()
+    dartdomgenerator.GenerateFromDatabase(
+        database, os.path.join(output_dir, 'dart2js'),
+        os.path.join(output_dir, 'dartium'))
+    print 'Generation: %s seconds, peak RSS grew by %s KB' % (
+        round(time.time() - start_time, 2), _peak_rss_kb() - rss_before)
+  finally:
+    shutil.rmtree(output_dir)
+
+def main():
+  parser = optparse.OptionParser()
+  parser.add_option('--database-dir', dest='database_dir',
+                    default=os.path.join(os.path.dirname(__file__), '..',
+                                         'database'),
+                    help='Directory of the IDL database')
+  parser.add_option('--passes', dest='passes', type='int', default=10,
+                    help='Number of passes of each timed query')
+  parser.add_option('--ast-cache-dir', dest='ast_cache_dir',
+                    help='Directory of the Blink AST cache, to also time '
+                    'converting the ASTs into IDL nodes')
+  parser.add_option('--filter', dest='filter', action='store_true',
+                    default=False, help='Also time filtering the database')
+  parser.add_option('--rename', dest='rename', action='store_true',
+                    default=False, help='Also time renaming all the members')
+  parser.add_option('--merge', dest='merge', action='store_true',
+                    default=False, help='Also time merging the members of '
+                    'the database, with and without the signature index')
+  parser.add_option('--generate', dest='generate', action='store_true',
+                    default=False, help='Also time a full generation run')
+  parser.add_option('--no-cache', dest='use_cache', action='store_false',
+                    default=True, help='Parse the IDL files instead of '
+                    'loading the database cache')
+  (options, args) = parser.parse_args()
+
+  rss_before = _peak_rss_kb()
+  start_time = time.time()
+  database = dartdomgenerator.LoadDatabase(options.database_dir,
+                                           options.use_cache)
+  load_time = time.time() - start_time
+  rss_growth = _peak_rss_kb() - rss_before
+
+  interfaces = database.GetInterfaces()
+  node_count = sum(len(interface.all()) for interface in interfaces)
+  print 'Loaded %s interfaces (%s nodes) in %s seconds' % (
+      len(interfaces), node_count, round(load_time, 2))
+  print 'Peak RSS grew by %s KB (%s bytes per node)' % (
+      rss_growth, rss_growth * 1024 / max(node_count, 1))
+
+  def all_nodes():
+    for interface in interfaces:
+      interface.all()
+  def all_types():
+    for interface in interfaces:
+      interface.all(idlnode.IDLType)
+  def clone():
+    database.Clone()
+
+  for name, function in [('all()', all_nodes),
+                         ('all(IDLType)', all_types),
+                         ('Clone()', clone)]:
+    print '%s over the database: %s ms' % (
+        name, round(_time_passes(options.passes, function) * 1000, 2))
+
+  if options.ast_cache_dir:
+    _benchmark_ast_conversion(options.ast_cache_dir, options.passes)
+
+  if options.filter:
+    _benchmark_filtering(database, options.passes)
+
+  if options.rename:
+    _benchmark_renamer(database, options.passes)
+
+  if options.merge:
+    _benchmark_merge(interfaces, options.passes)
+
+  if options.generate:
+    _benchmark_generation(database)
+
+if __name__ == '__main__':
+  sys.exit(main())
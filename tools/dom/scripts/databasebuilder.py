@@ -5,11 +5,14 @@
 
 import copy
 import database
+import hashlib
 import logging
 import monitored
 import multiprocessing
 import os
 import os.path
+import pickle
+import profiler
 import re
 import sys
 import tempfile
@@ -29,6 +32,10 @@ from idlnode import *
 
 _logger = logging.getLogger('databasebuilder')
 
+# Version of the compiled AST cache entries.  Bump it whenever the Blink IDL
+# compiler or the AST representation changes.
+_AST_CACHE_VERSION = 1
+
 # Used in source annotations to specify the parent interface declaring
 # a displaced declaration. The 'via' attribute specifies the parent interface
 # which implements a displaced declaration.
@@ -118,6 +125,86 @@ def _load_idl_file(build, file_name, import_options):
   return 1
 
 
+# Build used by the worker processes of a parallel DatabaseBuilder.  Pools are
+# forked after the parent has computed interfaces_info and new_asts, so the
+# workers see the same module state as the parent.
+_worker_build = None
+
+
+def _init_worker(build):
+  global _worker_build
+  _worker_build = build
+
+
+def _compute_info_individual_worker(file_paths):
+  """Computes the individual interfaces info of a chunk of IDL files."""
+  for file_path in file_paths:
+    compute_info_individual(file_path)
+  return info_individual()
+
+
+def _compile_idl_file_worker(file_path):
+  """Compiles an IDL file and returns (name, ast) with the AST unwrapped
+  from its single-entry dictionary, which keeps the pickled result small."""
+  name = os.path.splitext(os.path.basename(file_path))[0]
+  ast = _compile_idl_file(_worker_build, file_path, None)
+  return (name, _unwrap_ast(name, ast))
+
+
+def _load_idl_file_worker(file_path):
+  return _load_idl_file(_worker_build, file_path, None)
+
+
+def _unwrap_ast(name, ast):
+  if ast != 1 and len(ast) == 1:
+    return ast.values()[0]
+  print 'ERROR: Processing AST: ' + name
+  return ast
+
+
+def _constructor_attributes(window_interface):
+  """Returns the (attribute, interface id) pairs of the constructor attributes
+  of Window."""
+  result = []
+  for attr in window_interface.attributes:
+    type = attr.type.id
+    if type.endswith('Constructor'):
+      result.append((attr, re.sub('(Constructor)+$', '', type)))
+  return result
+
+
+def _hash_file(file_path):
+  """Returns the SHA-1 of a file's content, or '' if the file is missing."""
+  if not os.path.isfile(file_path):
+    return ''
+  with open(file_path, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()
+
+
+def _ast_cache_key(file_path, extended_attributes_hash):
+  """Computes the AST cache key of an IDL file.
+
+  The compiled AST depends on the IDL file, the extended attributes file and
+  the files the interface depends on (partial interfaces and implements), as
+  computed in interfaces_info.
+  """
+  name = os.path.splitext(os.path.basename(file_path))[0]
+  key = [str(_AST_CACHE_VERSION), extended_attributes_hash,
+         _hash_file(file_path)]
+  for dependency in _dependency_paths(name):
+    key.append(_hash_file(dependency))
+  return hashlib.sha1(':'.join(key)).hexdigest()
+
+
+def _dependency_paths(interface_name):
+  """Returns the sorted real paths of the IDL files (partial interfaces and
+  implemented interfaces) the Blink compiler merges into an interface."""
+  info = interfaces_info.get(interface_name, {})
+  return sorted(os.path.realpath(path) for path in
+                info.get('dependencies_full_paths', []) +
+                info.get('dependencies_other_component_full_paths', []))
+
+
 # New IDL parser builder.
 class Build():
     def __init__(self, provider):
@@ -128,10 +215,10 @@ class Build():
         #              then we'd have a real output directory. Today we use the
         #              compiler to only create an AST.
         self.output_directory = tempfile.mkdtemp()
-        attrib_file = os.path.join('Source', idl_validator.EXTENDED_ATTRIBUTES_FILENAME)
+        self.attrib_file = os.path.join('Source', idl_validator.EXTENDED_ATTRIBUTES_FILENAME)
         # Create compiler.
         self.idl_compiler = compiler.IdlCompilerDart(self.output_directory,
-                                            attrib_file,
+                                            self.attrib_file,
                                             interfaces_info=interfaces_info,
                                             only_if_changed=True)
 
@@ -165,14 +252,49 @@ class Build():
 
 
 class DatabaseBuilder(object):
-  def __init__(self, database):
+  def __init__(self, database, parallel=False, num_workers=None,
+               ast_cache_dir=None):
     """DatabaseBuilder is used for importing and merging interfaces into
-    the Database"""
+    the Database
+
+    Args:
+      database -- the Database to build.
+      parallel -- if True, IDL files are compiled and converted into
+        IDLFiles by a pool of worker processes.
+      num_workers -- size of the worker pool, defaults to the number of
+        CPUs.
+      ast_cache_dir -- if set, compiled ASTs are cached in this directory
+        and IDL files whose inputs did not change are not recompiled.
+    """
     self._database = database
+    self._ast_cache_dir = ast_cache_dir
+    self._num_workers = 1
+    if parallel:
+      self._num_workers = num_workers or multiprocessing.cpu_count()
     self._imported_interfaces = []
     self._impl_stmts = []
     self.conditionals_met = set()
 
+    # Real paths of the IDL files each interface, enum and dictionary was
+    # built from.  Used to find what to rebuild in incremental builds.
+    self._interface_sources = {}
+    self._enum_sources = {}
+    self._dictionary_sources = {}
+    self._file_hashes = {}
+
+    # Signature maps of the member lists of database interfaces, kept across
+    # merges.  Maps (interface id, list name) to [list, length, map].
+    self._signature_index = {}
+    # When False, the maps are rebuilt on every merge as they were before the
+    # index, e.g. to compare the two in databasebenchmark.py.
+    self.use_signature_index = True
+
+    # Incremental build state: the files that changed since the previous
+    # build, and the files and interfaces to import (None imports all).
+    self._changed_files = None
+    self._files_to_import = None
+    self._interfaces_to_import = None
+
     # Spin up the new IDL parser.
     self.build = Build(None)
 
@@ -181,6 +303,19 @@ class DatabaseBuilder(object):
       'Transferable' : 'MessagePort',
     })
 
+  def _map(self, function, items):
+    """Applies a module-level function to every item, in a pool of worker
+    processes when running in parallel.  Results are in item order."""
+    if self._num_workers <= 1 or len(items) <= 1:
+      _init_worker(self.build)
+      return map(function, items)
+    pool = multiprocessing.Pool(self._num_workers, _init_worker, (self.build,))
+    try:
+      return pool.map(function, items)
+    finally:
+      pool.close()
+      pool.join()
+
   # TODO(terry): Consider keeping richer type information (e.g.,
   #              IdlArrayOrSequenceType from the Blink parser) instead of just
   #              a type name.
@@ -303,6 +438,23 @@ class DatabaseBuilder(object):
       res[sig] = idl_node
     return res
 
+  def _signatures_map(self, interface, what):
+    """Returns the signature map of one of the member lists ('parents',
+    'constants', 'attributes' or 'operations') of a database interface.
+
+    The map is kept in the signature index and only rebuilt if the list was
+    replaced or resized by something other than _merge_nodes, or on every
+    call without use_signature_index.
+    """
+    node_list = getattr(interface, what)
+    key = (interface.id, what)
+    entry = self._signature_index.get(key)
+    if (not self.use_signature_index or entry is None or
+        entry[0] is not node_list or entry[1] != len(node_list)):
+      entry = [node_list, len(node_list), self._build_signatures_map(node_list)]
+      self._signature_index[key] = entry
+    return entry[2]
+
   def _get_parent_interfaces(self, interface):
     """Return a list of all the parent interfaces of a given interface"""
     res = []
@@ -335,7 +487,8 @@ class DatabaseBuilder(object):
         changed = True
     return changed
 
-  def _merge_nodes(self, old_list, new_list, import_options):
+  def _merge_nodes(self, old_list, new_list, import_options,
+                   old_signatures_map=None):
     """Merges two lists of nodes. Annotates nodes with the source of each
     node.
 
@@ -346,12 +499,15 @@ class DatabaseBuilder(object):
       old_list -- the list to merge into.
       new_list -- list containing more nodes.
       import_options -- controls how merging is done.
+      old_signatures_map -- signature map of old_list, if already known. It
+        is updated with the nodes added to old_list.
     """
     changed = False
 
     source = import_options.source
 
-    old_signatures_map = self._build_signatures_map(old_list)
+    if old_signatures_map is None:
+      old_signatures_map = self._build_signatures_map(old_list)
     new_signatures_map = self._build_signatures_map(new_list)
 
     # Merge new items
@@ -359,6 +515,7 @@ class DatabaseBuilder(object):
       if sig not in old_signatures_map:
         # New node:
         old_list.append(new_node)
+        old_signatures_map[sig] = new_node
         changed = True
       else:
         # Merge old and new nodes:
@@ -437,15 +594,18 @@ class DatabaseBuilder(object):
       changed = True
 
     def merge_list(what):
-      old_list = old_interface.__dict__[what]
-      new_list = new_interface.__dict__[what]
+      old_list = getattr(old_interface, what)
+      new_list = getattr(new_interface, what)
 
       if what != 'parents' and old_interface.id != new_interface.id:
         for node in new_list:
           node.doc_js_interface_name = old_interface.id
           node.ext_attrs['ImplementedBy'] = new_interface.id
 
-      changed = self._merge_nodes(old_list, new_list, import_options)
+      old_signatures_map = self._signatures_map(old_interface, what)
+      changed = self._merge_nodes(old_list, new_list, import_options,
+                                  old_signatures_map)
+      self._signature_index[(old_interface.id, what)][1] = len(old_list)
 
       # Delete list items with zero remaining annotations.
       if changed and import_options.obsolete_old_declarations:
@@ -453,7 +613,13 @@ class DatabaseBuilder(object):
         def has_annotations(idl_node):
           return len(idl_node.annotations)
 
-        old_interface.__dict__[what] = filter(has_annotations, old_list)
+        old_list = filter(has_annotations, old_list)
+        setattr(old_interface, what, old_list)
+        for sig, node in old_signatures_map.items():
+          if not has_annotations(node):
+            del old_signatures_map[sig]
+        self._signature_index[(old_interface.id, what)][:2] = [
+            old_list, len(old_list)]
 
       return changed
 
@@ -469,6 +635,9 @@ class DatabaseBuilder(object):
 
     if self._merge_ext_attrs(old_interface.ext_attrs, new_interface.ext_attrs):
       changed = True
+    if changed:
+      # Merged members may have gained new arguments or ext attrs.
+      old_interface.invalidate_index()
 
     _logger.info('merged interface %s (changed=%s, supplemental=%s)' %
       (old_interface.id, changed, new_interface.is_supplemental))
@@ -501,9 +670,11 @@ class DatabaseBuilder(object):
         parent.annotations[source] = IDLAnnotation(
             import_options.source_attributes)
       interface.parents.append(parent)
+      interface.invalidate_index()
 
   def merge_imported_interfaces(self):
     """Merges all imported interfaces and loads them into the DB."""
+    start_time = time.time()
     imported_interfaces = self._imported_interfaces
 
     # Step 1: Pre process imported interfaces
@@ -535,6 +706,9 @@ class DatabaseBuilder(object):
     for impl_stmt, import_options in self._impl_stmts:
       self._merge_impl_stmt(impl_stmt, import_options)
 
+    print 'Merged %s imported interfaces in %s seconds' % (
+        len(imported_interfaces), round(time.time() - start_time, 2))
+
     self._impl_stmts = []
     self._imported_interfaces = []
 
@@ -560,9 +734,26 @@ class DatabaseBuilder(object):
       start_time = time.time()
 
       # 2-stage computation: individual, then overall
-      for file_path in file_paths:
-        compute_info_individual(file_path)
-      info_individuals = [info_individual()]
+      # compute_info_individual accumulates into module state, which
+      # info_individual() returns.  Each worker process starts from the state
+      # of this one, handles exactly one chunk and returns its state, which
+      # compute_interfaces_info_overall merges like the states of Blink
+      # components.  This is what a serial run accumulates only if this
+      # process has no state yet, or else every chunk would carry it again.
+      if self._num_workers > 1 and not any(info_individual().values()):
+        chunks = [file_paths[i::self._num_workers]
+                  for i in range(self._num_workers)]
+        pool = multiprocessing.Pool(self._num_workers, maxtasksperchild=1)
+        try:
+          info_individuals = pool.map(_compute_info_individual_worker,
+                                      chunks, 1)
+        finally:
+          pool.close()
+          pool.join()
+      else:
+        for file_path in file_paths:
+          compute_info_individual(file_path)
+        info_individuals = [info_individual()]
       compute_interfaces_info_overall(info_individuals)
 
       end_time = time.time()
@@ -576,36 +767,226 @@ class DatabaseBuilder(object):
         'implement_pairs': implement_pairs,
       }
 
-    # Parse the IDL files serially.
+    # Parse the IDL files, serially unless running in parallel.
     start_time = time.time()
 
-    for file_path in file_paths:
-      file_path = os.path.normpath(file_path)
-      ast = _compile_idl_file(self.build, file_path, import_options)
-      self._process_ast(os.path.splitext(os.path.basename(file_path))[0], ast)
+    file_paths = [os.path.normpath(file_path) for file_path in file_paths]
+    cache_keys = {}
+    files_to_compile = []
+    if self._ast_cache_dir:
+      extended_attributes_hash = _hash_file(self.build.attrib_file)
+      for file_path in file_paths:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        cache_keys[name] = _ast_cache_key(file_path, extended_attributes_hash)
+        ast = self._load_cached_ast(name, cache_keys[name])
+        if ast is None:
+          files_to_compile.append(file_path)
+        else:
+          new_asts[name] = ast
+    else:
+      files_to_compile = file_paths
+
+    for name, ast in self._map(_compile_idl_file_worker, files_to_compile):
+      new_asts[name] = ast
+      if name in cache_keys and ast != 1:
+        self._cache_ast(name, cache_keys[name], ast)
 
     end_time = time.time()
-    print 'Compiled %s IDL files in %s seconds' % (len(file_paths),
-                                                  round((end_time - start_time), 2))
+    print 'Compiled %s IDL files in %s seconds (%s workers, %s from AST cache)' % (
+        len(files_to_compile), round((end_time - start_time), 2),
+        self._num_workers, len(file_paths) - len(files_to_compile))
+
+  def _ast_cache_path(self, name):
+    return os.path.join(self._ast_cache_dir, '%s.pickle' % name)
+
+  def _load_cached_ast(self, name, cache_key):
+    """Returns the cached AST of an IDL file, or None if there is no entry
+    for the given cache key."""
+    cache_path = self._ast_cache_path(name)
+    if not os.path.isfile(cache_path):
+      return None
+    try:
+      with open(cache_path, 'rb') as f:
+        (entry_key, ast) = pickle.load(f)
+    except Exception as err:
+      _logger.warn('ignoring unreadable AST cache entry %s: %s' %
+                   (cache_path, err))
+      return None
+    if entry_key != cache_key:
+      return None
+    return ast
+
+  def _cache_ast(self, name, cache_key, ast):
+    """Writes the AST of an IDL file, replacing any stale entry."""
+    if not os.path.exists(self._ast_cache_dir):
+      os.makedirs(self._ast_cache_dir)
+    cache_path = self._ast_cache_path(name)
+    temp_path = '%s.tmp' % cache_path
+    with open(temp_path, 'wb') as f:
+      pickle.dump((cache_key, ast), f, pickle.HIGHEST_PROTOCOL)
+    os.rename(temp_path, cache_path)
+
+  def start_incremental_build(self, build_state, file_paths):
+    """Makes this builder only rebuild the interfaces whose IDL files
+    changed since the build that produced build_state.
+
+    The database must already contain the interfaces, enums and dictionaries
+    of that build.  The interfaces to rebuild are selected after the first
+    call to import_idl_files, once the IDL dependencies are known.
 
-  def _process_ast(self, filename, ast):
-    if len(ast) == 1:
-      ast = ast.values()[0]
-    else:
-      print 'ERROR: Processing AST: ' + os.path.basename(file_name)
-    new_asts[filename] = ast
+    Args:
+      build_state -- the result of get_build_state() in the previous build.
+      file_paths -- all the IDL files of this build.
+    """
+    self._interface_sources = build_state['interface_sources']
+    self._enum_sources = build_state['enum_sources']
+    self._dictionary_sources = build_state['dictionary_sources']
+    self.conditionals_met = set(build_state['conditionals_met'])
+
+    old_file_hashes = build_state['file_hashes']
+    self._file_hashes = {}
+    for file_path in file_paths:
+      real_path = os.path.realpath(file_path)
+      self._file_hashes[real_path] = _hash_file(real_path)
+    self._changed_files = set(
+        path for path in set(old_file_hashes) | set(self._file_hashes)
+        if old_file_hashes.get(path) != self._file_hashes.get(path))
+    _logger.info('%s IDL files changed since the last build' %
+                 len(self._changed_files))
+
+  def get_build_state(self):
+    """Returns what start_incremental_build needs to update the database
+    built by this builder."""
+    return {
+      'interface_sources': self._interface_sources,
+      'enum_sources': self._enum_sources,
+      'dictionary_sources': self._dictionary_sources,
+      'conditionals_met': sorted(self.conditionals_met),
+      'file_hashes': self._file_hashes,
+    }
+
+  def rebuilt_interfaces(self):
+    """Returns the ids of the interfaces rebuilt by an incremental build, or
+    None if every interface is built."""
+    return self._interfaces_to_import
+
+  def _select_interfaces_to_rebuild(self):
+    """Computes the interfaces fed by changed IDL files and their dependents
+    (through parent and implements edges), and removes them from the database
+    so they are merged again from their sources."""
+    affected = set()
+    for interface_id, sources in self._interface_sources.items():
+      if (sources & self._changed_files or
+          set(_dependency_paths(interface_id)) - sources):
+        affected.add(interface_id)
+
+    # map_dictionaries() maps the types named like a dictionary when the
+    # interface is built, so the interfaces referring to a dictionary of a
+    # changed file are rebuilt, in case it was removed, renamed or added.
+    changed_dictionaries = set(
+        dictionary_id
+        for dictionary_id, source in self._dictionary_sources.items()
+        if source in self._changed_files)
+    changed_dictionaries.update(self._changed_file_dictionaries())
+    if changed_dictionaries:
+      for interface in self._database.GetInterfaces():
+        for type_node in interface.all(IDLType):
+          if (type_node.id in changed_dictionaries or
+              getattr(type_node, 'dictionary', None) in changed_dictionaries):
+            affected.add(interface.id)
+            break
+
+    # fetch_constructor_data() copies attributes of Window to the interfaces
+    # of its constructors, which must drop the ones of the previous build.
+    if 'Window' in affected and self._database.HasInterface('Window'):
+      for (_, interface_id) in _constructor_attributes(
+          self._database.GetInterface('Window')):
+        if self._database.HasInterface(interface_id):
+          affected.add(interface_id)
+
+    children = {}
+    for interface in self._database.GetInterfaces():
+      for parent in interface.parents:
+        children.setdefault(parent.type.id, set()).add(interface.id)
+    pending = list(affected)
+    while pending:
+      for child_id in children.get(pending.pop(), []):
+        if child_id not in affected:
+          affected.add(child_id)
+          pending.append(child_id)
+
+    self._files_to_import = set(self._changed_files)
+    for interface_id in affected:
+      self._files_to_import |= self._interface_sources.pop(interface_id, set())
+      if self._database.HasInterface(interface_id):
+        self._database.DeleteInterface(interface_id)
+    self._interfaces_to_import = affected
+
+    # Enums and dictionaries are taken again from their changed files.
+    for enum_id, source in self._enum_sources.items():
+      if source in self._changed_files:
+        del self._enum_sources[enum_id]
+        if self._database.HasEnum(enum_id):
+          self._database.DeleteEnum(enum_id)
+    for dictionary_id, source in self._dictionary_sources.items():
+      if source in self._changed_files:
+        del self._dictionary_sources[dictionary_id]
+        if self._database.HasDictionary(dictionary_id):
+          self._database.DeleteDictionary(dictionary_id)
+
+    _logger.info('rebuilding %s interfaces from %s IDL files' %
+                 (len(affected), len(self._files_to_import)))
+
+  def _changed_file_dictionaries(self):
+    """Returns the ids of the dictionaries in the changed IDL files compiled
+    so far."""
+    dictionary_ids = set()
+    for real_path in self._changed_files:
+      name = os.path.splitext(os.path.basename(real_path))[0]
+      if name not in new_asts or not os.path.isfile(real_path):
+        continue
+      idl_file = _load_idl_file(self.build, real_path, None)
+      if idl_file != 1:
+        dictionary_ids.update(
+            dictionary.id for dictionary in idl_file.dictionaries)
+    return dictionary_ids
+
+  def _should_import_interface(self, interface_id, real_path):
+    if self._interfaces_to_import is None:
+      return True
+    if real_path in self._changed_files:
+      # New or moved interfaces only appear in changed files.
+      if interface_id not in self._interfaces_to_import:
+        self._interfaces_to_import.add(interface_id)
+        if self._database.HasInterface(interface_id):
+          self._database.DeleteInterface(interface_id)
+      return True
+    return interface_id in self._interfaces_to_import
 
   def import_idl_files(self, file_paths, import_options, is_dart_idl):
-    self._blink_compile_idl_files(file_paths, import_options, is_dart_idl)
+    with profiler.Phase('Compile IDL files'):
+      self._blink_compile_idl_files(file_paths, import_options, is_dart_idl)
+
+    if self._changed_files is not None and self._interfaces_to_import is None:
+      self._select_interfaces_to_rebuild()
 
     start_time = time.time()
 
-    # Parse the IDL files in serial.
-    for file_path in file_paths:
-      file_path = os.path.normpath(file_path)
-      idl_file = _load_idl_file(self.build, file_path, import_options)
-      _logger.info('Processing %s' % os.path.splitext(os.path.basename(file_path))[0])
-      self._process_idl_file(idl_file, import_options, is_dart_idl)
+    # Build the IDLFiles (possibly in parallel), then process them serially in
+    # file order.
+    file_paths = [os.path.normpath(file_path) for file_path in file_paths]
+    if self._changed_files is None:
+      for file_path in file_paths:
+        real_path = os.path.realpath(file_path)
+        self._file_hashes[real_path] = _hash_file(real_path)
+    else:
+      file_paths = [file_path for file_path in file_paths
+                    if os.path.realpath(file_path) in self._files_to_import]
+    with profiler.Phase('Process IDL files'):
+      idl_files = self._map(_load_idl_file_worker, file_paths)
+      for file_path, idl_file in zip(file_paths, idl_files):
+        _logger.info('Processing %s' % os.path.splitext(os.path.basename(file_path))[0])
+        self._process_idl_file(idl_file, import_options, is_dart_idl)
 
     end_time = time.time()
 
@@ -621,29 +1002,49 @@ class DatabaseBuilder(object):
     def enabled(idl_node):
       return self._is_node_enabled(idl_node, import_options.idl_defines)
 
+    real_path = os.path.realpath(idl_file.filename)
+
     for interface in idl_file.interfaces:
       if not self._is_node_enabled(interface, import_options.idl_defines):
         _logger.info('skipping interface %s (source=%s)'
           % (interface.id, import_options.source))
         continue
 
+      if not self._should_import_interface(interface.id, real_path):
+        continue
+
+      sources = self._interface_sources.setdefault(interface.id, set())
+      sources.add(real_path)
+      sources.update(_dependency_paths(interface.id))
+
       _logger.info('importing interface %s (source=%s file=%s)'
         % (interface.id, import_options.source, os.path.basename(idl_file.filename)))
 
       interface.attributes = filter(enabled, interface.attributes)
       interface.operations = filter(enabled, interface.operations)
+      interface.invalidate_index()
+      idl_file.invalidate_index()
       self._imported_interfaces.append((interface, import_options))
 
     # If an IDL dictionary then there is no implementsStatements.
     if hasattr(idl_file, 'implementsStatements'):
       for implStmt in idl_file.implementsStatements:
+        implementor_id = implStmt.implementor.id
+        if not self._should_import_interface(implementor_id, real_path):
+          continue
+        self._interface_sources.setdefault(implementor_id, set()).add(
+            real_path)
         self._impl_stmts.append((implStmt, import_options))
 
     for enum in idl_file.enums:
-      self._database.AddEnum(enum)
+      if self._changed_files is None or real_path in self._changed_files:
+        self._database.AddEnum(enum)
+        self._enum_sources[enum.id] = real_path
 
     for dictionary in idl_file.dictionaries:
-      self._database.AddDictionary(dictionary)
+      if self._changed_files is None or real_path in self._changed_files:
+        self._database.AddDictionary(dictionary)
+        self._dictionary_sources[dictionary.id] = real_path
 
 
   def _is_node_enabled(self, node, idl_defines):
@@ -669,13 +1070,22 @@ class DatabaseBuilder(object):
         return True
     return False
 
+  def _updated_interfaces(self):
+    """Returns the interfaces built by this builder: all of them, or only
+    the rebuilt ones in an incremental build."""
+    interfaces = self._database.GetInterfaces()
+    if self._interfaces_to_import is None:
+      return interfaces
+    return [interface for interface in interfaces
+            if interface.id in self._interfaces_to_import]
+
   def fix_displacements(self, source):
     """E.g. In W3C, something is declared on HTMLDocument but in WebKit
     its on Document, so we need to mark that something in HTMLDocument
     with @WebKit(via=Document). The 'via' attribute specifies the
     parent interface that has the declaration."""
 
-    for interface in self._database.GetInterfaces():
+    for interface in self._updated_interfaces():
       changed = False
 
       _logger.info('fixing displacements in %s' % interface.id)
@@ -684,10 +1094,10 @@ class DatabaseBuilder(object):
         _logger.info('scanning parent %s of %s' %
           (parent_interface.id, interface.id))
 
-        def fix_nodes(local_list, parent_list):
+        def fix_nodes(what):
           changed = False
-          parent_signatures_map = self._build_signatures_map(
-            parent_list)
+          local_list = getattr(interface, what)
+          parent_signatures_map = self._signatures_map(parent_interface, what)
           for idl_node in local_list:
             sig = self._sign(idl_node)
             if sig in parent_signatures_map:
@@ -701,12 +1111,9 @@ class DatabaseBuilder(object):
                 changed = True
           return changed
 
-        changed = fix_nodes(interface.constants,
-                  parent_interface.constants) or changed
-        changed = fix_nodes(interface.attributes,
-                  parent_interface.attributes) or changed
-        changed = fix_nodes(interface.operations,
-                  parent_interface.operations) or changed
+        changed = fix_nodes('constants') or changed
+        changed = fix_nodes('attributes') or changed
+        changed = fix_nodes('operations') or changed
       if changed:
         _logger.info('fixed displaced declarations in %s' %
           interface.id)
@@ -717,7 +1124,7 @@ class DatabaseBuilder(object):
 
     Args:
       sources -- list of source names to normalize."""
-    for interface in self._database.GetInterfaces():
+    for interface in self._updated_interfaces():
       _logger.debug('normalizing annotations for %s' % interface.id)
       for source in sources:
         if (source not in interface.annotations or
@@ -751,18 +1158,19 @@ class DatabaseBuilder(object):
     def all_types(node):
       map(dictionary_to_map, node.all(IDLType))
 
-    for interface in self._database.GetInterfaces():
+    for interface in self._updated_interfaces():
       map(all_types, interface.all(IDLExtAttrFunctionValue))
       map(all_types, interface.attributes)
       map(all_types, interface.operations)
 
   def fetch_constructor_data(self, options):
     window_interface = self._database.GetInterface('Window')
-    for attr in window_interface.attributes:
-      type = attr.type.id
-      if not type.endswith('Constructor'):
+    for (attr, type) in _constructor_attributes(window_interface):
+      if (self._interfaces_to_import is not None and
+          'Window' not in self._interfaces_to_import and
+          type not in self._interfaces_to_import):
+        # Both were reused from the previous build, which fetched the data.
         continue
-      type = re.sub('(Constructor)+$', '', type)
       # TODO(antonm): Ideally we'd like to have pristine copy of WebKit IDLs and fetch
       # this information directly from it.  Unfortunately right now database is massaged
       # a lot so it's difficult to maintain necessary information on Window itself.
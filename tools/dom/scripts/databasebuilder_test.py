@@ -5,7 +5,9 @@
 
 import database
 import idlparser
+import idlrenderer
 import logging.config
+import multiprocessing
 import os
 import os.path
 import shutil
@@ -380,6 +382,163 @@ ACTUAL:
         getter attribute int attr;
       };''')
 
+  def test_signatures_map_rebuilt(self):
+    def attribute(name):
+      return IDLAttribute([('Type', ('ScopedName', 'long')), ('Id', name)],
+                          'I')
+    def attribute_ids(signatures_map):
+      return sorted(node.id for node in signatures_map.values())
+    interface = IDLInterface([('Id', 'I')])
+    interface.attributes = [attribute('a')]
+    self._db.AddInterface(interface)
+
+    signatures_map = self._builder._signatures_map(interface, 'attributes')
+    self.assertEquals(attribute_ids(signatures_map), ['a'])
+    self.assertTrue(
+        self._builder._signatures_map(interface, 'attributes') is
+        signatures_map)
+
+    # Resized outside _merge_nodes, like the parents an implements statement
+    # appends.
+    interface.attributes.append(attribute('b'))
+    signatures_map = self._builder._signatures_map(interface, 'attributes')
+    self.assertEquals(attribute_ids(signatures_map), ['a', 'b'])
+
+    # Replaced by a list of the same length, like the obsolete declarations
+    # filter does.
+    interface.attributes = [attribute('c'), attribute('b')]
+    signatures_map = self._builder._signatures_map(interface, 'attributes')
+    self.assertEquals(attribute_ids(signatures_map), ['b', 'c'])
+
+    # Without the index, every call rebuilds the map.
+    self._builder.use_signature_index = False
+    self.assertFalse(
+        self._builder._signatures_map(interface, 'attributes') is
+        self._builder._signatures_map(interface, 'attributes'))
+
+  def _run_in_child_process(self, function):
+    """Returns function() called in a new process, so that the module state
+    of the Blink scripts starts empty."""
+    (receiver, sender) = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=lambda: sender.send(function()))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+  def _rendered_interfaces(self, db):
+    return [(interface.id, idlrenderer.render(interface))
+            for interface in db.GetInterfaces()]
+
+  def _import_in_child_process(self, file_paths, num_workers):
+    """Imports the Blink IDL files into a new database.  Returns the
+    interfaces info and the rendered interfaces."""
+    database_dir = os.path.join(self._input_dir, 'database%s' % num_workers)
+    def run():
+      db = database.Database(database_dir)
+      builder = DatabaseBuilder(db, parallel=num_workers > 1,
+                                num_workers=num_workers)
+      builder.import_idl_files(file_paths,
+                               DatabaseBuilderOptions(source='WebKit'), False)
+      builder.merge_imported_interfaces()
+      return (dict(interfaces_info), self._rendered_interfaces(db))
+    return self._run_in_child_process(run)
+
+  def test_parallel_import(self):
+    file_paths = [
+        self._create_input('A.idl', '''
+          interface A { attribute long a; };
+          A implements C;'''),
+        self._create_input('B.idl', '''
+          interface B : A { void b(); };'''),
+        self._create_input('C.idl', '''
+          [NoInterfaceObject] interface C { void c(); };'''),
+        self._create_input('APartial.idl', '''
+          partial interface A { attribute long p; };'''),
+    ]
+    # The chunks of the workers split the partial interface from A.
+    serial = self._import_in_child_process(file_paths, 1)
+    self.assertEquals(
+        [name for (name, _) in serial[1]], ['A', 'B', 'C'])
+    self.assertEquals(self._import_in_child_process(file_paths, 2), serial)
+    self.assertEquals(self._import_in_child_process(file_paths, 3), serial)
+
+
+  def _build_in_child_process(self, file_paths, database_dir,
+                              build_state=None):
+    """Builds a database from the Blink IDL files like fremontcutbuilder, or
+    only updates it if build_state is the state of its previous build.
+    Returns the rendered interfaces, the rebuilt ones and the build state."""
+    def run():
+      db = database.Database(database_dir)
+      builder = DatabaseBuilder(db)
+      if build_state:
+        db.LoadFromCache()
+        for dictionary in build_state['dictionaries']:
+          db.AddDictionary(dictionary)
+        builder.start_incremental_build(build_state['builder'], file_paths)
+      else:
+        db.Delete()
+      builder.import_idl_files(file_paths,
+                               DatabaseBuilderOptions(source='WebKit'), False)
+      builder.merge_imported_interfaces()
+      builder.map_dictionaries()
+      db.Save()
+      db.Cache()
+      return (self._rendered_interfaces(db), builder.rebuilt_interfaces(),
+              {'dictionaries': db.GetDictionaries(),
+               'builder': builder.get_build_state()})
+    return self._run_in_child_process(run)
+
+  def test_incremental_build(self):
+    file_paths = [
+        self._create_input('A.idl', '''
+          interface A { attribute long a; };'''),
+        self._create_input('B.idl', '''
+          interface B : A { void b(); };'''),
+        self._create_input('C.idl', '''
+          interface C { void c(); };'''),
+    ]
+    (_, rebuilt, build_state) = self._build_in_child_process(
+        file_paths, self._database_dir)
+    self.assertEquals(rebuilt, None)
+
+    self._create_input('A.idl', '''
+        interface A { attribute long a; attribute long a2; };''')
+    (interfaces, rebuilt, _) = self._build_in_child_process(
+        file_paths, self._database_dir, build_state)
+    # B inherits from A.
+    self.assertEquals(rebuilt, set(['A', 'B']))
+    self.assertEquals(
+        interfaces,
+        self._build_in_child_process(
+            file_paths, os.path.join(self._input_dir, 'database'))[0])
+
+  def test_incremental_build_deleted_dictionary(self):
+    file_paths = [
+        self._create_input('D.idl', '''
+          dictionary D { long x; };'''),
+        self._create_input('U.idl', '''
+          interface U { void f(D d); };'''),
+        self._create_input('V.idl', '''
+          interface V { void g(long x); };'''),
+    ]
+    (interfaces, _, build_state) = self._build_in_child_process(
+        file_paths, self._database_dir)
+    self.assertTrue('Dictionary' in dict(interfaces)['U'])
+
+    os.remove(file_paths[0])
+    file_paths = file_paths[1:]
+    (interfaces, rebuilt, build_state) = self._build_in_child_process(
+        file_paths, self._database_dir, build_state)
+    # U no longer maps D to a Dictionary.
+    self.assertEquals(rebuilt, set(['U']))
+    self.assertEquals(build_state['dictionaries'], [])
+    self.assertFalse('Dictionary' in dict(interfaces)['U'])
+    self.assertEquals(
+        interfaces,
+        self._build_in_child_process(
+            file_paths, os.path.join(self._input_dir, 'database'))[0])
 
 if __name__ == "__main__":
   logging.config.fileConfig("logging.conf")
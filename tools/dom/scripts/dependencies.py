@@ -0,0 +1,46 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""This module records the inputs the generation of an interface reads.
+
+A dependency is a hashable tuple naming one input, e.g. ('interface', 'Node')
+or ('template', 'callback.darttemplate').  The modules that own the inputs
+Record() them when they are read, and generationcache.py checks whether they
+changed since.
+"""
+
+# The sets of dependencies being recorded, innermost last.  The hottest
+# lookups test it directly instead of calling IsRecording().
+recording = []
+
+
+def IsRecording():
+  """Returns True if the dependencies are being recorded, for the callers
+  that skip work which only serves to record them."""
+  return bool(recording)
+
+def Record(dependency):
+  if recording:
+    recording[-1].add(dependency)
+
+def Replay(dependencies):
+  """Records dependencies captured earlier, e.g. by a cache whose entry
+  would otherwise hide them."""
+  if recording:
+    recording[-1].update(dependencies)
+
+def Start():
+  """Starts recording the dependencies until the matching Stop().
+
+  Recordings nest: the dependencies of an inner one are also added to the
+  enclosing one.
+  """
+  recording.append(set())
+
+def Stop():
+  """Returns the set of dependencies recorded since the matching Start()."""
+  dependencies = recording.pop()
+  Replay(dependencies)
+  return dependencies
@@ -10,6 +10,9 @@ import re
 
 _logger = logging.getLogger('emitter')
 
+# Maximum number of parsed templates kept by Emitter._ParseTemplate.
+_TEMPLATE_CACHE_SIZE = 4096
+
 
 def Format(template, **parameters):
   """Create a string using the same template syntax as Emitter.Emit."""
@@ -18,6 +21,12 @@ def Format(template, **parameters):
   return ''.join(e.Fragments())
 
 
+def TemplateCacheStats():
+  """Returns (hits, misses, size) of the parsed template cache."""
+  return (Emitter._template_cache_hits, Emitter._template_cache_misses,
+          len(Emitter._template_cache))
+
+
 class Emitter(object):
   """An Emitter collects string fragments to be assembled into a single string.
   """
@@ -89,20 +98,20 @@ class Emitter(object):
 
   def Fragments(self):
     """Returns a list of all the string fragments emitted."""
-    def _FlattenTo(item, output):
-      if isinstance(item, list):
-        for subitem in item:
-          _FlattenTo(subitem, output)
-      elif isinstance(item, Emitter.DeferredLookup):
-        value = item._environment.Lookup(item._lookup._name,
-                                         item._lookup._value_if_missing)
-        _FlattenTo(value, output)
+    return list(self.IterFragments())
+
+  def IterFragments(self):
+    """Yields all the string fragments emitted, in order, without building a
+    list of them."""
+    stack = [iter(self._items)]
+    while stack:
+      for item in stack[-1]:
+        if isinstance(item, list):
+          stack.append(iter(item))
+          break
+        yield str(item)
       else:
-        output.append(str(item))
-
-    output = []
-    _FlattenTo(self._items, output)
-    return output
+        stack.pop()
 
   def Bind(self, var, template_source, **parameters):
     """Adds a binding for var to this emitter."""
@@ -115,9 +124,29 @@ class Emitter(object):
     self._bindings = self._bindings.Extend({var: value._items})
     return value
 
+  # Parsed templates keyed by their source.  The same template strings are
+  # emitted for every interface; dict lookups compare keys by identity before
+  # content and str hashes are cached, so a hit on a template literal is a
+  # pointer comparison.  Templates are never modified once parsed.
+  _template_cache = {}
+  _template_cache_hits = 0
+  _template_cache_misses = 0
+
   def _ParseTemplate(self, source):
     """Converts the template string into a Template object."""
-    # TODO(sra): Cache the parsing.
+    template = Emitter._template_cache.get(source)
+    if template is not None:
+      Emitter._template_cache_hits += 1
+      return template
+    Emitter._template_cache_misses += 1
+    template = self._ParseTemplateUncached(source)
+    if len(Emitter._template_cache) >= _TEMPLATE_CACHE_SIZE:
+      # Only generated one-off templates get here; start over.
+      Emitter._template_cache.clear()
+    Emitter._template_cache[source] = template
+    return template
+
+  def _ParseTemplateUncached(self, source):
     items = []
     holes = []
 
@@ -161,21 +190,34 @@ class Emitter(object):
       r'\$(\w+)|\$\((\w+)\)|\$!(\w+)|\$\(!(\w+)\)|\$\?(\w+)|\$\(\?(\w+)\)')
 
   def _ApplyTemplate(self, template, bindings):
-    """Emits the items from the parsed template."""
-    result = []
+    """Emits the items from the parsed template.
+
+    Frames never change once created, so lookups are resolved right away
+    instead of when the fragments are collected.  The value of a hole (or of a
+    Bind variable) is the item list of its emitter, which may still be filled
+    later, so it is emitted by reference.  Adjacent text is joined, which
+    keeps self._items a flat list of strings and such references.
+    """
+    items = self._items
+    text = []
     for item in template._items:
       if isinstance(item, str):
-        if item:
-          result.append(item)
+        text.append(item)
       elif isinstance(item, Emitter.Lookup):
-        # Bind lookup to the current environment (bindings)
-        # TODO(sra): More space efficient to do direct lookup.
-        result.append(Emitter.DeferredLookup(item, bindings))
+        value = bindings.Lookup(item._name, item._value_if_missing)
+        if isinstance(value, list):
+          if text:
+            items.append(''.join(text))
+            text = []
+          items.append(value)
+        else:
+          text.append(str(value))
       else:
         raise RuntimeError('Unexpected template element')
-    # Collected fragments are in a sublist, so self._items contains one element
-    # (sublist) per template application.
-    self._items.append(result)
+    if text:
+      text = ''.join(text)
+      if text:
+        items.append(text)
 
   class Lookup(object):
     """An element of a parsed template."""
@@ -184,15 +226,6 @@ class Emitter(object):
       self._original = original
       self._value_if_missing = default
 
-  class DeferredLookup(object):
-    """A lookup operation that is deferred until final string generation."""
-    # TODO(sra): A deferred lookup will be useful when we add expansions that
-    # have behaviour condtional on the contents, e.g. adding separators between
-    # a list of items.
-    def __init__(self, lookup, environment):
-      self._lookup = lookup
-      self._environment = environment
-
   class Template(object):
     """A parsed template."""
     def __init__(self, items, holes):
@@ -207,10 +240,11 @@ class Emitter(object):
       self._parent = parent
 
     def Lookup(self, name, default):
-      if name in self._map:
-        return self._map[name]
-      if self._parent:
-        return self._parent.Lookup(name, default)
+      frame = self
+      while frame is not None:
+        if name in frame._map:
+          return frame._map[name]
+        frame = frame._parent
       return default
 
     def Extend(self, map):
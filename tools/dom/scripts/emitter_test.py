@@ -94,6 +94,16 @@ class EmitterTestCase(unittest.TestCase):
   def testFormat(self):
     self.assertEquals(emitter.Format('$A$B', A=1, B=2), '12')
 
+  def testTemplateCache(self):
+    (hits, misses, _) = emitter.TemplateCacheStats()
+    e = emitter.Emitter()
+    for value in range(3):
+      e.Emit('[$A $!HOLE]', A=value).Emit('$B', B=value)
+    self.check(e, '[0 0][1 1][2 2]')
+    (new_hits, new_misses, _) = emitter.TemplateCacheStats()
+    self.assertEquals(new_hits - hits + new_misses - misses, 6)
+    self.assertTrue(new_hits - hits >= 4)
+
 if __name__ == '__main__':
   logging.config.fileConfig('logging.conf')
   if __name__ == '__main__':
@@ -7,6 +7,8 @@ import database
 import databasebuilder
 import logging.config
 import os.path
+import pickle
+import profiler
 import sys
 import time
 import utilities
@@ -35,10 +37,56 @@ FEATURE_DEFINES = [
     'ENABLE_WEB_AUDIO', # Not on Android
 ]
 
+# Version of the incremental build state.  Bump it whenever the way the
+# database is built changes, so the next incremental build starts over.
+_BUILD_STATE_VERSION = 2
+
+def _build_state_path(database_dir):
+  return os.path.join(database_dir, 'build_state.pickle')
+
+def _load_build_state(db, database_dir, build_key):
+  """Returns the state saved by the previous incremental build, or None if
+  the database has to be built from scratch."""
+  state_path = _build_state_path(database_dir)
+  if not os.path.isfile(state_path):
+    return None
+  try:
+    with open(state_path, 'rb') as f:
+      build_state = pickle.load(f)
+  except Exception as err:
+    _logger.warning('Ignoring unreadable build state %s: %s' %
+                    (state_path, err))
+    return None
+  if build_state.get('key') != build_key:
+    _logger.info('Build options changed, rebuilding the database')
+    return None
+  if not db.HasCompleteCache():
+    _logger.info('Database cache is incomplete, rebuilding the database')
+    return None
+  return build_state
+
+def _save_build_state(db, database_dir, builder, build_key):
+  build_state = {
+    'key': build_key,
+    'enums': db.GetEnums(),
+    'dictionaries': db.GetDictionaries(),
+    'builder': builder.get_build_state(),
+  }
+  state_path = _build_state_path(database_dir)
+  with open(state_path, 'wb') as f:
+    pickle.dump(build_state, f, pickle.HIGHEST_PROTOCOL)
+
 def build_database(idl_files, database_dir, feature_defines=None,
-                   logging_level=logging.WARNING, examine_idls=False):
+                   logging_level=logging.WARNING, examine_idls=False,
+                   parallel=False, ast_cache_dir=None, incremental=False):
   """This code reconstructs the FremontCut IDL database from W3C,
-  WebKit and Dart IDL files."""
+  WebKit and Dart IDL files.  When parallel is True the IDL files are
+  compiled by a pool of worker processes.  Compiled ASTs are reused from
+  ast_cache_dir, if given, for IDL files whose inputs did not change.
+
+  When incremental is True the database is saved along with its build state,
+  and the next incremental build only re-merges the interfaces fed by
+  changed IDL files (and their dependents)."""
   current_dir = os.path.dirname(__file__)
   logging.config.fileConfig(os.path.join(current_dir, "logging.conf"))
 
@@ -46,10 +94,8 @@ def build_database(idl_files, database_dir, feature_defines=None,
 
   db = database.Database(database_dir)
 
-  # Delete all existing IDLs in the DB.
-  db.Delete()
-
-  builder = databasebuilder.DatabaseBuilder(db)
+  builder = databasebuilder.DatabaseBuilder(db, parallel=parallel,
+                                            ast_cache_dir=ast_cache_dir)
 
   # TODO(vsm): Move this to a README.
   # This is the Dart SVN revision.
@@ -69,8 +115,29 @@ def build_database(idl_files, database_dir, feature_defines=None,
       source_attributes={'revision': webkit_revision},
       logging_level=logging_level)
 
+  dart_idl_file = os.path.join(current_dir, '..', 'idl', 'dart', 'dart.idl')
+
+  build_key = (_BUILD_STATE_VERSION, webkit_revision,
+               sorted(webkit_defines + feature_defines))
+  build_state = None
+  if incremental:
+    build_state = _load_build_state(db, database_dir, build_key)
+
+  if build_state:
+    db.LoadFromCache()
+    for enum in build_state['enums']:
+      db.AddEnum(enum)
+    for dictionary in build_state['dictionaries']:
+      db.AddDictionary(dictionary)
+    builder.start_incremental_build(build_state['builder'],
+                                    idl_files + [dart_idl_file])
+  else:
+    # Delete all existing IDLs in the DB.
+    db.Delete()
+
   # Import WebKit IDLs.
-  builder.import_idl_files(idl_files, webkit_options, False)
+  with profiler.Phase('Import WebKit IDL files'):
+    builder.import_idl_files(idl_files, webkit_options, False)
 
   # Import Dart idl:
   dart_options = databasebuilder.DatabaseBuilderOptions(
@@ -80,23 +147,23 @@ def build_database(idl_files, database_dir, feature_defines=None,
 
   utilities.KNOWN_COMPONENTS = frozenset(['core', 'modules', 'dart'])
 
-  builder.import_idl_files(
-      [ os.path.join(current_dir, '..', 'idl', 'dart', 'dart.idl') ],
-      dart_options, True)
+  with profiler.Phase('Import Dart IDL files'):
+    builder.import_idl_files([ dart_idl_file ], dart_options, True)
 
   start_time = time.time()
 
-  # Merging:
-  builder.merge_imported_interfaces()
+  with profiler.Phase('Merge interfaces'):
+    # Merging:
+    builder.merge_imported_interfaces()
 
-  builder.fetch_constructor_data(webkit_options)
-  builder.fix_displacements('WebKit')
+    builder.fetch_constructor_data(webkit_options)
+    builder.fix_displacements('WebKit')
 
-  # Cleanup:
-  builder.normalize_annotations(['WebKit', 'Dart'])
+    # Cleanup:
+    builder.normalize_annotations(['WebKit', 'Dart'])
 
-  # Map any IDL defined dictionaries to Dictionary.
-  builder.map_dictionaries()
+    # Map any IDL defined dictionaries to Dictionary.
+    builder.map_dictionaries()
 
   # Examine all IDL and produce a diagnoses of areas (e.g., list dictionaries
   # declared and usage, etc.)
@@ -121,9 +188,21 @@ def build_database(idl_files, database_dir, feature_defines=None,
 
   print 'Merging interfaces %s seconds' % round(time.time() - start_time, 2)
 
+  if incremental:
+    start_time = time.time()
+    with profiler.Phase('Save database'):
+      written = db.Save()
+      db.Cache()
+      _save_build_state(db, database_dir, builder, build_key)
+    rebuilt = builder.rebuilt_interfaces()
+    print 'Saved %s changed IDL files (%s interfaces rebuilt) in %s seconds' % (
+        written, 'all' if rebuilt is None else len(rebuilt),
+        round(time.time() - start_time, 2))
+
   return db
 
-def main(parallel=False, logging_level=logging.WARNING, examine_idls=False):
+def main(parallel=False, logging_level=logging.WARNING, examine_idls=False,
+         incremental=False):
   current_dir = os.path.dirname(__file__)
 
   idl_files = []
@@ -168,8 +247,11 @@ def main(parallel=False, logging_level=logging.WARNING, examine_idls=False):
   os.path.walk(webcore_dir, visitor, webcore_dir)
 
   database_dir = os.path.join(current_dir, '..', 'database')
+  ast_cache_dir = os.path.join(current_dir, '..', 'ast_cache')
 
-  return build_database(idl_files, database_dir, logging_level=logging_level, examine_idls=examine_idls)
+  return build_database(idl_files, database_dir, logging_level=logging_level,
+                        examine_idls=examine_idls, parallel=parallel,
+                        ast_cache_dir=ast_cache_dir, incremental=incremental)
 
 if __name__ == '__main__':
   sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""This module caches what each interface generates between runs, to only
+generate again the interfaces whose inputs changed."""
+
+import ast
+import cPickle
+import dependencies
+import hashlib
+import logging
+import monitored
+import os
+import sys
+import types
+
+_logger = logging.getLogger('generationcache')
+
+# Version of the cache files.  Bump it whenever the cached output or the
+# dependencies change; files written by another version are then ignored.
+_CACHE_VERSION = 1
+
+_scripts_dir = os.path.dirname(os.path.abspath(__file__))
+
+_code_fingerprint = None
+
+
+def _IsGeneratorModule(module):
+  path = getattr(module, '__file__', None)
+  return (path is not None and
+          os.path.dirname(os.path.abspath(path)) == _scripts_dir)
+
+def _StableRepr(value):
+  """Returns a repr of a table entry that is the same in every run, unlike
+  the default repr of objects."""
+  if isinstance(value, (basestring, int, long, float, bool, types.NoneType)):
+    return repr(value)
+  if isinstance(value, (list, tuple)):
+    return '[%s]' % ', '.join(_StableRepr(item) for item in value)
+  if isinstance(value, (set, frozenset)):
+    return '{%s}' % ', '.join(sorted(_StableRepr(item) for item in value))
+  if isinstance(value, dict):
+    return '{%s}' % ', '.join(sorted(
+        '%s: %s' % (_StableRepr(key), _StableRepr(item))
+        for (key, item) in value.iteritems()))
+  if isinstance(value, (types.FunctionType, type, types.ClassType)):
+    return '%s.%s' % (value.__module__, value.__name__)
+  if hasattr(value, '__dict__'):
+    return '%s %s' % (type(value).__name__, _StableRepr(vars(value)))
+  return type(value).__name__
+
+def _IsMonitoredTable(node):
+  return (isinstance(node, ast.Call) and
+          isinstance(node.func, ast.Attribute) and
+          isinstance(node.func.value, ast.Name) and
+          node.func.value.id == 'monitored' and
+          node.func.attr in ('Dict', 'Set'))
+
+def CodeFingerprint():
+  """Returns a hash of the source code of the generator modules.
+
+  The content of the monitored tables is left out: the lookups in them are
+  recorded as dependencies, so editing an entry only invalidates the
+  interfaces that looked it up.  Hashing the syntax tree also leaves out
+  comments, formatting and line numbers.
+  """
+  global _code_fingerprint
+  if _code_fingerprint is None:
+    sha = hashlib.sha1()
+    for (module_name, module) in sorted(sys.modules.items()):
+      if not _IsGeneratorModule(module):
+        continue
+      path = '%s.py' % os.path.splitext(module.__file__)[0]
+      with open(path) as f:
+        tree = ast.parse(f.read(), path)
+      for node in tree.body:
+        if isinstance(node, ast.Assign) and _IsMonitoredTable(node.value):
+          # Only keep the name of the table.
+          node.value.args = node.value.args[:1]
+      sha.update('module %s\n%s\n' % (module_name, ast.dump(tree)))
+    _code_fingerprint = sha.hexdigest()
+  return _code_fingerprint
+
+def _Hash(content):
+  return hashlib.sha1(content).hexdigest()
+
+def _StateFingerprint(state):
+  """Returns a fingerprint of a monitored.KeyState()."""
+  if isinstance(state, bool):
+    return state
+  (found, value) = state
+  if not found:
+    return None
+  if isinstance(value, basestring):
+    return value
+  return _Hash(_StableRepr(value))
+
+
+class GenerationCache(object):
+  """The output of each interface in the previous run, with the inputs it
+  depended on.
+
+  The inputs are the dependencies recorded while generating the interface:
+  the interfaces, enums and dictionaries it looked up in the database, the
+  templates it loaded, the keys it looked up in the monitored tables and the
+  interfaces it looked up in the DOM metadata.  The rest of what the
+  generator reads, i.e. its code and other tables, is covered by
+  CodeFingerprint() and invalidates the whole cache.
+
+  Most of the dependencies are keys of monitored tables, so the keys are only
+  checked in the tables that changed since the previous run.
+  """
+
+  def __init__(self, path, key, database, template_loader, metadata):
+    """Loads the cache file at path, unless it was written with another key,
+    e.g. other generator options."""
+    self._path = path
+    self._key = (_CACHE_VERSION, CodeFingerprint(), key)
+    self._database = database
+    self._template_loader = template_loader
+    self._metadata = metadata
+    # Fingerprints of the dependencies and of the monitored tables, computed
+    # once per run.
+    self._fingerprints = {}
+    self._table_fingerprints = {}
+    # Fingerprints of the monitored tables in the previous run, by index.
+    self._previous_table_fingerprints = {}
+    # ([(dependency, fingerprint)], {table index: [(key, fingerprint)]},
+    #  output) by interface name.
+    self._entries = {}
+    self._new_entries = {}
+    self.reused = 0
+    self.generated = 0
+
+    if os.path.exists(path):
+      try:
+        with open(path, 'rb') as f:
+          if cPickle.load(f) == self._key:
+            self._previous_table_fingerprints = cPickle.load(f)
+            self._entries = cPickle.load(f)
+      except Exception, e:
+        _logger.warn('Ignoring the generation cache %s: %s' % (path, e))
+
+  def Generate(self, interface, generate_interface, output):
+    """Merges the cached output of the interface into output if its inputs
+    didn't change, or else generates it and caches what it emits.
+
+    output.Record(function) must call function and return what it emits, in
+    the form output.Merge() takes.
+    """
+    entry = self._entries.get(interface.id)
+    if entry is not None and self._IsCurrent(entry):
+      (_, key_fingerprints, interface_output) = entry
+      output.Merge(interface_output)
+      for (index, fingerprints) in key_fingerprints.iteritems():
+        monitored.MarkUsed(index, [key for (key, _) in fingerprints])
+      self.reused += 1
+    else:
+      _logger.info('Generating %s' % interface.id)
+      dependencies.Start()
+      try:
+        interface_output = output.Record(
+            lambda: generate_interface(interface))
+      finally:
+        interface_dependencies = dependencies.Stop()
+      interface_dependencies.add(('interface', interface.id))
+      fingerprints = []
+      key_fingerprints = {}
+      for dependency in interface_dependencies:
+        if dependency[0] == 'monitored':
+          key_fingerprints.setdefault(dependency[1], []).append(
+              (dependency[2], self._Fingerprint(dependency)))
+        else:
+          fingerprints.append((dependency, self._Fingerprint(dependency)))
+      entry = (fingerprints, key_fingerprints, interface_output)
+      self.generated += 1
+    self._new_entries[interface.id] = entry
+
+  def Save(self):
+    """Writes the entries of the interfaces generated in this run, unless
+    they were all reused."""
+    table_fingerprints = {}
+    for (_, key_fingerprints, _) in self._new_entries.itervalues():
+      for index in key_fingerprints:
+        table_fingerprints[index] = self._TableFingerprint(index)
+    if (not self.generated and len(self._new_entries) == len(self._entries)
+        and table_fingerprints == self._previous_table_fingerprints):
+      return
+
+    directory = os.path.dirname(self._path)
+    if directory and not os.path.exists(directory):
+      os.makedirs(directory)
+    temp_path = '%s.tmp' % self._path
+    with open(temp_path, 'wb') as f:
+      cPickle.dump(self._key, f, 2)
+      cPickle.dump(table_fingerprints, f, 2)
+      cPickle.dump(self._new_entries, f, 2)
+    os.rename(temp_path, self._path)
+
+  def _IsCurrent(self, entry):
+    (fingerprints, key_fingerprints, _) = entry
+    for (dependency, fingerprint) in fingerprints:
+      if self._Fingerprint(dependency) != fingerprint:
+        return False
+    for (index, fingerprints) in key_fingerprints.iteritems():
+      if (self._TableFingerprint(index) ==
+          self._previous_table_fingerprints.get(index)):
+        continue
+      for (key, fingerprint) in fingerprints:
+        if self._Fingerprint(('monitored', index, key)) != fingerprint:
+          return False
+    return True
+
+  def _TableFingerprint(self, index):
+    if index not in self._table_fingerprints:
+      self._table_fingerprints[index] = _Hash(
+          _StableRepr(monitored.Contents(index)))
+    return self._table_fingerprints[index]
+
+  def _Fingerprint(self, dependency):
+    if dependency not in self._fingerprints:
+      self._fingerprints[dependency] = self._ComputeFingerprint(dependency)
+    return self._fingerprints[dependency]
+
+  def _ComputeFingerprint(self, dependency):
+    database = self._database
+    kind = dependency[0]
+    if kind == 'interface':
+      if database.HasInterface(dependency[1]):
+        return _Hash(cPickle.dumps(database.GetInterface(dependency[1]), 2))
+      return None
+    if kind == 'enum':
+      if database.HasEnum(dependency[1]):
+        return _Hash(cPickle.dumps(database.GetEnum(dependency[1]), 2))
+      return None
+    if kind == 'dictionary':
+      if database.HasDictionary(dependency[1]):
+        return _Hash(cPickle.dumps(database.GetDictionary(dependency[1]), 2))
+      return None
+    if kind == 'interfaces':
+      return _Hash(''.join(
+          '%s %s\n' % (interface.id,
+                       self._Fingerprint(('interface', interface.id)))
+          for interface in database.GetInterfaces()))
+    if kind == 'enums':
+      return _Hash(cPickle.dumps(database.GetEnums(), 2))
+    if kind == 'dictionaries':
+      return _Hash(cPickle.dumps(database.GetDictionaries(), 2))
+    if kind == 'template':
+      return self._template_loader.Fingerprint(dependency[1])
+    if kind == 'monitored':
+      return _StateFingerprint(monitored.KeyState(*dependency[1:]))
+    if kind == 'metadata':
+      return self._metadata.Fingerprint(dependency[1])
+    raise Exception('Unknown dependency %s' % (dependency,))
@@ -7,10 +7,13 @@
 Dart APIs from the IDL database."""
 
 import copy
+import dependencies
+import idlnode
 import json
 import monitored
 import os
 import re
+import string
 from htmlrenamer import custom_html_constructors, html_interface_renames, \
     typed_array_renames
 
@@ -1318,28 +1321,105 @@ _svg_supplemental_includes = [
     '"core/svg/properties/SVGPropertyTraits.h"',
 ]
 
+_word_characters = frozenset(string.ascii_letters + string.digits + '_')
+_sequence_item_characters = _word_characters | frozenset(' ')
+
+def _SequenceItemTypeName(type_name):
+  """Returns T for the type names 'sequence<T>' and 'T[]', or None."""
+  if type_name.startswith('sequence<') and type_name.endswith('>'):
+    item_type_name = type_name[len('sequence<'):-len('>')]
+    characters = _sequence_item_characters
+  elif type_name.endswith('[]'):
+    item_type_name = type_name[:-len('[]')]
+    characters = _word_characters
+  else:
+    return None
+  if item_type_name and all(c in characters for c in item_type_name):
+    return item_type_name
+  return None
+
 class TypeRegistry(object):
   def __init__(self, database, renamer=None):
     self._database = database
     self._renamer = renamer
+    # (type info, dependencies recorded while computing it) by type name.
     self._cache = {}
+    # Types computed by WarmUp() that TypeInfo() didn't return yet.
+    self._warm_types = set()
+    self._hits = 0
+    self._misses = 0
+    self.WarmUp()
 
   def HasInterface(self, type_name):
     return self._database.HasInterface(type_name)
 
+  def WarmUp(self):
+    """Computes the type info of all the types in the database at once.
+
+    The keys of the monitored tables looked up for a type are only marked as
+    used when TypeInfo() first returns it, so that the unused keys are still
+    reported.
+    """
+    type_names = set()
+    for container in (self._database.GetInterfaces() +
+                      self._database.GetDictionaries()):
+      for idl_type in container.all(idlnode.IDLType):
+        type_names.add(idl_type.id)
+
+    cached_types = set(self._cache)
+    stats = (self._hits, self._misses)
+    used_keys = monitored.TakeUsedKeys()
+    try:
+      for type_name in sorted(type_names):
+        if type_name in self._cache:
+          continue
+        try:
+          self._ComputeTypeInfo(type_name)
+        except Exception:
+          # TypeInfo() raises again if the generation does use the type.
+          pass
+    finally:
+      monitored.TakeUsedKeys()
+      monitored.MergeUsedKeys(used_keys)
+    self._warm_types.update(set(self._cache) - cached_types)
+    # Only count the lookups of the generation.
+    (self._hits, self._misses) = stats
+
+  def CacheStats(self):
+    """Returns (hits, misses, size) of the type info cache."""
+    return (self._hits, self._misses, len(self._cache))
+
   def TypeInfo(self, type_name):
     if not type_name in self._cache:
-      self._cache[type_name] = self._TypeInfo(type_name)
-    return self._cache[type_name]
+      self._misses += 1
+      return self._ComputeTypeInfo(type_name)
+    self._hits += 1
+    (type_info, type_dependencies) = self._cache[type_name]
+    if type_name in self._warm_types:
+      self._warm_types.remove(type_name)
+      for dependency in type_dependencies:
+        if dependency[0] == 'monitored':
+          monitored.MarkUsed(dependency[1], [dependency[2]])
+    dependencies.Replay(type_dependencies)
+    return type_info
+
+  def _ComputeTypeInfo(self, type_name):
+    dependencies.Start()
+    try:
+      type_info = self._TypeInfo(type_name)
+    finally:
+      type_dependencies = dependencies.Stop()
+    self._cache[type_name] = (type_info, type_dependencies)
+    return type_info
 
   def DartType(self, type_name):
     return self.TypeInfo(type_name).dart_type()
 
   def _TypeInfo(self, type_name):
-    match = re.match(r'(?:sequence<([\w ]+)>|(\w+)\[\])$', type_name)
-    if match:
+    item_type_name = _SequenceItemTypeName(type_name)
+    if item_type_name:
       type_data = TypeData('Sequence')
-      item_info = self.TypeInfo(match.group(1) or match.group(2))
+      item_info = self.TypeInfo(item_type_name)
       # TODO(vsm): Generalize this code.
       if 'SourceInfo' in type_name:
         type_data.native_type = 'const Vector<RefPtr<SourceInfo> >& '
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for generator module."""
+
+import database
+import generator
+import idlnode
+import logging.config
+import monitored
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+
+def _Attribute(type, name):
+  return ('Attribute', [('Type', ('ScopedName', type)), ('Id', name)])
+
+
+class GeneratorTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self._working_dir = tempfile.mkdtemp()
+    self._database = database.Database(
+        os.path.join(self._working_dir, 'database'))
+    self._database.AddInterface(idlnode.IDLInterface([
+        ('Id', 'I'), _Attribute('octet', 'a'), _Attribute('Missing', 'b')]))
+    # Only the keys used by the tests below.
+    self._used_keys = monitored.TakeUsedKeys()
+
+  def tearDown(self):
+    monitored.TakeUsedKeys()
+    monitored.MergeUsedKeys(self._used_keys)
+    shutil.rmtree(self._working_dir)
+
+  def testSequenceItemTypeName(self):
+    def regex_item_type_name(type_name):
+      match = re.match(r'(?:sequence<([\w ]+)>|(\w+)\[\])$', type_name)
+      return match and (match.group(1) or match.group(2))
+    for type_name in ['sequence<unsigned long>', 'long[]', 'sequence<>', '[]',
+                      'a-b[]', 'sequence<a<b>>', 'long']:
+      self.assertEquals(generator._SequenceItemTypeName(type_name),
+                        regex_item_type_name(type_name), type_name)
+
+  def testWarmUpKeepsKeysUnused(self):
+    type_registry = generator.TypeRegistry(self._database)
+    # octet is computed by WarmUp(), but not used yet.
+    self.assertEquals(type_registry.CacheStats(), (0, 0, 1))
+    self.assertFalse(generator._idl_type_registry._IsUsed('octet'))
+    self.assertEquals(type_registry.TypeInfo('octet').native_type(), 'int')
+    self.assertTrue(generator._idl_type_registry._IsUsed('octet'))
+
+  def testWarmUpErrorsRaiseAgain(self):
+    type_registry = generator.TypeRegistry(self._database)
+    self.assertRaises(RuntimeError, type_registry.TypeInfo, 'Missing')
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
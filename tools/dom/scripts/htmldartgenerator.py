@@ -35,6 +35,118 @@ _custom_factories = [
   'EventSource',
 ]
 
+def RenameOverloads(database, interface_name):
+  """The IDL has a number of functions with the same name but that accept
+  different types. This is fine for JavaScript, but results in vague type
+  signatures for Dart. We rename some of these (by adding a new identical
+  operation with a different DartName), but leave the original version as
+  well in some cases.
+
+  The interface is only copied for update if some of its operations are
+  renamed, so the others stay shared with the clones of the database.
+  Renaming them again is a no-op.
+  """
+  interface = database.GetInterface(interface_name)
+  if _HasOverloadsToRename(interface):
+    interface = database.GetInterfaceForUpdate(interface_name)
+  _AddRenamedOverloads(interface)
+
+def _AlreadyRenamed(interface):
+  return [operation.ext_attrs['DartName'] if 'DartName' in
+      operation.ext_attrs else '' for operation in interface.operations]
+
+def _HasOverloadsToRename(interface):
+  """Returns whether _AddRenamedOverloads() would modify the interface.  It
+  looks up the same keys of the monitored tables."""
+  already_renamed = _AlreadyRenamed(interface)
+  for operation in interface.operations:
+    full_operation_str = _GetStringRepresentation(interface, operation)
+    if (full_operation_str in renamed_overloads and
+        renamed_overloads[full_operation_str] not in already_renamed):
+      if ('%s.%s' % (interface.id, operation.id) in overloaded_and_renamed or
+          renamed_overloads[full_operation_str]):
+        return True
+  return False
+
+def _AddRenamedOverloads(interface):
+  potential_added_operations = set()
+  operations_by_name = _OperationsByName(interface)
+  already_renamed = _AlreadyRenamed(interface)
+
+  added_operations = []
+  for operation in interface.operations:
+    full_operation_str = _GetStringRepresentation(interface, operation)
+    if (full_operation_str in renamed_overloads and
+        renamed_overloads[full_operation_str] not in already_renamed):
+      if '%s.%s' % (interface.id, operation.id) in overloaded_and_renamed:
+        cloned_operation = deepcopy(operation)
+        cloned_operation.ext_attrs['DartName'] = renamed_overloads[
+            full_operation_str]
+        added_operations.append(cloned_operation)
+      else:
+        dart_name = renamed_overloads[full_operation_str]
+        if not dart_name:
+          continue
+
+        operation.ext_attrs['DartName'] = dart_name
+        potential_added_operations.add(operation.id)
+    _EnsureNoMultipleTypeSignatures(interface, operation, operations_by_name)
+  if added_operations:
+    interface.operations += added_operations
+    interface.invalidate_index()
+  _AddDesiredOverloadedOperations(potential_added_operations, interface,
+      operations_by_name)
+
+def _AddDesiredOverloadedOperations(potential_added_operations, interface,
+    original_operations_by_name):
+  """For some cases we desire to keep the overloaded version in dart, for
+  simplicity of API, and explain the parameters accepted in documentation."""
+  updated_operations_by_name = _OperationsByName(interface)
+  for operation_id in potential_added_operations:
+    if (operation_id not in updated_operations_by_name and
+        '%s.%s' % (interface.id, operation_id) in keep_overloaded_members):
+      for operation in original_operations_by_name[operation_id]:
+        cloned_operation = deepcopy(operation)
+        cloned_operation.ext_attrs['DartName'] = operation_id
+        interface.operations.append(cloned_operation)
+        interface.invalidate_index()
+
+def _EnsureNoMultipleTypeSignatures(interface, operation, operations_by_name):
+  """Make sure that there is now at most one operation with a particular
+  operation.id. If not, stop library generation, and throw an error, requiring
+  programmer input about the best name change before proceeding."""
+  operation_str = '%s.%s' % (interface.id, operation.id)
+
+  if (operation.id in operations_by_name and
+      len(operations_by_name[operation.id]) > 1 and
+      len(filter(lambda overload: overload.startswith(operation_str),
+          renamed_overloads.keys())) == 0 and
+      operation_str not in keep_overloaded_members and
+      operation_str not in overloaded_and_renamed and
+      operation_str not in renamed_html_members and
+      operation_str not in private_html_members and
+      operation_str not in removed_html_members and
+      operation.id != '__getter__' and
+      operation.id != '__setter__' and
+      operation.id != '__delete__'):
+    _logger.error('Multiple type signatures for %s.%s. Please file a bug with'
+        ' the dart:html team to determine if one of these functions should be'
+        ' renamed.' % (
+        interface.id, operation.id))
+
+def _GetStringRepresentation(interface, operation):
+  """Given an IDLOperation, return a object-independent representation of the
+  operations's signature."""
+  return '%s.%s(%s)' % (interface.id, operation.id, ', '.join(
+      ['%s %s' % (arg.type.id, arg.id) for arg in operation.arguments]))
+
+def _OperationsByName(interface):
+  operationsByName = {}
+  for operation in interface.operations:
+    name = operation.ext_attrs.get('DartName', operation.id)
+    operationsByName.setdefault(name, []).append(operation)
+  return operationsByName
+
 class HtmlDartGenerator(object):
   def __init__(self, interface, options, dart_use_blink):
     self._dart_use_blink = dart_use_blink
@@ -91,9 +203,9 @@ class HtmlDartGenerator(object):
           self.AmendIndexer(parent_type_info.list_item_type())
           break
 
-    # Group overloaded operations by name.
-    self._AddRenamedOverloads(interface)
-    operationsByName = self._OperationsByName(interface)
+    # Group overloaded operations by name.  They were renamed by
+    # RenameOverloads() before the interfaces were rendered.
+    operationsByName = _OperationsByName(interface)
     if self.OmitOperationOverrides():
       self._RemoveShadowingOperationsWithSameSignature(operationsByName,
           interface)
@@ -142,7 +254,7 @@ class HtmlDartGenerator(object):
             self.AddAttribute(attr)
 
       # Group overloaded operations by name.
-      operationsByName =self._OperationsByName(parent_interface)
+      operationsByName = _OperationsByName(parent_interface)
 
       if self.OmitOperationOverrides():
         self._RemoveShadowingOperationsWithSameSignature(operationsByName,
@@ -178,90 +290,6 @@ class HtmlDartGenerator(object):
           if existing_operation.SameSignatureAs(operation):
             del operationsByName[operation.id]
 
-  def _AddRenamedOverloads(self, interface):
-    """The IDL has a number of functions with the same name but that accept
-    different types. This is fine for JavaScript, but results in vague type
-    signatures for Dart. We rename some of these (by adding a new identical
-    operation with a different DartName), but leave the original version as
-    well in some cases."""
-    potential_added_operations = set()
-    operations_by_name = self._OperationsByName(interface)
-    already_renamed = [operation.ext_attrs['DartName'] if 'DartName' in
-        operation.ext_attrs else '' for operation in interface.operations]
-
-    added_operations = []
-    for operation in interface.operations:
-      full_operation_str = self._GetStringRepresentation(interface, operation)
-      if (full_operation_str in renamed_overloads and
-          renamed_overloads[full_operation_str] not in already_renamed):
-        if '%s.%s' % (interface.id, operation.id) in overloaded_and_renamed:
-          cloned_operation = deepcopy(operation)
-          cloned_operation.ext_attrs['DartName'] = renamed_overloads[
-              full_operation_str]
-          added_operations.append(cloned_operation)
-        else:
-          dart_name = renamed_overloads[full_operation_str]
-          if not dart_name:
-            continue
-
-          operation.ext_attrs['DartName'] = dart_name
-          potential_added_operations.add(operation.id)
-      self._EnsureNoMultipleTypeSignatures(interface, operation,
-          operations_by_name)
-    interface.operations += added_operations
-    self._AddDesiredOverloadedOperations(potential_added_operations, interface,
-        operations_by_name)
-
-  def _AddDesiredOverloadedOperations(self, potential_added_operations,
-      interface, original_operations_by_name):
-    """For some cases we desire to keep the overloaded version in dart, for
-    simplicity of API, and explain the parameters accepted in documentation."""
-    updated_operations_by_name = self._OperationsByName(interface)
-    for operation_id in potential_added_operations:
-      if (operation_id not in updated_operations_by_name and
-          '%s.%s' % (interface.id, operation_id) in keep_overloaded_members):
-        for operation in original_operations_by_name[operation_id]:
-          cloned_operation = deepcopy(operation)
-          cloned_operation.ext_attrs['DartName'] = operation_id
-          interface.operations.append(cloned_operation)
-
-  def _EnsureNoMultipleTypeSignatures(self, interface, operation,
-      operations_by_name):
-    """Make sure that there is now at most one operation with a particular
-    operation.id. If not, stop library generation, and throw an error, requiring
-    programmer input about the best name change before proceeding."""
-    operation_str = '%s.%s' % (interface.id, operation.id)
-
-    if (operation.id in operations_by_name and
-        len(operations_by_name[operation.id]) > 1 and
-        len(filter(lambda overload: overload.startswith(operation_str),
-            renamed_overloads.keys())) == 0 and
-        operation_str not in keep_overloaded_members and
-        operation_str not in overloaded_and_renamed and
-        operation_str not in renamed_html_members and
-        operation_str not in private_html_members and
-        operation_str not in removed_html_members and
-        operation.id != '__getter__' and
-        operation.id != '__setter__' and
-        operation.id != '__delete__'):
-      _logger.error('Multiple type signatures for %s.%s. Please file a bug with'
-          ' the dart:html team to determine if one of these functions should be'
-          ' renamed.' % (
-          interface.id, operation.id))
-
-  def _GetStringRepresentation(self, interface, operation):
-    """Given an IDLOperation, return a object-independent representation of the
-    operations's signature."""
-    return '%s.%s(%s)' % (interface.id, operation.id, ', '.join(
-        ['%s %s' % (arg.type.id, arg.id) for arg in operation.arguments]))
-
-  def _OperationsByName(self, interface):
-    operationsByName = {}
-    for operation in interface.operations:
-      name = operation.ext_attrs.get('DartName', operation.id)
-      operationsByName.setdefault(name, []).append(operation)
-    return operationsByName
-
   def OmitOperationOverrides(self):
     return False
 
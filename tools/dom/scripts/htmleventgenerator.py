@@ -295,10 +295,7 @@ class HtmlEventGenerator(object):
       annotations = self._metadata.GetFormattedMetadata(
           library_name, interface, annotation_name, '  ')
 
-      isElement = False
-      for parent in self._database.Hierarchy(interface):
-        if parent.id == 'Element':
-          isElement = True
+      isElement = self._database.InheritsFrom(interface, 'Element')
       # We add the same event stream getters Element, ElementList, and
       # _FrozenElementList. So, in impl_Element.darttemplate, we have two
       # additional emitters to add the correct variation of the stream getter
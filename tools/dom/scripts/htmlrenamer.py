@@ -2,6 +2,7 @@
 # Copyright (c) 2012, the Dart project authors.  Please see the AUTHORS file
 # for details. All rights reserved. Use of this source code is governed by a
 # BSD-style license that can be found in the LICENSE file.
+import dependencies
 import logging
 import monitored
 import re
@@ -841,10 +842,28 @@ _library_ids = monitored.Dict('htmlrenamer._library_names', {
   'Window': 'Html',
 })
 
+# Name transforms of HtmlRenamer, memoized by name.
+_dartified_names = {}
+_dartified_member_names = {}
+_camel_case_names = {}
+
+def _IndexMemberTable(candidates):
+  """Returns {interface id: {member: key}} of the keys of a member table,
+  e.g. {'=Element': {'on:wheel': '=Element.on:wheel'}}."""
+  index = {}
+  for key in candidates:
+    (interface_id, member) = key.split('.', 1)
+    index.setdefault(interface_id, {})[member] = key
+  return index
+
 class HtmlRenamer(object):
   def __init__(self, database, metadata):
     self._database = database
     self._metadata = metadata
+    # _IndexMemberTable() of each member table by name, and the members of
+    # each table that match in the hierarchy of each interface.
+    self._member_tables = {}
+    self._member_matches = {}
 
   def RenameInterface(self, interface):
     if 'Callback' in interface.ext_attrs:
@@ -856,8 +875,8 @@ class HtmlRenamer(object):
       return candidate
 
     if interface.id.startswith('HTML'):
-      if any(interface.id in ['Element', 'Document']
-             for interface in self._database.Hierarchy(interface)):
+      if (self._database.InheritsFrom(interface, 'Element') or
+          self._database.InheritsFrom(interface, 'Document')):
         return interface.id[len('HTML'):]
     return self._DartifyName(interface.javascript_binding_name)
 
@@ -920,6 +939,54 @@ class HtmlRenamer(object):
       return True
 
   def _FindMatch(self, interface, member, member_prefix, candidates):
+    """Returns the key of candidates matching the member of the interface,
+    or None.
+
+    The keys matching the interface directly ('=Interface.member') come
+    first, then those of the interfaces in its hierarchy, in order.  For each
+    interface, 'member' comes before 'prefix:member' and 'Interface.*'.
+    """
+    hierarchy = self._database.Hierarchy(interface)
+    if dependencies.IsRecording():
+      # Probe the keys one by one, to depend on the keys that are not in
+      # candidates too.
+      return self._ProbeMatch(interface, hierarchy, member, member_prefix,
+                              candidates)
+
+    matches = self._MemberMatches(interface, hierarchy, candidates)
+    best = None
+    for name in (member, member_prefix + member, '*'):
+      match = matches.get(name)
+      if match is not None and (best is None or match[0] < best[0]):
+        best = match
+    if best is None:
+      return None
+    candidates.MarkUsed(best[1])
+    return best[1]
+
+  def _MemberMatches(self, interface, hierarchy, candidates):
+    """Returns {member: (rank, key)} of the first key of candidates for each
+    member in the hierarchy of the interface, where rank orders the
+    interfaces as _FindMatch() searches them."""
+    entry = self._member_matches.get((candidates.name, interface.id))
+    if entry is not None and entry[0] is hierarchy:
+      return entry[1]
+    index = self._member_tables.get(candidates.name)
+    if index is None:
+      index = _IndexMemberTable(candidates)
+      self._member_tables[candidates.name] = index
+    matches = {}
+    interface_ids = ['=%s' % interface.id] + [ancestor.id
+                                              for ancestor in hierarchy]
+    for (rank, interface_id) in enumerate(interface_ids):
+      for (member, key) in index.get(interface_id, {}).iteritems():
+        matches.setdefault(member, (rank, key))
+    self._member_matches[(candidates.name, interface.id)] = (hierarchy,
+                                                            matches)
+    return matches
+
+  def _ProbeMatch(self, interface, hierarchy, member, member_prefix,
+                  candidates):
     def find_match(interface_id):
       member_name = interface_id + '.' + member
       if member_name in candidates:
@@ -936,7 +1003,7 @@ class HtmlRenamer(object):
     if match:
       return match
 
-    for interface in self._database.Hierarchy(interface):
+    for interface in hierarchy:
       match = find_match(interface.id)
       if match:
         return match
@@ -1010,20 +1077,27 @@ class HtmlRenamer(object):
     return self._DartifyName(type_name)
 
   def _DartifyName(self, dart_name):
-    # Strip off any standard prefixes.
-    name = re.sub(r'^SVG', '', dart_name)
-    name = re.sub(r'^IDB', '', name)
-    name = re.sub(r'^WebGL', '', name)
-    name = re.sub(r'^WebKit', '', name)
-
-    return self._CamelCaseName(name)
+    if dart_name not in _dartified_names:
+      # Strip off any standard prefixes.
+      name = dart_name
+      for prefix in ['SVG', 'IDB', 'WebGL', 'WebKit']:
+        if name.startswith(prefix):
+          name = name[len(prefix):]
+      _dartified_names[dart_name] = self._CamelCaseName(name)
+    return _dartified_names[dart_name]
 
   def _DartifyMemberName(self, member_name):
-    # Strip off any OpenGL ES suffixes.
-    name = re.sub(r'OES$', '', member_name)
-    return self._CamelCaseName(name)
+    if member_name not in _dartified_member_names:
+      # Strip off any OpenGL ES suffixes.
+      name = member_name
+      if name.endswith('OES'):
+        name = name[:-len('OES')]
+      _dartified_member_names[member_name] = self._CamelCaseName(name)
+    return _dartified_member_names[member_name]
 
   def _CamelCaseName(self, name):
+    if name in _camel_case_names:
+      return _camel_case_names[name]
 
     def toLower(match):
       return match.group(1) + match.group(2).lower() + match.group(3)
@@ -1036,4 +1110,6 @@ class HtmlRenamer(object):
     #   WebKitCSSFilterValue: WebKit(C)(SS)(F)ilterValue
     #   XPathNSResolver: (X)()(P)ath(N)(S)(R)esolver (no change)
     #   IFrameElement: (I)()(F)rameElement (no change)
-    return re.sub(r'([A-Z])([A-Z]{2,})([A-Z]|$)', toLower, name)
+    camel_case_name = re.sub(r'([A-Z])([A-Z]{2,})([A-Z]|$)', toLower, name)
+    _camel_case_names[name] = camel_case_name
+    return camel_case_name
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for htmlrenamer module."""
+
+import database
+import dependencies
+import idlnode
+import logging.config
+import monitored
+import os
+import shutil
+import tempfile
+import unittest
+from htmlrenamer import HtmlRenamer
+
+
+class _Logger(object):
+  def __init__(self):
+    self.warnings = []
+
+  def warn(self, message):
+    self.warnings.append(message)
+
+
+def _Interface(name, parent=None):
+  ast = [('Id', name)]
+  if parent:
+    ast.append(('ParentInterface', [('InterfaceType', ('ScopedName', parent))]))
+  return idlnode.IDLInterface(ast)
+
+
+class HtmlRenamerTestCase(unittest.TestCase):
+
+  def setUp(self):
+    self._working_dir = tempfile.mkdtemp()
+    self._database = database.Database(
+        os.path.join(self._working_dir, 'database'))
+    self._database.AddInterface(_Interface('Base'))
+    self._database.AddInterface(_Interface('Parent', 'Base'))
+    self._database.AddInterface(_Interface('Child', 'Parent'))
+
+  def tearDown(self):
+    shutil.rmtree(self._working_dir)
+
+  def _FindMatches(self, recording, members):
+    """Returns the keys _FindMatch() finds for the (member, prefix) of Child,
+    while dependencies are recorded or not, and the unused keys left."""
+    candidates = monitored.Dict('htmlrenamer_test.candidates', {
+        '=Child.direct': 'a',
+        'Child.direct': 'b',
+        'Child.on:click': 'c',
+        'Parent.click': 'd',
+        'Parent.*': 'e',
+        'Parent.shared': 'f',
+        'Base.shared': 'g',
+        'Base.unused': 'h',
+    })
+    renamer = HtmlRenamer(self._database, None)
+    child = self._database.GetInterface('Child')
+    if recording:
+      dependencies.Start()
+    try:
+      keys = [renamer._FindMatch(child, member, prefix, candidates)
+              for (member, prefix) in members]
+    finally:
+      if recording:
+        dependencies.Stop()
+    logger = _Logger()
+    candidates.CheckUsage(logger)
+    return (keys, logger.warnings)
+
+  def testFindMatchPathsAgree(self):
+    members = [('direct', ''), ('click', 'on:'), ('other', ''),
+               ('shared', '')]
+    (keys, warnings) = self._FindMatches(False, members)
+    # '=Interface.member' comes first, then the interfaces in order, and for
+    # each of them 'member', 'prefix:member' and 'Interface.*'.
+    self.assertEquals(keys, ['=Child.direct', 'Child.on:click', 'Parent.*',
+                             'Parent.shared'])
+    self.assertEquals(warnings, [
+        "dict 'htmlrenamer_test.candidates' has unused key '%s'" % key
+        for key in ['Base.shared', 'Base.unused', 'Child.direct',
+                    'Parent.click']])
+    # Probing the keys one by one finds and uses the same ones.
+    self.assertEquals(self._FindMatches(True, members), (keys, warnings))
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
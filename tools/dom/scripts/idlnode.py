@@ -3,6 +3,7 @@
 # for details. All rights reserved. Use of this source code is governed by a
 # BSD-style license that can be found in the LICENSE file.
 
+import copy
 import os
 import sys
 
@@ -21,13 +22,116 @@ _operation_suffix_map = {
   '__delete__': "Deleter",
 }
 
+# Mapping from original AST tuple names to new AST field names idl_definitions.Idl*.
+_LABEL_TO_FIELD = {
+  # Keys old AST names, Values Blink IdlInterface names.
+  'ParentInterface': 'parent',
+  'Id': 'name',
+  'Interface': 'interfaces',
+  'Callback': 'is_callback',
+  'Partial': 'is_partial',
+  'Operation': 'operations',
+  'Attribute': 'attributes',
+  'Const': 'constants',
+  'Type': 'idl_type',
+  'ExtAttrs':  'extended_attributes',
+  'Special': 'specials',
+  'ReturnType': 'idl_type',
+  'Argument': 'arguments',
+  'InterfaceType': 'name',
+  'ConstExpr': 'value',
+  'Static': 'is_static',
+  'ReadOnly': 'is_read_only',
+  'Optional': 'is_optional',
+  'Nullable': 'is_nullable',
+  'Enum': 'enumerations',
+  'Annotation': '',         # TODO(terry): Ignore annotation used for database cache.
+  'TypeDef': '',            # typedef in an IDL are already resolved.
+  'Dictionary': 'dictionaries',
+  'Member': 'members',
+  'Default': 'default_value',   # Dictionary member default value
+}
+
+def _convert_label_to_field(label):
+  result = _LABEL_TO_FIELD.get(label)
+  if result != '' and not(result):
+    print 'FATAL ERROR: AST mapping name not found %s.' % label
+  return result if result else ''
+
+# Modules of the Blink AST classes _find_all reads fields from.
+_BLINK_DEFINITION_MODULES = ('idl_definitions',)
+_BLINK_MODULES = ('idl_definitions', 'idl_types')
+
+_MISSING = object()
+
+# (AST class, label, Blink modules) -> name of the field holding the label's
+# value, or None if the class isn't one of the Blink AST classes.  Computed
+# once per key so _find_all doesn't redo the type checks on every node.
+_blink_fields = {}
+
+def _blink_field(ast, label, modules):
+  """Returns the field of a Blink AST object that corresponds to label, or
+  None if ast isn't a Blink AST object defined in one of modules."""
+  if not ast:
+    return None
+  ast_class = ast.__class__
+  key = (ast_class, label, modules)
+  field_name = _blink_fields.get(key, _MISSING)
+  if field_name is _MISSING:
+    if (issubclass(ast_class, (dict, str, tuple)) or
+        getattr(ast_class, '__module__', None) not in modules):
+      field_name = None
+    else:
+      field_name = _convert_label_to_field(label)
+    _blink_fields[key] = field_name
+  return field_name
+
+# Slots that are not part of the state of a node: they are not compared,
+# copied nor pickled.
+_TRANSIENT_SLOTS = ('_index',)
+
+# Types of the attribute values that copies of a node share.
+_IMMUTABLE_TYPES = (basestring, int, long, float, bool, type(None))
+
+# Slot names of each IDLNode class, including the ones of its base classes.
+_slot_names = {}
+
+def _node_slots(cls):
+  """Returns the (mangled) names of all the non-transient slots of an IDLNode
+  class."""
+  names = _slot_names.get(cls)
+  if names is None:
+    names = []
+    for klass in reversed(cls.__mro__):
+      for name in klass.__dict__.get('__slots__', ()):
+        if name.startswith('__') and not name.endswith('__'):
+          name = '_%s%s' % (klass.__name__.lstrip('_'), name)
+        if name not in names and name not in _TRANSIENT_SLOTS:
+          names.append(name)
+    names = tuple(names)
+    _slot_names[cls] = names
+  return names
+
 class IDLNode(object):
   """Base class for all IDL elements.
   IDLNode may contain various child nodes, and have properties. Examples
   of IDLNode are interfaces, interface members, function arguments,
   etc.
+
+  Nodes are slotted: every subclass declares its attributes in __slots__,
+  and the ones that may hold child IDLNodes (or lists of them) in
+  _child_fields, which is what all() walks.
+
+  Classes with _indexed set (interfaces and files) keep the result of all()
+  in an index, so repeated queries over the same node don't walk it again.
+  Code that adds, removes or replaces nodes anywhere under an indexed node
+  must call invalidate_index() on it.
   """
 
+  __slots__ = ('id',)
+  _child_fields = ()
+  _indexed = False
+
   def __init__(self, ast):
     """Initializes an IDLNode from a PegParser AST output."""
     self.id = self._find_first(ast, 'Id') if ast is not None else None
@@ -60,7 +164,40 @@ class IDLNode(object):
     IDLNodes are equal if all their properties are equal."""
     if other is None or not isinstance(other, IDLNode):
       return 1
-    return self.__dict__.__cmp__(other.__dict__)
+    return cmp(dict(self._items()), dict(other._items()))
+
+  def _items(self):
+    """Returns the (name, value) pairs of the attributes set on the node."""
+    res = []
+    for name in _node_slots(type(self)):
+      try:
+        res.append((name, getattr(self, name)))
+      except AttributeError:
+        pass
+    return res
+
+  def __getstate__(self):
+    return dict(self._items())
+
+  def __setstate__(self, state):
+    for name, value in state.items():
+      setattr(self, name, value)
+
+  def __deepcopy__(self, memo):
+    """Copies the slots directly, which is much faster than going through
+    __getstate__ and __setstate__."""
+    cls = type(self)
+    node = cls.__new__(cls)
+    memo[id(self)] = node
+    for name in _node_slots(cls):
+      try:
+        value = getattr(self, name)
+      except AttributeError:
+        continue
+      if not isinstance(value, _IMMUTABLE_TYPES):
+        value = copy.deepcopy(value, memo)
+      setattr(node, name, value)
+    return node
 
   def reset_id(self, newId):
     """Reset the id of the Node.  This is typically done during a normalization
@@ -75,28 +212,65 @@ class IDLNode(object):
       type_filter -- can be used to limit the results to a specific
         node type (e.g. IDLOperation).
     """
-    res = []
-    if type_filter is None or isinstance(self, type_filter):
-      res.append(self)
-    for v in self._all_subnodes():
-      if isinstance(v, IDLNode):
-        res.extend(v.all(type_filter))
-      elif isinstance(v, list):
-        for item in v:
-          if isinstance(item, IDLNode):
-            res.extend(item.all(type_filter))
-    return res
+    index = self._node_index()
+    if index is None:
+      return list(self.iter_all(type_filter))
+    nodes = index.get(type_filter)
+    if nodes is None:
+      nodes = [node for node in index[None] if isinstance(node, type_filter)]
+      index[type_filter] = nodes
+    return list(nodes)
+
+  def iter_all(self, type_filter=None):
+    """Generator version of all(): yields this node and all its child nodes
+    in the same (pre-)order, without building a list or an index."""
+    stack = [self]
+    while stack:
+      node = stack.pop()
+      if type_filter is None or isinstance(node, type_filter):
+        yield node
+      children = []
+      for v in node._all_subnodes():
+        if isinstance(v, IDLNode):
+          children.append(v)
+        elif isinstance(v, list):
+          children.extend(item for item in v if isinstance(item, IDLNode))
+      children.reverse()
+      stack.extend(children)
+
+  def invalidate_index(self):
+    """Drops the index kept by all(), if any, after nodes were added,
+    removed or replaced under this node.  all() rebuilds it."""
+    if self._indexed:
+      self._index = None
+
+  def _node_index(self):
+    """Returns the index of an indexed node, mapping type filters (None for
+    all nodes) to the nodes all() returns, or None if the node isn't indexed.
+    """
+    if not self._indexed:
+      return None
+    index = getattr(self, '_index', None)
+    if index is None:
+      index = {None: list(self.iter_all())}
+      self._index = index
+    return index
 
   def _all_subnodes(self):
     """Accessor used by all() to find subnodes."""
-    return self.__dict__.values()
+    res = []
+    for name in self._child_fields:
+      value = getattr(self, name, None)
+      if value is not None:
+        res.append(value)
+    return res
 
   def to_dict(self):
     """Converts the IDLNode and its children into a dictionary.
     This method is useful mostly for debugging and pretty printing.
     """
     res = {}
-    for (k, v) in self.__dict__.items():
+    for (k, v) in self._items():
       if v == None or v == False or v == [] or v == {}:
         # Skip empty/false members.
         continue
@@ -137,17 +311,13 @@ class IDLNode(object):
 
     if isinstance(ast, list):
       for childAst in ast:
-        if childAst and \
-           not(isinstance(childAst, dict)) and \
-           not(isinstance(childAst, str)) and \
-           not(isinstance(childAst, tuple)) and \
-           childAst.__module__ == "idl_definitions":
-          field_name = self._convert_label_to_field(label)
-          if hasattr(childAst, field_name):
-            field_value = getattr(childAst, field_name)
+        field_name = _blink_field(childAst, label, _BLINK_DEFINITION_MODULES)
+        if field_name is not None:
+          field_value = getattr(childAst, field_name, _MISSING)
+          if field_value is not _MISSING:
             # It's an IdlType we need the string name of the type.
             if field_name == 'idl_type':
-              field_value =  getattr(field_value, 'base_type')
+              field_value = field_value.base_type
             res.append(field_value)
         else:
           sub_res = self._find_all(childAst, label,
@@ -157,14 +327,12 @@ class IDLNode(object):
       (nodeLabel, value) = ast
       if nodeLabel == label:
         res.append(value)
-    # TODO(terry): Seems bogus to check for so many things probably better to just
-    #              pass in blink_compile and drive it off from that...
-    elif (ast and not(isinstance(ast, dict)) and
-          not(isinstance(ast, str)) and
-          (ast.__module__ == "idl_definitions" or ast.__module__ == "idl_types")):
-      field_name = self._convert_label_to_field(label)
-      if hasattr(ast, field_name):
-        field_value = getattr(ast, field_name)
+    else:
+      # TODO(terry): Seems bogus to check for so many things probably better
+      #              to just pass in blink_compile and drive it off from that...
+      field_name = _blink_field(ast, label, _BLINK_MODULES)
+      if field_name is not None:
+        field_value = getattr(ast, field_name, None)
         if field_value:
           if label == 'Interface' or label == 'Enum' or label == "Dictionary":
             for key in field_value:
@@ -198,38 +366,7 @@ class IDLNode(object):
 
   # Mapping from original AST tuple names to new AST field names idl_definitions.Idl*.
   def _convert_label_to_field(self, label):
-    label_field = {
-      # Keys old AST names, Values Blink IdlInterface names.
-      'ParentInterface': 'parent',
-      'Id': 'name',
-      'Interface': 'interfaces',
-      'Callback': 'is_callback',
-      'Partial': 'is_partial',
-      'Operation': 'operations',
-      'Attribute': 'attributes',
-      'Const': 'constants',
-      'Type': 'idl_type',
-      'ExtAttrs':  'extended_attributes',
-      'Special': 'specials',
-      'ReturnType': 'idl_type',
-      'Argument': 'arguments',
-      'InterfaceType': 'name',
-      'ConstExpr': 'value',
-      'Static': 'is_static',
-      'ReadOnly': 'is_read_only',
-      'Optional': 'is_optional',
-      'Nullable': 'is_nullable',
-      'Enum': 'enumerations',
-      'Annotation': '',         # TODO(terry): Ignore annotation used for database cache.
-      'TypeDef': '',            # typedef in an IDL are already resolved.
-      'Dictionary': 'dictionaries',
-      'Member': 'members',
-      'Default': 'default_value',   # Dictionary member default value
-    }
-    result = label_field.get(label)
-    if result != '' and not(result):
-      print 'FATAL ERROR: AST mapping name not found %s.' % label
-    return result if result else ''
+    return _convert_label_to_field(label)
 
   def _convert_all(self, ast, label, idlnode_ctor):
     """Converts AST elements into IDLNode elements.
@@ -278,6 +415,8 @@ class IDLDictNode(IDLNode):
   """Base class for dictionary-like IDL nodes such as extended attributes
   and annotations. The base class implements various dict interfaces."""
 
+  __slots__ = ('__map',)
+
   def __init__(self, ast):
     IDLNode.__init__(self, None)
     if ast is not None and isinstance(ast, dict):
@@ -341,6 +480,12 @@ class IDLDictNode(IDLNode):
 class IDLFile(IDLNode):
   """IDLFile is the top-level node in each IDL file. It may contain interfaces."""
 
+  __slots__ = ('filename', 'interfaces', 'dictionaries', 'implementsStatements',
+               'typeDefs', 'enums', '_index')
+  _child_fields = ('interfaces', 'dictionaries', 'implementsStatements',
+                   'typeDefs', 'enums')
+  _indexed = True
+
   DART_IDL = 'dart.idl'
 
   def __init__(self, ast, filename=None):
@@ -416,6 +561,11 @@ class IDLFile(IDLNode):
 class IDLModule(IDLNode):
   """IDLModule has an id, and may contain interfaces, type defs and
   implements statements."""
+
+  __slots__ = ('ext_attrs', 'annotations', 'interfaces', 'typeDefs', 'enums',
+               'implementsStatements')
+  _child_fields = ('ext_attrs', 'annotations', 'interfaces', 'typeDefs',
+                   'enums', 'implementsStatements')
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     self._convert_ext_attrs(ast)
@@ -444,6 +594,8 @@ class IDLModule(IDLNode):
 class IDLExtAttrs(IDLDictNode):
   """IDLExtAttrs is an IDLDictNode that stores IDL Extended Attributes.
   Modules, interfaces, members and arguments can all own IDLExtAttrs."""
+
+  __slots__ = ()
   def __init__(self, ast=None):
     IDLDictNode.__init__(self, None)
     if not ast:
@@ -511,6 +663,9 @@ class IDLExtAttrs(IDLDictNode):
 # IDLExtAttrFunctionValue is used for constructors defined in the IDL.
 class IDLExtAttrFunctionValue(IDLNode):
   """IDLExtAttrFunctionValue."""
+
+  __slots__ = ('arguments',)
+  _child_fields = ('arguments',)
   def __init__(self, func_value_ast, arg_list_ast, is_blink=False):
     IDLNode.__init__(self, func_value_ast)
     if is_blink:
@@ -528,6 +683,8 @@ class IDLType(IDLNode):
   return and input types. IDLType matches AST labels such as ScopedName,
   StringType, VoidType, IntegerType, etc."""
 
+  __slots__ = ('nullable', 'dictionary')
+
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
 
@@ -611,6 +768,9 @@ class IDLType(IDLNode):
 
 class IDLEnum(IDLNode):
   """IDLNode for 'enum [id] { [string]+ }'"""
+
+  __slots__ = ('annotations', 'values')
+  _child_fields = ('annotations',)
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     self._convert_annotations(ast)
@@ -625,6 +785,9 @@ class IDLEnum(IDLNode):
 
 class IDLTypeDef(IDLNode):
   """IDLNode for 'typedef [type] [id]' declarations."""
+
+  __slots__ = ('annotations', 'type')
+  _child_fields = ('annotations', 'type')
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     self._convert_annotations(ast)
@@ -635,6 +798,9 @@ class IDLDictionary(IDLNode):
   """IDLDictionary node contains members,
   as well as parent references."""
 
+  __slots__ = ('javascript_binding_name', 'ext_attrs', 'members')
+  _child_fields = ('ext_attrs', 'members')
+
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
 
@@ -645,6 +811,8 @@ class IDLDictionary(IDLNode):
 
 class IDLDictionaryMembers(IDLDictNode):
   """IDLDictionaryMembers specialization for a list of FremontCut dictionary values."""
+
+  __slots__ = ()
   def __init__(self, ast=None, js_name=None):
     IDLDictNode.__init__(self, ast)
     self.id = None
@@ -660,6 +828,14 @@ class IDLInterface(IDLNode):
   """IDLInterface node contains operations, attributes, constants,
   as well as parent references."""
 
+  __slots__ = ('ext_attrs', 'annotations', 'parents', 'javascript_binding_name',
+               'doc_js_name', 'operations', 'attributes', 'constants',
+               'is_supplemental', 'is_no_interface_object', 'is_fc_suppressed',
+               '_index')
+  _child_fields = ('ext_attrs', 'annotations', 'parents', 'operations',
+                   'attributes', 'constants')
+  _indexed = True
+
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     self._convert_ext_attrs(ast)
@@ -715,6 +891,9 @@ class IDLInterface(IDLNode):
 class IDLParentInterface(IDLNode):
   """This IDLNode specialization is for 'Interface Child : Parent {}'
   declarations."""
+
+  __slots__ = ('annotations', 'type')
+  _child_fields = ('annotations', 'type')
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     self._convert_annotations(ast)
@@ -724,6 +903,10 @@ class IDLParentInterface(IDLNode):
 class IDLMember(IDLNode):
   """A base class for constants, attributes and operations."""
 
+  __slots__ = ('type', 'ext_attrs', 'annotations', 'doc_js_interface_name',
+               'is_fc_suppressed', 'is_static')
+  _child_fields = ('type', 'ext_attrs', 'annotations')
+
   def __init__(self, ast, doc_js_interface_name):
     IDLNode.__init__(self, ast)
 
@@ -739,6 +922,9 @@ class IDLMember(IDLNode):
 
 class IDLOperation(IDLMember):
   """IDLNode specialization for 'type name(args)' declarations."""
+
+  __slots__ = ('arguments', 'specials')
+  _child_fields = IDLMember._child_fields + ('arguments',)
   def __init__(self, ast, doc_js_interface_name):
     IDLMember.__init__(self, ast, doc_js_interface_name)
 
@@ -780,6 +966,8 @@ class IDLOperation(IDLMember):
 
 class IDLAttribute(IDLMember):
   """IDLNode specialization for 'attribute type name' declarations."""
+
+  __slots__ = ('is_read_only',)
   def __init__(self, ast, doc_js_interface_name):
     IDLMember.__init__(self, ast, doc_js_interface_name)
     self.is_read_only = self._has(ast, 'ReadOnly')
@@ -793,6 +981,8 @@ class IDLAttribute(IDLMember):
 
 class IDLConstant(IDLMember):
   """IDLNode specialization for 'const type name = value' declarations."""
+
+  __slots__ = ('value',)
   def __init__(self, ast, doc_js_interface_name):
     IDLMember.__init__(self, ast, doc_js_interface_name)
     self.value = self._find_first(ast, 'ConstExpr')
@@ -800,6 +990,10 @@ class IDLConstant(IDLMember):
 
 class IDLArgument(IDLNode):
   """IDLNode specialization for operation arguments."""
+
+  __slots__ = ('default_value', 'default_value_is_null', 'type', 'optional',
+               'ext_attrs')
+  _child_fields = ('type', 'ext_attrs')
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
 
@@ -830,6 +1024,8 @@ class IDLArgument(IDLNode):
 
 class IDLDictionaryMember(IDLMember):
   """IDLNode specialization for 'const type name = value' declarations."""
+
+  __slots__ = ('value',)
   def __init__(self, ast, doc_js_interface_name):
     IDLMember.__init__(self, ast, doc_js_interface_name)
     default_value = self._find_first(ast, 'Default')
@@ -838,6 +1034,9 @@ class IDLDictionaryMember(IDLMember):
 
 class IDLImplementsStatement(IDLNode):
   """IDLNode specialization for 'IMPLEMENTOR implements IMPLEMENTED' declarations."""
+
+  __slots__ = ('implementor', 'implemented')
+  _child_fields = ('implementor', 'implemented')
   def __init__(self, ast):
     IDLNode.__init__(self, ast)
     if isinstance(ast, list) or ast.__module__ != 'idl_definitions':
@@ -847,6 +1046,8 @@ class IDLImplementsStatement(IDLNode):
 
 class IDLAnnotations(IDLDictNode):
   """IDLDictNode specialization for a list of FremontCut annotations."""
+
+  __slots__ = ()
   def __init__(self, ast=None):
     IDLDictNode.__init__(self, ast)
     self.id = None
@@ -860,6 +1061,8 @@ class IDLAnnotations(IDLDictNode):
 
 class IDLAnnotation(IDLDictNode):
   """IDLDictNode specialization for one annotation."""
+
+  __slots__ = ()
   def __init__(self, ast=None):
     IDLDictNode.__init__(self, ast)
     self.id = None
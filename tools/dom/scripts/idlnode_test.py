@@ -6,6 +6,7 @@
 import idlnode
 import idlparser
 import logging.config
+import pickle
 import sys
 import unittest
 
@@ -140,6 +141,36 @@ AST   :
       'interface Shape {}; interface Rectangle : Shape {}; interface Square : Rectangle, Shape {};',
       {'interfaces': [{'javascript_binding_name': 'Shape', 'doc_js_name': 'Shape', 'id': 'Shape'}, {'javascript_binding_name': 'Rectangle', 'doc_js_name': 'Rectangle', 'parents': [{'type': {'id': 'Shape'}}], 'id': 'Rectangle'}, {'javascript_binding_name': 'Square', 'doc_js_name': 'Square', 'parents': [{'type': {'id': 'Rectangle'}}, {'type': {'id': 'Shape'}}], 'id': 'Square'}]})
 
+  def test_pickle(self):
+    parser = idlparser.IDLParser(idlparser.FREMONTCUT_SYNTAX)
+    node = idlnode.IDLFile(parser.parse(
+        '[Ano] interface I : J { attribute int a; void f(Node n); };'))
+    for copy in [pickle.loads(pickle.dumps(node, protocol))
+                 for protocol in range(pickle.HIGHEST_PROTOCOL + 1)]:
+      self.assertEquals(copy, node)
+      self.assertEquals(copy.to_dict(), node.to_dict())
+      self.assertEquals([t.id for t in copy.all(idlnode.IDLType)],
+                        [t.id for t in node.all(idlnode.IDLType)])
+
+  def test_all_index(self):
+    parser = idlparser.IDLParser(idlparser.FREMONTCUT_SYNTAX)
+    interface = idlnode.IDLFile(parser.parse(
+        'interface I { attribute int a; void f(Node n); };')).interfaces[0]
+    types = interface.all(idlnode.IDLType)
+    self.assertEquals(types, list(interface.iter_all(idlnode.IDLType)))
+
+    # The index is kept until it is invalidated, whatever changed.
+    interface.attributes.append(interface.attributes[0])
+    interface.operations[0].arguments.append(
+        interface.operations[0].arguments[0])
+    self.assertEquals(interface.all(idlnode.IDLType), types)
+    interface.invalidate_index()
+    self.assertEquals(len(interface.all(idlnode.IDLType)), len(types) + 2)
+    interface.attributes[:] = []
+    interface.invalidate_index()
+    self.assertEquals(interface.all(idlnode.IDLType),
+                      list(interface.iter_all(idlnode.IDLType)))
+
 if __name__ == "__main__":
   logging.config.fileConfig("logging.conf")
   if __name__ == '__main__':
@@ -6,8 +6,31 @@
 
 """This module provides maps and sets that report unused elements."""
 
+import dependencies
+
 _monitored_values = []
 
+# Whether the collections keep their used keys in a bytearray, see
+# UseBitmapTracking().
+_bitmap_tracking = False
+
+def UseBitmapTracking():
+  """Makes all the collections, including the ones created later, keep
+  their used keys in a bytearray.
+
+  Each key of a collection is mapped to an index once, and looking it up
+  sets its byte.  The keys looked up that the collection doesn't have are
+  not kept, unlike in the default set of used keys, which grows with them:
+  a generation looks up about 40 times more keys than the collections have,
+  and each worker process sends them back with TakeUsedKeys().
+  FinishMonitoring() reports the same unused keys in both modes.
+  """
+  global _bitmap_tracking
+  if _bitmap_tracking:
+    return
+  _bitmap_tracking = True
+  for value in _monitored_values:
+    value._UseBitmapTracking()
 
 def FinishMonitoring(includeDart2jsOnly, logger):
   for value in _monitored_values:
@@ -15,22 +38,73 @@ def FinishMonitoring(includeDart2jsOnly, logger):
       continue
     value.CheckUsage(logger)
 
+def TakeUsedKeys():
+  """Returns the keys used in each collection since the last call, for
+  MergeUsedKeys() in the process this one was forked from."""
+  return [value._TakeUsedKeys() for value in _monitored_values]
+
+def MergeUsedKeys(used_keys):
+  for (value, keys) in zip(_monitored_values, used_keys):
+    value._MergeUsedKeys(keys)
+
+def KeyState(index, key):
+  """Returns what looking up key in the index-th collection finds, for the
+  ('monitored', index, key) dependencies recorded by the lookups."""
+  return _monitored_values[index]._KeyState(key)
+
+def Contents(index):
+  """Returns the dict or list the index-th collection wraps."""
+  return _monitored_values[index]._Contents()
+
+def MarkUsed(index, keys):
+  _monitored_values[index]._MergeUsedKeys(keys)
+
 class MonitoredCollection(object):
+  """Base class of the collections that report unused keys.
+
+  Each lookup adds the key to _used_keys, and records it as a dependency
+  while dependencies are recorded.  The subclasses inline this in their
+  lookups, which are among the hottest calls of the generator.  With
+  UseBitmapTracking(), the _Bitmap subclasses override the lookups.
+  """
+
   def __init__(self, name, dart2jsOnly):
     self.name = name
     self._used_keys = set()
     self._dart2jsOnly = dart2jsOnly
+    self._index = len(_monitored_values)
     _monitored_values.append(self)
 
+  def MarkUsed(self, key):
+    """Marks the key as used, like looking it up does."""
+    self._used_keys.add(key)
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+
+  def _TakeUsedKeys(self):
+    used_keys = self._used_keys
+    self._used_keys = set()
+    return used_keys
+
+  def _MergeUsedKeys(self, keys):
+    self._used_keys.update(keys)
+
+  def _IsUsed(self, key):
+    return key in self._used_keys
+
 class Dict(MonitoredCollection):
   """Wrapper for a dict that reports unused keys."""
 
   def __init__(self, name, map, dart2jsOnly=False):
     super(Dict, self).__init__(name, dart2jsOnly)
     self._map = map
+    if _bitmap_tracking:
+      self._UseBitmapTracking()
 
   def __getitem__(self, key):
     self._used_keys.add(key)
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
     return self._map[key]
 
   def __setitem__(self, key, value):
@@ -38,6 +112,8 @@ class Dict(MonitoredCollection):
 
   def __contains__(self, key):
     self._used_keys.add(key)
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
     return key in self._map
 
   def __iter__(self):
@@ -45,14 +121,28 @@ class Dict(MonitoredCollection):
 
   def get(self, key, default=None):
     self._used_keys.add(key)
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
     return self._map.get(key, default)
 
   def keys(self):
     return self._map.keys()
 
+  def _KeyState(self, key):
+    if key in self._map:
+      return (True, self._map[key])
+    return (False, None)
+
+  def _Contents(self):
+    return self._map
+
+  def _UseBitmapTracking(self):
+    self.__class__ = _BitmapDict
+    self._StartBitmapTracking(self._map)
+
   def CheckUsage(self, logger):
     for v in sorted(self._map.keys()):
-      if v not in self._used_keys:
+      if not self._IsUsed(v):
         logger.warn('dict \'%s\' has unused key \'%s\'' % (self.name, v))
 
 
@@ -62,18 +152,128 @@ class Set(MonitoredCollection):
   def __init__(self, name, a_set, dart2jsOnly=False):
     super(Set, self).__init__(name, dart2jsOnly)
     self._set = a_set
+    # The keys of the list, to look them up in constant time.
+    self._keys = set(a_set)
+    if _bitmap_tracking:
+      self._UseBitmapTracking()
 
   def __contains__(self, key):
     self._used_keys.add(key)
-    return key in self._set
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+    return key in self._keys
 
   def __iter__(self):
     return self._set.__iter__()
 
   def add(self, key):
     self._set += [key]
+    self._keys.add(key)
+
+  def _KeyState(self, key):
+    return key in self._keys
+
+  def _Contents(self):
+    return self._set
+
+  def _UseBitmapTracking(self):
+    self.__class__ = _BitmapSet
+    self._StartBitmapTracking(self._keys)
 
   def CheckUsage(self, logger):
     for v in sorted(self._set):
-      if v not in self._used_keys:
+      if not self._IsUsed(v):
         logger.warn('set \'%s\' has unused key \'%s\'' % (self.name, v))
+
+
+class _BitmapTracking(object):
+  """Keeps the used keys of a collection in a bytearray, see
+  UseBitmapTracking().  Only the keys the collection has are tracked, by
+  their index in _key_indices."""
+
+  def _StartBitmapTracking(self, keys):
+    self._key_indices = {}
+    self._used = bytearray()
+    for key in keys:
+      self._AddTrackedKey(key)
+    self._MergeUsedKeys(self._used_keys)
+    self._used_keys = set()
+
+  def _AddTrackedKey(self, key):
+    if key not in self._key_indices:
+      self._key_indices[key] = len(self._used)
+      self._used.append(0)
+
+  def _UseBitmapTracking(self):
+    pass
+
+  def MarkUsed(self, key):
+    index = self._key_indices.get(key)
+    if index is not None:
+      self._used[index] = 1
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+
+  def _TakeUsedKeys(self):
+    used = self._used
+    self._used = bytearray(len(used))
+    return set(key for (key, index) in self._key_indices.iteritems()
+               if used[index])
+
+  def _MergeUsedKeys(self, keys):
+    for key in keys:
+      index = self._key_indices.get(key)
+      if index is not None:
+        self._used[index] = 1
+
+  def _IsUsed(self, key):
+    index = self._key_indices.get(key)
+    return index is not None and self._used[index] == 1
+
+
+class _BitmapDict(_BitmapTracking, Dict):
+  """Dict with the lookups of _BitmapTracking."""
+
+  def __getitem__(self, key):
+    index = self._key_indices.get(key)
+    if index is not None:
+      self._used[index] = 1
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+    return self._map[key]
+
+  def __setitem__(self, key, value):
+    self._map[key] = value
+    self._AddTrackedKey(key)
+
+  def __contains__(self, key):
+    index = self._key_indices.get(key)
+    if index is not None:
+      self._used[index] = 1
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+    return key in self._map
+
+  def get(self, key, default=None):
+    index = self._key_indices.get(key)
+    if index is not None:
+      self._used[index] = 1
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+    return self._map.get(key, default)
+
+
+class _BitmapSet(_BitmapTracking, Set):
+  """Set with the lookups of _BitmapTracking."""
+
+  def __contains__(self, key):
+    index = self._key_indices.get(key)
+    if index is not None:
+      self._used[index] = 1
+    if dependencies.recording:
+      dependencies.Record(('monitored', self._index, key))
+    return index is not None
+
+  def add(self, key):
+    Set.add(self, key)
+    self._AddTrackedKey(key)
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for monitored module."""
+
+import logging.config
+import monitored
+import unittest
+
+
+class _Logger(object):
+  def __init__(self):
+    self.warnings = []
+
+  def warn(self, message):
+    self.warnings.append(message)
+
+
+class MonitoredTestCase(unittest.TestCase):
+
+  def _Collections(self, bitmap):
+    d = monitored.Dict('test.dict', {'a': 1, 'b': 2, 'c': 3})
+    s = monitored.Set('test.set', ['x', 'y', 'z'])
+    if bitmap:
+      d._UseBitmapTracking()
+      s._UseBitmapTracking()
+    return (d, s)
+
+  def _UnusedKeys(self, bitmap):
+    (d, s) = self._Collections(bitmap)
+    self.assertEquals(d['a'], 1)
+    self.assertTrue('b' in d)
+    self.assertEquals(d.get('missing', 0), 0)
+    d['n'] = 4
+    self.assertTrue('x' in s)
+    self.assertFalse('missing' in s)
+    s.add('w')
+    s.MarkUsed('w')
+    logger = _Logger()
+    d.CheckUsage(logger)
+    s.CheckUsage(logger)
+    return logger.warnings
+
+  def testUnusedKeys(self):
+    self.assertEquals(self._UnusedKeys(False), [
+        "dict 'test.dict' has unused key 'c'",
+        "dict 'test.dict' has unused key 'n'",
+        "set 'test.set' has unused key 'y'",
+        "set 'test.set' has unused key 'z'"])
+    self.assertEquals(self._UnusedKeys(True), self._UnusedKeys(False))
+
+  def testBitmapTakeAndMerge(self):
+    (d, s) = self._Collections(True)
+    d.get('a')
+    d.get('missing')
+    self.assertTrue('y' in s)
+    # Only the keys the collections have are kept.
+    self.assertEquals(d._TakeUsedKeys(), set(['a']))
+    self.assertEquals(s._TakeUsedKeys(), set(['y']))
+    self.assertEquals(d._TakeUsedKeys(), set())
+
+    d._MergeUsedKeys(['b', 'missing'])
+    self.assertTrue(d._IsUsed('b'))
+    self.assertFalse(d._IsUsed('a'))
+    self.assertFalse(d._IsUsed('missing'))
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
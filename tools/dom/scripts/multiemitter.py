@@ -5,15 +5,23 @@
 
 """Templating to help generate structured text."""
 
+import hashlib
+import json
 import os
+import shutil
 import sys
-import subprocess
-import time
 import emitter
 import logging
+from multiprocessing.pool import ThreadPool
 
 _logger = logging.getLogger('multiemitter')
 
+# Buffer size of the files written by _WriteFile.
+_BUFFER_SIZE = 1 << 16
+
+# Number of threads Flush writes files with.
+_FLUSH_THREADS = 8
+
 class MultiEmitter(object):
   """A set of Emitters that write to different files.
 
@@ -24,9 +32,15 @@ class MultiEmitter(object):
 
   """
 
-  def __init__(self, logging_level=logging.WARNING):
+  def __init__(self, logging_level=logging.WARNING, manifest_path=None):
+    """Arguments:
+      manifest_path: optional file in which Flush records the size,
+        modification time and hash of the files it writes.  Files whose
+        content and stat match the manifest are skipped without reading them.
+    """
     self._key_to_emitter = {}     # key -> Emitter
     self._filename_to_emitter = {}    # filename -> Emitter
+    self._manifest_path = manifest_path
 
     _logger.setLevel(logging_level)
 
@@ -57,63 +71,208 @@ class MultiEmitter(object):
     """Returns the emitter associated with |key|."""
     return self._key_to_emitter[key]
 
+  def TakeFiles(self):
+    """Removes all the files and returns a list of (filename, content) pairs,
+    for MergeFiles() in another process."""
+    files = [(file, ''.join(emitter.IterFragments()))
+             for (file, emitter) in sorted(self._filename_to_emitter.items())]
+    self._key_to_emitter = {}
+    self._filename_to_emitter = {}
+    return files
+
+  def MergeFiles(self, files):
+    """Creates the files returned by TakeFiles()."""
+    for (file, content) in files:
+      self.FileEmitter(file).EmitRaw(content)
+
   def Flush(self, writer=None):
     """Writes all pending files.
 
     Arguments:
-      writer: a function called for each file and it's lines.
+      writer: a function called for each file and an iterable of its lines.
+        By default the files are written in parallel, skipping the unchanged
+        ones.
+
+    Returns: a FlushStats, or None if a writer is given.
     """
-    if not writer:
-      writer = _WriteFile
-    for file in sorted(self._filename_to_emitter.keys()):
-      emitter = self._filename_to_emitter[file]
-      writer(file, emitter.Fragments())
+    if writer:
+      for file in sorted(self._filename_to_emitter.keys()):
+        emitter = self._filename_to_emitter[file]
+        writer(file, emitter.IterFragments())
+      return None
+
+    manifest = _LoadManifest(self._manifest_path)
+    def flush_file(file):
+      return _FlushFile(file, self._filename_to_emitter[file], manifest)
+
+    pool = ThreadPool(_FLUSH_THREADS)
+    try:
+      results = pool.map(flush_file, sorted(self._filename_to_emitter.keys()))
+    finally:
+      pool.close()
+      pool.join()
+
+    stats = FlushStats()
+    for (path, written, entry) in results:
+      manifest[path] = entry
+      if written:
+        stats.written += 1
+        stats.written_bytes += entry[0]
+      else:
+        stats.unchanged += 1
+        stats.unchanged_bytes += entry[0]
+    _SaveManifest(self._manifest_path, manifest)
+    return stats
+
+
+class FlushStats(object):
+  """Number of files and bytes written and left unchanged by a Flush."""
+  def __init__(self):
+    self.written = 0
+    self.written_bytes = 0
+    self.unchanged = 0
+    self.unchanged_bytes = 0
+
+
+def _LoadManifest(manifest_path):
+  """Returns the manifest of the files written by the previous Flush, mapping
+  absolute paths to [size, mtime, sha1] entries."""
+  if not manifest_path or not os.path.exists(manifest_path):
+    return {}
+  try:
+    with open(manifest_path) as fd:
+      return json.load(fd)
+  except ValueError:
+    _logger.warn('Ignoring corrupt manifest %s' % manifest_path)
+    return {}
+
+
+def _SaveManifest(manifest_path, manifest):
+  if not manifest_path:
+    return
+  temp_path = '%s.tmp' % manifest_path
+  with open(temp_path, 'w') as fd:
+    json.dump(manifest, fd, sort_keys=True, indent=0)
+  _ReplaceFile(temp_path, manifest_path)
+
+
+def _FlushFile(file, emitter, manifest):
+  """Writes the content of emitter to file unless the manifest shows the file
+  already has it.
+
+  Returns: (path, written, entry) with the manifest key and new entry.
+  """
+  path = os.path.abspath(file)
+  entry = manifest.get(path)
+  if entry is not None:
+    digest = hashlib.sha1()
+    size = 0
+    for line in emitter.IterFragments():
+      digest.update(line)
+      size += len(line)
+    if [size, digest.hexdigest()] == [entry[0], entry[2]]:
+      stat = _Stat(path)
+      if stat == (entry[0], entry[1]):
+        _logger.info('Unchanged file %s' % file)
+        return (path, False, entry)
+  (written, size, sha1) = _WriteFile(file, emitter.IterFragments())
+  (_, mtime) = _Stat(path)
+  return (path, written, [size, mtime, sha1])
+
+
+def _Stat(path):
+  """Returns the (size, mtime) of a file, or None if it doesn't exist."""
+  try:
+    stat = os.stat(path)
+  except OSError:
+    return None
+  return (stat.st_size, stat.st_mtime)
 
 
 def _WriteFile(path, lines):
+  """Writes lines, an iterable of strings, to the file at path unless it
+  already has that content.
+
+  The lines are compared with the existing file as they come; the new content
+  is only written, to a temporary file that then replaces the file, once it
+  differs.  Neither the new nor the old content is held in memory.
+
+  Returns:
+    A (written, size, sha1) tuple: whether the file was written, and the size
+    and SHA-1 hex digest of its content.
+  """
   (dir, file) = os.path.split(path)
 
   # Ensure dir exists.
   if dir:
     if not os.path.isdir(dir):
       _logger.info('Mkdir - %s' % dir)
-      os.makedirs(dir)
+      try:
+        os.makedirs(dir)
+      except OSError:
+        # Another thread of Flush may have created it.
+        if not os.path.isdir(dir):
+          raise
 
-  # If file exists and is unchanged, return.
-  new_contents = ''.join(lines)
+  digest = hashlib.sha1()
+  size = 0
+  temp_path = '%s.tmp' % path
+  existing = open(path) if os.path.exists(path) else None
+  # Number of characters of the new content that match the existing file.
+  matched = 0
+  output = None
+  try:
+    for line in lines:
+      digest.update(line)
+      size += len(line)
+      if output is None:
+        if existing is not None and existing.read(len(line)) == line:
+          matched += len(line)
+          continue
+        output = _OpenCopy(temp_path, existing, matched)
+      output.write(line)
+
+    if output is None:
+      # If file exists and is unchanged, return.
+      if existing is not None and not existing.read(1):
+        _logger.info('Unchanged file %s' % path)
+        return (False, size, digest.hexdigest())
+      # The new content is a strict prefix of the old one.
+      output = _OpenCopy(temp_path, existing, matched)
+    output.close()
+  except:
+    if output is not None:
+      output.close()
+      os.remove(temp_path)
+    raise
+  finally:
+    if existing is not None:
+      existing.close()
+
+  _ReplaceFile(temp_path, path)
+  return (True, size, digest.hexdigest())
+
+
+def _OpenCopy(temp_path, existing, size):
+  """Opens temp_path for writing and copies the first size characters of the
+  existing file into it."""
+  output = open(temp_path, 'w', _BUFFER_SIZE)
+  if size:
+    existing.seek(0)
+    while size:
+      chunk = existing.read(min(size, _BUFFER_SIZE))
+      output.write(chunk)
+      size -= len(chunk)
+  return output
+
+
+def _ReplaceFile(temp_path, path):
+  """Moves a written temporary file over path, keeping the permissions of
+  the file it replaces.  A new file gets the default ones, from the umask."""
+  _logger.info('Writing - %s' % path)
   if os.path.exists(path):
-    with open(path) as fd:
-      contents = fd.read()
-    if new_contents == contents:
-      _logger.info('Unchanged file %s' % path)
-      return
-
-  # Write the file.
-  num_attempts = 4
-  for i in range(num_attempts):
-    try:
-      _logger.info('Writing (attempt %d) - %s' % (i + 1, path))
-      with open(path, 'w') as fd:
-        fd.write(new_contents)
-      return
-    except IOError as error:
-      last_attempt = (i == (num_attempts - 1))
-      if not last_attempt:
-        # Sleep for 50 ms and try again
-        time.sleep(0.05)
-      else:
-        # FIXME(kustermann): Remove this later on.
-        # We try to get more debugging information to figure out why we
-        # sometimes get a "Permission denied" error when opening the file for
-        # writing. (hypothesis: Another process has already opened the file.)
-        _logger.info('Got exception (%s) ' % error)
-
-        if sys.platform  == 'win32':
-          handle_file = r'E:\handle.exe'
-          if os.path.exists(handle_file):
-            _logger.info('Running handle.exe for debugging purposes')
-            subprocess.call([handle_file, '-a', r'E:\b\build\slave'])
-          else:
-            _logger.info("Couldn't find %s. Not printing open handles."
-                         % handle_file)
-        raise error
+    shutil.copymode(path, temp_path)
+    if sys.platform == 'win32':
+      # os.rename can't replace files on Windows.
+      os.remove(path)
+  os.rename(temp_path, path)
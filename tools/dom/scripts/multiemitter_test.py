@@ -5,7 +5,12 @@
 
 """Tests for emitter module."""
 
+import hashlib
 import logging.config
+import os
+import shutil
+import stat
+import tempfile
 import unittest
 import emitter
 import multiemitter
@@ -41,6 +46,67 @@ class MultiEmitterTestCase(unittest.TestCase):
                [('file1', 'Hi 1'),
                 ('file2', 'Hi 2Bye 2') ])
 
+  def testTakeFiles(self):
+    m = multiemitter.MultiEmitter()
+    m.FileEmitter('file2').Emit('Hi $!HOLE 2').Emit('there')
+    m.FileEmitter('file1').Emit('Hi 1')
+    files = m.TakeFiles()
+    self.assertEquals(files, [('file1', 'Hi 1'), ('file2', 'Hi there 2')])
+    self.check(m, [])
+
+    other = multiemitter.MultiEmitter()
+    other.MergeFiles(files)
+    self.check(other, files)
+
+  def testWriteFile(self):
+    path = os.path.join(tempfile.mkdtemp(), 'dir', 'file')
+    def write(lines):
+      (written, size, sha1) = multiemitter._WriteFile(path, iter(lines))
+      with open(path) as f:
+        self.assertEquals(f.read(), ''.join(lines))
+      self.assertEquals(size, len(''.join(lines)))
+      self.assertEquals(sha1, hashlib.sha1(''.join(lines)).hexdigest())
+      return written
+    try:
+      self.assertTrue(write(['Hi ', '1']))
+      self.assertFalse(write(['H', 'i 1']))
+      self.assertTrue(write(['Hi ', '2']))
+      self.assertTrue(write(['Hi']))
+      self.assertTrue(write(['Hi', ' 12']))
+      self.assertEquals(os.listdir(os.path.dirname(path)), ['file'])
+
+      # New files get the default permissions, rewritten ones keep theirs.
+      umask = os.umask(0)
+      os.umask(umask)
+      self.assertEquals(stat.S_IMODE(os.stat(path).st_mode), 0666 & ~umask)
+      os.chmod(path, 0750)
+      self.assertTrue(write(['Hi', ' 3']))
+      self.assertEquals(stat.S_IMODE(os.stat(path).st_mode), 0750)
+    finally:
+      shutil.rmtree(os.path.dirname(os.path.dirname(path)))
+
+  def testFlushManifest(self):
+    output_dir = tempfile.mkdtemp()
+    manifest_path = os.path.join(output_dir, 'manifest')
+    def flush(contents):
+      m = multiemitter.MultiEmitter(manifest_path=manifest_path)
+      for name, content in contents:
+        m.FileEmitter(os.path.join(output_dir, name)).Emit(content)
+      stats = m.Flush()
+      return (stats.written, stats.unchanged)
+    try:
+      self.assertEquals(flush([('a', 'A'), ('b', 'B')]), (2, 0))
+      self.assertEquals(flush([('a', 'A'), ('b', 'B')]), (0, 2))
+      self.assertEquals(flush([('a', 'A'), ('b', 'BB')]), (1, 1))
+      # Files changed behind the manifest's back are written again.
+      with open(os.path.join(output_dir, 'a'), 'w') as f:
+        f.write('edited')
+      self.assertEquals(flush([('a', 'A'), ('b', 'BB')]), (1, 1))
+      with open(os.path.join(output_dir, 'a')) as f:
+        self.assertEquals(f.read(), 'A')
+    finally:
+      shutil.rmtree(output_dir)
+
 if __name__ == '__main__':
   logging.config.fileConfig('logging.conf')
   if __name__ == '__main__':
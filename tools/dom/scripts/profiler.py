@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""This module records where the DOM generator spends its time and memory.
+
+Once Start() is called, Phase() records how long each named phase takes and
+the peak RSS at its end, and Counters() records statistics such as cache hit
+rates.  Save() writes them as a Chrome trace, which chrome://tracing and
+Perfetto display as a timeline with one row per process.
+
+Until Start() is called, Phase() and Counters() do nothing, so the phases can
+be marked in the hot paths.
+"""
+
+import contextlib
+import json
+import os
+import resource
+import time
+
+# The trace events recorded in this process, or None if not profiling.
+_events = None
+
+
+def _Timestamp():
+  """Returns the time in microseconds.  It is the wall clock, so the events
+  of different processes line up."""
+  return int(time.time() * 1000000)
+
+def _PeakRssKb():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def IsProfiling():
+  return _events is not None
+
+def Start():
+  """Starts recording the trace events of this process and of the processes
+  it forks."""
+  global _events
+  _events = []
+
+@contextlib.contextmanager
+def Phase(name, category='phase', measure_rss=True, **args):
+  """Records the time it takes to run the body of the with statement.
+
+  Phases nest.  Unless measure_rss is False, e.g. for the phases run many
+  times, the event also records the peak RSS at the end of the phase and how
+  much it grew during it.  args are added to the event as they are.
+  """
+  if _events is None:
+    yield
+    return
+  if measure_rss:
+    rss_before = _PeakRssKb()
+  start = _Timestamp()
+  try:
+    yield
+  finally:
+    end = _Timestamp()
+    if measure_rss:
+      rss = _PeakRssKb()
+      args['peak_rss_kb'] = rss
+      args['peak_rss_growth_kb'] = rss - rss_before
+    pid = os.getpid()
+    _events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start,
+                    'dur': end - start, 'pid': pid, 'tid': pid, 'args': args})
+    if measure_rss:
+      _events.append({'name': 'Peak RSS (KB)', 'ph': 'C', 'ts': end,
+                      'pid': pid, 'args': {'peak_rss_kb': rss}})
+
+def Counters(name, **values):
+  """Records the current values of statistics, e.g. the hits and misses of a
+  cache."""
+  if _events is not None:
+    _events.append({'name': name, 'ph': 'C', 'ts': _Timestamp(),
+                    'pid': os.getpid(), 'args': values})
+
+def CacheCounters(name, stats):
+  """Records the (hits, misses, size) statistics of a cache."""
+  (hits, misses, size) = stats
+  Counters(name, hits=hits, misses=misses, size=size)
+
+def TakeEvents():
+  """Returns the events recorded in this process since the last call, to be
+  sent to the parent process."""
+  global _events
+  if _events is None:
+    return []
+  events = _events
+  _events = []
+  return events
+
+def MergeEvents(events):
+  """Adds the events a child process took with TakeEvents()."""
+  if _events is not None:
+    _events.extend(events)
+
+def Save(path):
+  """Writes the events recorded so far as a Chrome trace."""
+  pids = set(event['pid'] for event in _events)
+  main_pid = os.getpid()
+  names = []
+  for pid in sorted(pids):
+    if pid == main_pid:
+      name = 'dartdomgenerator'
+    else:
+      name = 'worker %s' % pid
+    names.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                  'args': {'name': name}})
+  with open(path, 'w') as f:
+    json.dump({'traceEvents': names + _events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# Copyright (c) 2015, the Dart project authors.  Please see the AUTHORS file
+# for details. All rights reserved. Use of this source code is governed by a
+# BSD-style license that can be found in the LICENSE file.
+
+"""Tests for profiler module."""
+
+import json
+import logging.config
+import os
+import profiler
+import tempfile
+import unittest
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+  def tearDown(self):
+    profiler._events = None
+
+  def testNotProfiling(self):
+    with profiler.Phase('phase'):
+      profiler.Counters('counters', value=1)
+    self.assertFalse(profiler.IsProfiling())
+    self.assertEquals(profiler.TakeEvents(), [])
+
+  def testPhases(self):
+    profiler.Start()
+    with profiler.Phase('outer'):
+      with profiler.Phase('inner', category='interface', measure_rss=False,
+                          system='dart2js'):
+        pass
+    profiler.CacheCounters('cache', (3, 1, 2))
+
+    events = profiler.TakeEvents()
+    self.assertEquals([(event['name'], event['ph']) for event in events],
+                      [('inner', 'X'), ('outer', 'X'), ('Peak RSS (KB)', 'C'),
+                       ('cache', 'C')])
+    (inner, outer, _, cache) = events
+    self.assertEquals(inner['args'], {'system': 'dart2js'})
+    self.assertTrue(outer['ts'] <= inner['ts'])
+    self.assertTrue(inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur'])
+    self.assertTrue(outer['args']['peak_rss_kb'] > 0)
+    self.assertEquals(cache['args'], {'hits': 3, 'misses': 1, 'size': 2})
+    self.assertEquals(profiler.TakeEvents(), [])
+
+  def testSave(self):
+    profiler.Start()
+    with profiler.Phase('phase'):
+      pass
+    profiler.MergeEvents([{'name': 'child', 'ph': 'X', 'ts': 0, 'dur': 1,
+                           'pid': -1, 'tid': -1, 'args': {}}])
+    (handle, path) = tempfile.mkstemp()
+    os.close(handle)
+    try:
+      profiler.Save(path)
+      with open(path) as f:
+        trace = json.load(f)
+    finally:
+      os.remove(path)
+    names = sorted(event['args']['name'] for event in trace['traceEvents']
+                   if event['ph'] == 'M')
+    self.assertEquals(names, ['dartdomgenerator', 'worker -1'])
+    self.assertEquals(
+        sorted(event['name'] for event in trace['traceEvents']
+               if event['ph'] == 'X'),
+        ['child', 'phase'])
+
+
+if __name__ == '__main__':
+  logging.config.fileConfig('logging.conf')
+  if __name__ == '__main__':
+    unittest.main()
@@ -446,6 +446,21 @@ js_support_checks = dict({
     _js_support_checks_additional_element).items())
 # ------------------------------------------------------------------------------
 
+def RenameInterfaceOverloads(database, type_registry, interfaces):
+  """Renames the overloaded operations of the interfaces to render and of
+  the interfaces merged into them.
+
+  HtmlDartInterfaceGenerator.Generate() doesn't modify the database, so this
+  must be done once before any backend renders an interface.
+  """
+  for interface in interfaces:
+    if IsCustomType(interface.id) or 'Callback' in interface.ext_attrs:
+      continue
+    merged_interface = type_registry.TypeInfo(interface.id).merged_interface()
+    if merged_interface:
+      RenameOverloads(database, merged_interface)
+    RenameOverloads(database, interface.id)
+
 class HtmlDartInterfaceGenerator(object):
   """Generates dart interface and implementation for the DOM IDL interface."""
 
@@ -665,10 +680,7 @@ class HtmlDartInterfaceGenerator(object):
     self._backend.AddConstructors(
         constructors, factory_provider, factory_constructor_name)
 
-    isElement = False
-    for parent in self._database.Hierarchy(self._interface):
-      if parent.id == 'Element':
-        isElement = True
+    isElement = self._database.InheritsFrom(self._interface, 'Element')
 
     # Write out the JsInterop code.
     if (implementation_members_emitter and
@@ -690,7 +702,8 @@ class HtmlDartInterfaceGenerator(object):
 
     merged_interface = self._interface_type_info.merged_interface()
     if merged_interface:
-      self._backend.AddMembers(self._database.GetInterface(merged_interface),
+      self._backend.AddMembers(
+        self._database.GetInterface(merged_interface),
         not self._backend.ImplementsMergedMembers())
 
     self._backend.AddMembers(self._interface, False, self._options.dart_js_interop)
@@ -1271,22 +1284,62 @@ class DartLibraryEmitter():
     self._dart_sources_dir = dart_sources_dir
     self._path_to_emitter = {}
     self._dart_libraries = dart_libraries
+    # Files and type entries added since the last TakeOutput().
+    self._new_files = []
+    self._new_type_entries = []
+    # Paths of the files returned by TakeOutput().
+    self._taken_paths = set()
 
   def FileEmitter(self, basename, library_name, template=None):
     aux_dir = os.path.join(self._dart_sources_dir, library_name)
     path = os.path.join(aux_dir, '%s.dart' % basename)
     if not path in self._path_to_emitter:
       emitter = self._multiemitter.FileEmitter(path)
+      self._new_files.append((basename, library_name, emitter))
       if not template is None:
         emitter = emitter.Emit(template)
       self._path_to_emitter[path] = emitter
 
       self._dart_libraries.AddFile(basename, library_name, path)
+    elif path in self._taken_paths:
+      # Only what is appended from now on is returned by the next
+      # TakeOutput().
+      self._taken_paths.remove(path)
+      emitter = self._path_to_emitter[path].Emit('$!APPENDED')
+      self._new_files.append((basename, library_name, emitter))
+      self._path_to_emitter[path] = emitter
     return self._path_to_emitter[path]
 
   def AddTypeEntry(self, basename, idl_name, dart_name):
+    self._new_type_entries.append((basename, idl_name, dart_name))
     self._dart_libraries.AddTypeEntry(basename, idl_name, dart_name)
 
+  def TakeOutput(self):
+    """Returns the files and type entries added since the last call, for
+    MergeOutput() in another process or, e.g. when cached, later.
+
+    If the files are emitted to again, the next call returns what was
+    appended to them, and MergeOutput() appends it.
+    """
+    output = ([(basename, library_name, ''.join(emitter.IterFragments()))
+               for (basename, library_name, emitter) in self._new_files],
+              self._new_type_entries)
+    for (basename, library_name, _) in self._new_files:
+      self._taken_paths.add(os.path.join(self._dart_sources_dir, library_name,
+                                         '%s.dart' % basename))
+    self._new_files = []
+    self._new_type_entries = []
+    return output
+
+  def MergeOutput(self, output):
+    """Adds the output of TakeOutput() to this emitter's files and
+    libraries."""
+    (files, type_entries) = output
+    for (basename, library_name, content) in files:
+      self.FileEmitter(basename, library_name).EmitRaw(content)
+    for (basename, idl_name, dart_name) in type_entries:
+      self.AddTypeEntry(basename, idl_name, dart_name)
+
   def EmitLibraries(self, auxiliary_dir, dart_js_interop):
     self._dart_libraries.Emit(self._multiemitter, auxiliary_dir)
 
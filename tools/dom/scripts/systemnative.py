@@ -866,7 +866,7 @@ class DartiumBackend(HtmlDartGenerator):
     else:
       to_active_emitter.Emit('return 0;')
 
-    if (any(map(is_node_test, self._database.Hierarchy(self._interface)))):
+    if self._database.InheritsFrom(self._interface, 'Node'):
       to_node_emitter.Emit('return toNative(value);')
     else:
       to_node_emitter.Emit('return 0;')
@@ -1836,17 +1836,40 @@ class CPPLibraryEmitter():
     self._cpp_sources_dir = cpp_sources_dir
     self._library_headers = dict((lib, []) for lib in HTML_LIBRARY_NAMES)
     self._sources_list = []
+    # (method name, arguments, emitter) of the files created since the last
+    # TakeOutput().
+    self._new_files = []
 
   def CreateHeaderEmitter(self, interface_name, library_name, is_callback=False):
     path = os.path.join(self._cpp_sources_dir, 'Dart%s.h' % interface_name)
     if not is_callback:
       self._library_headers[library_name].append(path)
-    return self._emitters.FileEmitter(path)
+    file_emitter = self._emitters.FileEmitter(path)
+    self._new_files.append(('CreateHeaderEmitter',
+                            (interface_name, library_name, is_callback),
+                            file_emitter))
+    return file_emitter
 
   def CreateSourceEmitter(self, interface_name):
     path = os.path.join(self._cpp_sources_dir, 'Dart%s.cpp' % interface_name)
     self._sources_list.append(path)
-    return self._emitters.FileEmitter(path)
+    file_emitter = self._emitters.FileEmitter(path)
+    self._new_files.append(('CreateSourceEmitter', (interface_name,),
+                            file_emitter))
+    return file_emitter
+
+  def TakeOutput(self):
+    """Returns the files created since the last call, for MergeOutput() in
+    another process."""
+    output = [(method, args, ''.join(file_emitter.IterFragments()))
+              for (method, args, file_emitter) in self._new_files]
+    self._new_files = []
+    return output
+
+  def MergeOutput(self, output):
+    """Creates the files returned by TakeOutput() in this emitter."""
+    for (method, args, content) in output:
+      getattr(self, method)(*args).EmitRaw(content)
 
   def EmitDerivedSources(self, template, output_dir):
     partitions = 20 # FIXME: this should be configurable.
@@ -1876,11 +1899,10 @@ class CPPLibraryEmitter():
 
   def EmitClassIdTable(self, database, output_dir, type_registry, renamer):
     def HasConverters(interface):
-      is_node_test = lambda interface: interface.id == 'Node'
       is_active_test = lambda interface: 'ActiveDOMObject' in interface.ext_attrs
       is_event_target_test = lambda interface: 'EventTarget' in interface.ext_attrs
 
-      return (any(map(is_node_test, database.Hierarchy(interface))) or
+      return (database.InheritsFrom(interface, 'Node') or
               any(map(is_active_test, database.Hierarchy(interface))) or
               any(map(is_event_target_test, database.Hierarchy(interface))))
 
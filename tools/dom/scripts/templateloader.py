@@ -14,8 +14,15 @@
 #
 # VAR must be defined in the conditions dictionary.
 
+import dependencies
+import hashlib
 import os
 
+# Preprocessed templates by file path, and directory listings by directory,
+# shared by all the loaders: templates don't change while generating.
+_compiled_templates = {}
+_directory_listings = {}
+
 class TemplateLoader(object):
   """Loads template files from a path."""
 
@@ -32,23 +39,27 @@ class TemplateLoader(object):
     self._subpaths = subpaths
     self._conditions = conditions
     self._cache = {}
+    self._fingerprints = {}
 
   def TryLoad(self, name, more_conditions={}):
     """Returns content of template file as a string, or None of not found."""
+    dependencies.Record(('template', name))
     conditions = dict(self._conditions, **more_conditions)
     cache_key = (name, tuple(sorted(conditions.items())))
     if cache_key in self._cache:
       return self._cache[cache_key]
 
-    for subpath in self._subpaths:
-      template_file = os.path.join(self._root, subpath, name)
-      if os.path.exists(template_file):
-        template = ''.join(open(template_file).readlines())
-        template = self._Preprocess(template, template_file, conditions)
-        self._cache[cache_key] = template
-        return template
-
-    return None
+    template_file = self._FindTemplateFile(name)
+    if template_file is None:
+      return None
+    compiled = _compiled_templates.get(template_file)
+    if compiled is None:
+      template = ''.join(open(template_file).readlines())
+      compiled = _CompiledTemplate(template, template_file)
+      _compiled_templates[template_file] = compiled
+    template = compiled.Evaluate(conditions)
+    self._cache[cache_key] = template
+    return template
 
   def Load(self, name, more_conditions={}):
     """Returns contents of template file as a string, or raises an exception."""
@@ -58,16 +69,65 @@ class TemplateLoader(object):
     raise Exception("Could not find template '%s' on %s / %s" % (
         name, self._root, self._subpaths))
 
+  def Fingerprint(self, name):
+    """Returns a hash of the path and content of the file TryLoad(name)
+    loads, or None if there is no such file."""
+    if name not in self._fingerprints:
+      fingerprint = None
+      template_file = self._FindTemplateFile(name)
+      if template_file is not None:
+        with open(template_file) as f:
+          fingerprint = hashlib.sha1(
+              '%s\n%s' % (template_file, f.read())).hexdigest()
+      self._fingerprints[name] = fingerprint
+    return self._fingerprints[name]
+
+  def _FindTemplateFile(self, name):
+    for subpath in self._subpaths:
+      template_file = os.path.join(self._root, subpath, name)
+      (directory, file_name) = os.path.split(template_file)
+      if file_name in _ListDirectory(directory):
+        return template_file
+    return None
+
   def _Preprocess(self, template, filename, conditions):
-    def error(lineno, message):
-      raise Exception('%s:%s: %s' % (filename, lineno, message))
+    return _CompiledTemplate(template, filename).Evaluate(conditions)
+
+
+def _ListDirectory(directory):
+  """Returns the set of file names in directory (empty if it doesn't exist)."""
+  names = _directory_listings.get(directory)
+  if names is None:
+    if os.path.isdir(directory):
+      names = frozenset(os.listdir(directory))
+    else:
+      names = frozenset()
+    _directory_listings[directory] = names
+  return names
+
+
+class _CompiledTemplate(object):
+  """A template preprocessed once into a tree of text and conditionals, which
+  can then be evaluated for any set of conditions.
+
+  The tree is a list of strings and (variable, then_nodes, else_nodes)
+  tuples.  Errors are reported when evaluating, in line order, as the
+  line by line preprocessor did: $if variables missing from the conditions
+  are errors even in inactive branches.
+  """
+
+  def __init__(self, template, filename):
+    self._filename = filename
+    # (lineno, variable, message): an error unless variable is a condition.
+    # A structural error (variable None) ends the list.
+    self._checks = []
+    self._nodes = []
 
     lines = template.splitlines(True)
-    out = []
-
+    nodes = self._nodes
+    # (conditional, seen_else, enclosing nodes) of each open $if.
     condition_stack = []
-    active = True
-    seen_else = False
+    text = []
 
     for (lineno, full_line) in enumerate(lines):
       line = full_line.strip()
@@ -78,42 +138,71 @@ class TemplateLoader(object):
 
         if directive == '$if':
           if len(words) != 2:
-            error(lineno, '$if does not have single variable')
+            self._checks.append(
+                (lineno, None, '$if does not have single variable'))
+            break
           variable = words[1]
-          if variable in conditions:
-            condition_stack.append((active, seen_else))
-            active = active and conditions[variable]
-            seen_else = False
-          else:
-            error(lineno, "Unknown $if variable '%s'" % variable)
+          self._checks.append(
+              (lineno, variable, "Unknown $if variable '%s'" % variable))
+          _FlushText(text, nodes)
+          conditional = (variable, [], [])
+          nodes.append(conditional)
+          condition_stack.append((conditional, False, nodes))
+          nodes = conditional[1]
 
         elif directive == '$else':
           if not condition_stack:
-            error(lineno, '$else without $if')
+            self._checks.append((lineno, None, '$else without $if'))
+            break
+          (conditional, seen_else, enclosing) = condition_stack.pop()
           if seen_else:
-            raise error(lineno, 'Double $else')
-          seen_else = True
-          (parentactive, _) = condition_stack[len(condition_stack) - 1]
-          active = not active and parentactive
+            self._checks.append((lineno, None, 'Double $else'))
+            break
+          _FlushText(text, nodes)
+          condition_stack.append((conditional, True, enclosing))
+          nodes = conditional[2]
 
         elif directive == '$endif':
           if not condition_stack:
-            error(lineno, '$endif without $if')
-          (active, seen_else) = condition_stack.pop()
+            self._checks.append((lineno, None, '$endif without $if'))
+            break
+          _FlushText(text, nodes)
+          (_, _, nodes) = condition_stack.pop()
 
         else:
           # Something else, like '$!MEMBERS'
-          if active:
-            out.append(full_line)
+          text.append(full_line)
       elif line.startswith('//$'):
         pass  # Ignore pre-processor comment.
 
       else:
-        if active:
-          out.append(full_line)
-        continue
+        text.append(full_line)
+    else:
+      if condition_stack:
+        self._checks.append((len(lines), None, 'Unterminated $if'))
+    _FlushText(text, nodes)
+
+  def Evaluate(self, conditions):
+    """Returns the text of the template for a dictionary of conditions."""
+    for (lineno, variable, message) in self._checks:
+      if variable is None or variable not in conditions:
+        raise Exception('%s:%s: %s' % (self._filename, lineno, message))
+    out = []
+    _EvaluateNodes(self._nodes, conditions, out)
+    return ''.join(out)
 
-    if condition_stack:
-      error(len(lines), 'Unterminated $if')
 
-    return ''.join(out)
+def _FlushText(text, nodes):
+  if text:
+    nodes.append(''.join(text))
+    del text[:]
+
+
+def _EvaluateNodes(nodes, conditions, out):
+  for node in nodes:
+    if isinstance(node, str):
+      out.append(node)
+    else:
+      (variable, then_nodes, else_nodes) = node
+      _EvaluateNodes(then_nodes if conditions[variable] else else_nodes,
+                     conditions, out)
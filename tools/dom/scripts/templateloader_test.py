@@ -3,7 +3,11 @@
 # for details. All rights reserved. Use of this source code is governed by a
 # BSD-style license that can be found in the LICENSE file.
 
+import dependencies
 import logging.config
+import os
+import shutil
+import tempfile
 import unittest
 import templateloader
 
@@ -125,6 +129,44 @@ Hello
        '''
     self._preprocess_error_test(input_text, {'A':True}, 'Unterminated')
 
+  def test_loaders(self):
+    root = tempfile.mkdtemp()
+    try:
+      os.mkdir(os.path.join(root, 'sub'))
+      with open(os.path.join(root, 'sub', 't.template'), 'w') as f:
+        f.write('$if A\na\n$else\nb\n$endif\n')
+      a_loader = templateloader.TemplateLoader(root, ['none', 'sub'],
+                                               {'A': True})
+      b_loader = templateloader.TemplateLoader(root, ['sub'], {'A': False})
+      self.assertEquals(a_loader.Load('t.template'), 'a\n')
+      self.assertEquals(b_loader.Load('t.template'), 'b\n')
+      self.assertEquals(a_loader.TryLoad('t.template', {'A': False}), 'b\n')
+      self.assertEquals(a_loader.TryLoad('missing.template'), None)
+    finally:
+      shutil.rmtree(root)
+
+  def test_dependencies(self):
+    root = tempfile.mkdtemp()
+    try:
+      with open(os.path.join(root, 't.template'), 'w') as f:
+        f.write('t\n')
+      loader = templateloader.TemplateLoader(root, [''])
+      loader.Load('t.template')
+      dependencies.Start()
+      # Cached templates are recorded too.
+      loader.Load('t.template')
+      loader.TryLoad('missing.template')
+      self.assertEquals(dependencies.Stop(),
+                        set([('template', 't.template'),
+                             ('template', 'missing.template')]))
+      self.assertEquals(loader.Fingerprint('missing.template'), None)
+      self.assertNotEquals(loader.Fingerprint('t.template'), None)
+      self.assertEquals(
+          loader.Fingerprint('t.template'),
+          templateloader.TemplateLoader(root, ['']).Fingerprint('t.template'))
+    finally:
+      shutil.rmtree(root)
+
 if __name__ == "__main__":
   logging.config.fileConfig("logging.conf")
   if __name__ == '__main__':